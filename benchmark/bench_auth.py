@@ -0,0 +1,53 @@
+"""웹훅 비밀번호 검증 비용 비교
+
+이전: 요청마다 Settings() 를 새로 만들어 .env 를 읽고 40여 개 필드를 검증한 뒤 비교
+이후: 처음 한 번만 읽어 둔 비밀번호와 hmac.compare_digest 로 비교
+
+    python benchmark/bench_auth.py
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PASSWORD", "benchmark-password")
+
+from exchange.model.schemas import Settings, MarketOrder, check_password  # noqa: E402
+
+PASSWORD = Settings().PASSWORD
+ORDER = {
+    "exchange": "BINANCE",
+    "base": "BTC",
+    "quote": "USDT.P",
+    "type": "market",
+    "side": "buy",
+    "amount": 0.001,
+    "password": PASSWORD,
+}
+
+
+def before(v=PASSWORD):
+    setting = Settings()
+    if v != setting.PASSWORD:
+        raise ValueError("비밀번호가 틀렸습니다")
+    return v
+
+
+def after(v=PASSWORD):
+    if not check_password(v):
+        raise ValueError("비밀번호가 틀렸습니다")
+    return v
+
+
+def measure(name, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<28} {best * 1e6:>10.2f} µs/req")
+    return best
+
+
+if __name__ == "__main__":
+    old = measure("password 검증 (이전)", before, 1000)
+    new = measure("password 검증 (이후)", after, 100000)
+    print(f"{'':<28} {old / new:>10.0f}x")
+    measure("MarketOrder 전체 검증 (이후)", lambda: MarketOrder(**ORDER), 10000)
@@ -0,0 +1,135 @@
+"""KIS 주문 지연시간 측정 (로컬 대역 서버)
+
+KIS1~KIS4 계좌로 동시에 50건의 국내 시장가 주문을 보냈을 때의 지연시간을 잽니다.
+
+AsyncKoreaInvestment.create_order 를 이벤트 루프에서 바로 실행 (keep-alive 풀)
+(동기 KoreaInvestment 를 스레드풀에서 실행하던 이전 구현은 제거됨)
+
+대역 서버는 별도 프로세스로 127.0.0.1 에서 주문 한 건당 LATENCY 초 뒤에 성공 응답을 돌려줍니다.
+실제 토큰 발급을 하지 않도록 auth() 만 벤치마크용으로 바꿔서 사용합니다.
+
+    python benchmark/bench_kis.py
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PASSWORD", "benchmark-password")
+
+import orjson  # noqa: E402
+import uvicorn  # noqa: E402
+from exchange.stock.kis import AsyncKoreaInvestment  # noqa: E402
+from exchange.stock.schemas import Endpoints  # noqa: E402
+
+HOST, PORT = "127.0.0.1", 18765
+LATENCY = 0.02
+CONCURRENCY = 50
+ROUNDS = 5
+
+ORDER_RESPONSE = orjson.dumps(
+    {"rt_cd": "0", "msg_cd": "APBK0013", "msg1": "주문 전송 완료", "output": {"ODNO": "0000001"}}
+)
+
+
+async def server(scope, receive, send):
+    # 대역 서버 자체가 병목이 되지 않도록 프레임워크 없이 최소한으로 응답
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    await asyncio.sleep(LATENCY)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200 if scope["path"] == Endpoints.korea_order.value else 404,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": ORDER_RESPONSE})
+
+
+class BenchAuth:
+    def auth(self):
+        self.access_token = "benchmark"
+        self.token_expired_at = datetime.now() + timedelta(days=1)
+        self.base_headers = {"authorization": "Bearer benchmark", "appkey": self.key, "appsecret": self.secret, "custtype": "P"}
+
+
+class AsyncBot(BenchAuth, AsyncKoreaInvestment):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.base_url = f"http://{HOST}:{PORT}"
+
+
+def make_bots(cls):
+    return [cls("key", "secret", "12345678", "01", kis_number) for kis_number in range(1, 5)]
+
+
+async def timed(call):
+    start = time.perf_counter()
+    await call()
+    return time.perf_counter() - start
+
+
+async def run_round(bots):
+    def call(index):
+        bot = bots[index % len(bots)]
+        return lambda: bot.create_order("KRX", "005930", "market", "buy", 1)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[timed(call(i)) for i in range(CONCURRENCY)])
+    return latencies, time.perf_counter() - start
+
+
+def report(name, latencies, walls):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<24} p50 {statistics.median(latencies) * 1000:7.1f}ms"
+        f"  p95 {p95 * 1000:7.1f}ms  max {latencies[-1] * 1000:7.1f}ms"
+        f"  50건 완료 {statistics.median(walls) * 1000:7.1f}ms"
+    )
+
+
+async def main():
+    bots = make_bots(AsyncBot)
+    await run_round(bots)  # 연결 준비
+    latencies, walls = [], []
+    for _ in range(ROUNDS):
+        round_latencies, wall = await run_round(bots)
+        latencies += round_latencies
+        walls.append(wall)
+    report("async (keep-alive pool)", latencies, walls)
+    for bot in bots:
+        await bot.close()
+
+
+def run_stand_in():
+    uvicorn.run(server, host=HOST, port=PORT, log_level="warning")
+
+
+def wait_for_port():
+    while True:
+        try:
+            socket.create_connection((HOST, PORT), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    stand_in = multiprocessing.Process(target=run_stand_in, daemon=True)
+    stand_in.start()
+    wait_for_port()
+    print(f"대역 서버 응답 지연 {LATENCY * 1000:.0f}ms, 동시 주문 {CONCURRENCY}건, KIS1~KIS4")
+    try:
+        asyncio.run(main())
+    finally:
+        stand_in.terminate()
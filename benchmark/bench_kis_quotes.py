@@ -0,0 +1,86 @@
+"""KIS 바스켓 현재가 조회 비교 (가짜 전송 계층)
+
+봉 마감에 30종목 주문이 한꺼번에 들어왔을 때 현재가를 모으는 시간을 비교합니다.
+
+이전: 종목마다 fetch_current_price 를 순서대로 호출
+이후: fetch_current_prices (국내는 30종목 묶음 조회, 미국은 동시 조회, 짧은 캐시)
+
+요청 한 건당 LATENCY 초가 걸리는 httpx 전송 계층을 사용합니다.
+
+    python benchmark/bench_kis_quotes.py
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PASSWORD", "benchmark-password")
+
+import httpx  # noqa: E402
+from exchange.stock.kis import AsyncKoreaInvestment  # noqa: E402
+from exchange.stock.schemas import Endpoints  # noqa: E402
+
+LATENCY = 0.02
+KRX_TICKERS = [f"{index:06d}" for index in range(1, 31)]
+USA_TICKERS = [f"T{index:02d}" for index in range(1, 31)]
+
+
+class SlowTransport(httpx.AsyncBaseTransport):
+    def __init__(self):
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        await asyncio.sleep(LATENCY)
+        params = request.url.params
+        if request.url.path == Endpoints.korea_multi_price.value:
+            output = [
+                {"inter_shrn_iscd": params[key], "inter2_prpr": "1000"}
+                for key in params
+                if key.startswith("FID_INPUT_ISCD_")
+            ]
+            return httpx.Response(200, json={"rt_cd": "0", "output": output})
+        if request.url.path == Endpoints.korea_ticker.value:
+            return httpx.Response(200, json={"rt_cd": "0", "output": {"stck_prpr": "1000"}})
+        return httpx.Response(200, json={"rt_cd": "0", "output": {"last": "100.5"}})
+
+
+class Bot(AsyncKoreaInvestment):
+    def auth(self):
+        self.access_token = "benchmark"
+        self.token_expired_at = datetime.now() + timedelta(days=1)
+        self.base_headers = {"authorization": "Bearer benchmark", "appkey": self.key, "appsecret": self.secret, "custtype": "P"}
+
+
+def make_bot():
+    bot = Bot("key", "secret", "12345678", "01", 1)
+    bot.async_session = httpx.AsyncClient(transport=SlowTransport())
+    return bot
+
+
+async def measure(name, exchange, tickers, batched: bool):
+    bot = make_bot()
+    start = time.perf_counter()
+    if batched:
+        await bot.fetch_current_prices(exchange, tickers)
+    else:
+        for ticker in tickers:
+            await bot.fetch_current_price(exchange, ticker)
+    elapsed = time.perf_counter() - start
+    requests = bot.async_session._transport.requests
+    print(f"{name:<28} {elapsed * 1000:7.1f}ms  요청 {requests}건")
+
+
+async def main():
+    print(f"요청당 지연 {LATENCY * 1000:.0f}ms, 30종목")
+    await measure("KRX 순차 조회", "KRX", KRX_TICKERS, False)
+    await measure("KRX fetch_current_prices", "KRX", KRX_TICKERS, True)
+    await measure("NASDAQ 순차 조회", "NASDAQ", USA_TICKERS, False)
+    await measure("NASDAQ fetch_current_prices", "NASDAQ", USA_TICKERS, True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
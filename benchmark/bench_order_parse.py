@@ -0,0 +1,62 @@
+"""웹훅 주문 파싱 비용 비교
+
+이전: json 디코딩 → MarketOrder(pydantic) 검증 (root_validate, password 검증 포함)
+이후: orjson 디코딩 → parse_order → OrderContext (__slots__)
+
+초당 1천/1만 건의 웹훅을 받는다고 보고, 1초 분량의 주문을 파싱하는 데 걸리는 CPU 시간을 잽니다.
+
+    python benchmark/bench_order_parse.py
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("PASSWORD", "benchmark-password")
+
+from exchange.model.schemas import Settings, MarketOrder  # noqa: E402
+from exchange.model.order import parse_order  # noqa: E402
+
+PASSWORD = Settings().PASSWORD
+ORDERS = [
+    {"exchange": "BINANCE", "base": "BTC", "quote": "USDT.P", "type": "market", "side": "entry/buy", "amount": "0.001", "leverage": 5},
+    {"exchange": "UPBIT", "base": "ETH", "quote": "KRW", "type": "market", "side": "sell", "amount": "NaN", "percent": 100},
+    {"exchange": "KRX", "base": "005930", "quote": "KRW", "type": "market", "side": "buy", "amount": 1, "kis_number": 2},
+    {"exchange": "BYBIT", "base": "BTC", "quote": "USD.P", "type": "market", "side": "close/sell", "percent": 50},
+]
+BODIES = [json.dumps(order | {"password": PASSWORD}).encode() for order in ORDERS]
+
+
+def pydantic_path(body: bytes):
+    return MarketOrder(**json.loads(body))
+
+
+def fast_path(body: bytes):
+    return parse_order(body)
+
+
+def run(func, count: int) -> float:
+    bodies = (BODIES * (count // len(BODIES) + 1))[:count]
+    start = time.perf_counter()
+    for body in bodies:
+        func(body)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    for func in (pydantic_path, fast_path):
+        run(func, 1000)  # warm-up
+
+    for rate in (1_000, 10_000):
+        print(f"[{rate:,} orders/sec]")
+        results = {}
+        for func in (pydantic_path, fast_path):
+            elapsed = min(run(func, rate) for _ in range(5))
+            results[func.__name__] = elapsed
+            print(
+                f"  {func.__name__:<14} {elapsed * 1e3:8.2f} ms CPU per second of traffic"
+                f"  ({elapsed / rate * 1e6:6.2f} µs/order)"
+            )
+        print(f"  {'speedup':<14} {results['pydantic_path'] / results['fast_path']:8.1f}x")
@@ -3,7 +3,6 @@
 # from exchange.bybit import Bybit
 # from exchange.bitget import Bitget
 # from exchange.kis import KoreaInvestment
-from exchange.pexchange import get_bot, get_exchange
 from exchange.database import db
 from exchange.model import (
     PriceRequest,
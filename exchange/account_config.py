@@ -0,0 +1,56 @@
+import threading
+import time
+from exchange.utility import settings
+
+MISSING = object()
+
+
+class AccountConfigs:
+    """(거래소, 마켓 ID)별 레버리지/마진 모드/수수료 캐시
+
+    거래소에 마지막으로 설정한(또는 조회한) 값을 기억해 두고 같은 값이면 설정 API 를 다시 부르지 않습니다.
+    주문이 실패하거나 다른 값으로 바꿀 때만 비우며, 수수료 등급은 거래량에 따라 바뀌므로 FEE_CACHE_TTL 이 지나면 다시 조회합니다.
+    """
+
+    def __init__(self):
+        # (거래소, 마켓 ID) -> {항목: (저장 시각, 값)}
+        self.configs: dict[tuple[str, str], dict] = {}
+        self.lock = threading.Lock()
+
+    def get(self, exchange: str, market_id: str, field: str, ttl: float | None = None):
+        entry = self.configs.get((exchange, market_id), {}).get(field)
+        if entry is None:
+            return MISSING
+        if ttl is not None and time.monotonic() - entry[0] >= ttl:
+            return MISSING
+        return entry[1]
+
+    def set(self, exchange: str, market_id: str, field: str, value):
+        with self.lock:
+            self.configs.setdefault((exchange, market_id), {})[field] = (time.monotonic(), value)
+
+    def is_set(self, exchange: str, market_id: str, field: str, value) -> bool:
+        """이미 같은 값으로 설정돼 있으면 True"""
+        return self.get(exchange, market_id, field) == value
+
+    def get_fee(self, exchange: str, market_id: str):
+        return self.get(exchange, market_id, "fee", ttl=settings.FEE_CACHE_TTL)
+
+    def set_fee(self, exchange: str, market_id: str, fee: dict):
+        self.set(exchange, market_id, "fee", fee)
+
+    def invalidate(self, exchange: str, market_id: str | None = None, field: str | None = None):
+        with self.lock:
+            if market_id is None:
+                for key in [key for key in self.configs if key[0] == exchange]:
+                    del self.configs[key]
+            elif field is None:
+                self.configs.pop((exchange, market_id), None)
+            else:
+                self.configs.get((exchange, market_id), {}).pop(field, None)
+
+    def clear(self):
+        self.configs.clear()
+
+
+account_configs = AccountConfigs()
@@ -1,24 +1,34 @@
-from exchange.pexchange import ccxt, ccxt_async, httpx
+from exchange.pexchange import ccxt_async
+from exchange.markets import async_load_markets
+from exchange.singleflight import tickers
+from exchange.position_mode import position_modes
+from exchange.account_config import account_configs
+from exchange.utility.ws import binance_stream
 from devtools import debug
 from exchange.model import MarketOrder
 import exchange.error as error
 
 
-class Binance:
+class AsyncBinance:
+    """ccxt.async_support 기반 바이낸스, 주문 대기 중에도 이벤트 루프를 막지 않음"""
+
     def __init__(self, key, secret):
-        self.client = ccxt.binance(
+        self.client = ccxt_async.binance(
             {
                 "apiKey": key,
                 "secret": secret,
                 "options": {"adjustForTimeDifference": True},
             }
         )
-        self.client.load_markets()
-        self.position_mode = "one-way"
-        self.order_info: MarketOrder = None
+
+    async def load_markets(self):
+        await async_load_markets(self.client)
+
+    async def close(self):
+        await self.client.close()
 
     def init_info(self, order_info: MarketOrder):
-        self.order_info = order_info
+        order_info.position_mode = position_modes.get(order_info.exchange, order_info.unified_symbol)
 
         unified_symbol = order_info.unified_symbol
         market = self.client.market(unified_symbol)
@@ -30,27 +40,29 @@ class Binance:
                 )
             )
 
+        if order_info.is_futures and order_info.is_coinm:
+            is_contract = market.get("contract")
+            if is_contract:
+                order_info.is_contract = True
+                order_info.contract_size = market.get("contractSize")
+
+    def get_market_params(self, order_info: MarketOrder) -> dict:
+        # 클라이언트의 defaultType 을 바꾸지 않고 호출마다 마켓 종류를 지정 (동시에 다른 종류의 주문이 들어와도 안전)
         if order_info.is_futures:
-            if order_info.is_coinm:
-                is_contract = market.get("contract")
-                if is_contract:
-                    order_info.is_contract = True
-                    order_info.contract_size = market.get("contractSize")
-                self.client.options["defaultType"] = "delivery"
-            else:
-                self.client.options["defaultType"] = "swap"
-        else:
-            self.client.options["defaultType"] = "spot"
+            return {"type": "delivery" if order_info.is_coinm else "swap"}
+        return {"type": "spot"}
 
-    def get_ticker(self, symbol: str):
-        return self.client.fetch_ticker(symbol)
+    async def get_ticker(self, symbol: str):
+        return await tickers.ado(
+            (self.client.id, symbol), lambda: self.client.fetch_ticker(symbol)
+        )
 
-    def get_price(self, symbol: str):
-        return self.get_ticker(symbol)["last"]
+    async def get_price(self, symbol: str):
+        return (await self.get_ticker(symbol))["last"]
 
-    def get_futures_position(self, symbol=None, all=False):
+    async def get_futures_position(self, order_info: MarketOrder, symbol=None, all=False):
         if symbol is None and all:
-            positions = self.client.fetch_balance()["info"]["positions"]
+            positions = (await self.client.fetch_balance(self.get_market_params(order_info)))["info"]["positions"]
             positions = [
                 position
                 for position in positions
@@ -59,8 +71,8 @@ class Binance:
             return positions
 
         positions = None
-        if self.order_info.is_coinm:
-            positions = self.client.fetch_balance()["info"]["positions"]
+        if order_info.is_coinm:
+            positions = (await self.client.fetch_balance(self.get_market_params(order_info)))["info"]["positions"]
             positions = [
                 position
                 for position in positions
@@ -68,12 +80,17 @@ class Binance:
                 and position["symbol"] == self.client.market(symbol).get("id")
             ]
         else:
-            positions = self.client.fetch_positions(symbols=[symbol])
+            positions = binance_stream.book.get_positions(self.client.market(symbol)["id"])
+            if positions is None:
+                positions = await self.client.fetch_positions(symbols=[symbol], params=self.get_market_params(order_info))
+
+        return self.parse_futures_position(order_info, positions)
 
+    def parse_futures_position(self, order_info: MarketOrder, positions):
         long_contracts = None
         short_contracts = None
         if positions:
-            if self.order_info.is_coinm:
+            if order_info.is_coinm:
                 for position in positions:
                     amt = float(position["positionAmt"])
                     if position["positionSide"] == "LONG":
@@ -91,12 +108,12 @@ class Binance:
                         long_contracts = position["contracts"]
                     elif position["side"] == "short":
                         short_contracts = position["contracts"]
-            if self.order_info.is_close and self.order_info.is_buy:
+            if order_info.is_close and order_info.is_buy:
                 if not short_contracts:
                     raise error.ShortPositionNoneError()
                 else:
                     return short_contracts
-            elif self.order_info.is_close and self.order_info.is_sell:
+            elif order_info.is_close and order_info.is_sell:
                 if not long_contracts:
                     raise error.LongPositionNoneError()
                 else:
@@ -104,61 +121,75 @@ class Binance:
         else:
             raise error.PositionNoneError()
 
-    def get_balance(self, base: str):
+    def uses_user_stream(self, order_info: MarketOrder) -> bool:
+        # 유저 데이터 스트림은 USDⓈ-M 선물 계정만 다룸
+        return bool(order_info.is_futures and not order_info.is_coinm)
+
+    def get_streamed_balance(self, order_info: MarketOrder, kind: str) -> dict | None:
+        if not self.uses_user_stream(order_info):
+            return None
+        return binance_stream.book.get_balance(kind)
+
+    def set_streamed_balance(self, order_info: MarketOrder, kind: str, balance: dict, version: int):
+        if self.uses_user_stream(order_info):
+            binance_stream.book.set_balance(kind, balance, version)
+
+    async def get_balance(self, order_info: MarketOrder, base: str):
         free_balance_by_base = None
 
-        if self.order_info.is_entry or (
-            self.order_info.is_spot
-            and (self.order_info.is_buy or self.order_info.is_sell)
+        if order_info.is_entry or (
+            order_info.is_spot
+            and (order_info.is_buy or order_info.is_sell)
         ):
-            free_balance = (
-                self.client.fetch_free_balance()
-                if not self.order_info.is_total
-                else self.client.fetch_total_balance()
-            )
+            kind = "total" if order_info.is_total else "free"
+            free_balance = self.get_streamed_balance(order_info, kind)
+            if free_balance is None:
+                version = binance_stream.book.version
+                free_balance = (
+                    await self.client.fetch_free_balance(self.get_market_params(order_info))
+                    if not order_info.is_total
+                    else await self.client.fetch_total_balance(self.get_market_params(order_info))
+                )
+                self.set_streamed_balance(order_info, kind, free_balance, version)
             free_balance_by_base = free_balance.get(base)
 
         if free_balance_by_base is None or free_balance_by_base == 0:
             raise error.FreeAmountNoneError()
         return free_balance_by_base
 
-    def get_amount(self, order_info: MarketOrder) -> float:
+    async def get_amount(self, order_info: MarketOrder) -> float:
         if order_info.amount is not None and order_info.percent is not None:
             raise error.AmountPercentBothError()
         elif order_info.amount is not None:
             if order_info.is_contract:
-                current_price = self.get_price(order_info.unified_symbol)
+                current_price = await self.get_price(order_info.unified_symbol)
                 result = (order_info.amount * current_price) // order_info.contract_size
             else:
                 result = order_info.amount
         elif order_info.percent is not None:
             if order_info.is_entry or (order_info.is_spot and order_info.is_buy):
                 if order_info.is_coinm:
-                    free_base = self.get_balance(order_info.base)
+                    free_base = await self.get_balance(order_info, order_info.base)
                     if order_info.is_contract:
-                        current_price = self.get_price(order_info.unified_symbol)
+                        current_price = await self.get_price(order_info.unified_symbol)
                         result = (
                             free_base * order_info.percent / 100 * current_price
                         ) // order_info.contract_size
                     else:
                         result = free_base * order_info.percent / 100
                 else:
-                    free_quote = self.get_balance(order_info.quote)
+                    free_quote = await self.get_balance(order_info, order_info.quote)
                     cash = free_quote * (order_info.percent - 0.5) / 100
-                    current_price = self.get_price(order_info.unified_symbol)
+                    current_price = await self.get_price(order_info.unified_symbol)
                     if order_info.is_contract:
                         result = (cash / current_price) // order_info.contract_size
                     else:
                         result = cash / current_price
-            elif self.order_info.is_close:
-                if order_info.is_contract:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * order_info.percent / 100
-                else:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * float(order_info.percent) / 100
+            elif order_info.is_close:
+                free_amount = await self.get_futures_position(order_info, order_info.unified_symbol)
+                result = free_amount * float(order_info.percent) / 100
             elif order_info.is_spot and order_info.is_sell:
-                free_amount = self.get_balance(order_info.base)
+                free_amount = await self.get_balance(order_info, order_info.base)
                 result = free_amount * float(order_info.percent) / 100
 
             result = float(
@@ -170,17 +201,25 @@ class Binance:
 
         return result
 
-    def set_leverage(self, leverage, symbol):
-        if self.order_info.is_futures:
-            self.client.set_leverage(leverage, symbol)
-
-    def market_order(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
-
-        symbol = order_info.unified_symbol  # self.parse_symbol(base, quote)
+    async def set_leverage(self, order_info: MarketOrder, leverage, symbol):
+        if order_info.is_futures:
+            market_id = self.client.market(symbol)["id"]
+            if account_configs.is_set("BINANCE", market_id, "leverage", leverage):
+                return
+            try:
+                await self.client.set_leverage(leverage, symbol)
+            except Exception:
+                account_configs.invalidate("BINANCE", market_id)
+                raise
+            account_configs.set("BINANCE", market_id, "leverage", leverage)
+
+    async def market_order(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
+
+        symbol = order_info.unified_symbol
         params = {}
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -194,65 +233,34 @@ class Binance:
                 instance=self,
             )
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
-
-    # async def market_order_async(
-    #     self,
-    #     base: str,
-    #     quote: str,
-    #     type: str,
-    #     side: str,
-    #     amount: float,
-    #     price: float = None,
-    # ):
-    #     symbol = self.parse_symbol(base, quote)
-    #     return await self.spot_async.create_order(
-    #         symbol, type.lower(), side.lower(), amount
-    #     )
-
-    def market_buy(self, order_info: MarketOrder):
+            raise error.OrderError(e, order_info)
+
+    async def market_buy(self, order_info: MarketOrder):
         # 수량기반
-        buy_amount = self.get_amount(order_info)
+        buy_amount = await self.get_amount(order_info)
         order_info.amount = buy_amount
 
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_sell(self, order_info: MarketOrder):
-        sell_amount = self.get_amount(order_info)
+    async def market_sell(self, order_info: MarketOrder):
+        sell_amount = await self.get_amount(order_info)
         order_info.amount = sell_amount
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_entry(
-        self,
-        order_info: MarketOrder,
-    ):
-        from exchange.pexchange import retry
+    async def market_entry(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
-        # self.client.options["defaultType"] = "swap"
-        symbol = self.order_info.unified_symbol  # self.parse_symbol(base, quote)
+        symbol = order_info.unified_symbol
 
-        entry_amount = self.get_amount(order_info)
+        entry_amount = await self.get_amount(order_info)
         if entry_amount == 0:
             raise error.MinAmountError()
-        if self.position_mode == "one-way":
-            params = {}
-        elif self.position_mode == "hedge":
-            if order_info.side == "buy":
-                if order_info.is_entry:
-                    positionSide = "LONG"
-                elif order_info.is_close:
-                    positionSide = "SHORT"
-            elif order_info.side == "sell":
-                if order_info.is_entry:
-                    positionSide = "SHORT"
-                elif order_info.is_close:
-                    positionSide = "LONG"
-            params = {"positionSide": positionSide}
+        params = self.get_position_params(order_info)
         if order_info.leverage is not None:
-            self.set_leverage(order_info.leverage, symbol)
+            await self.set_leverage(order_info, order_info.leverage, symbol)
 
         try:
-            result = retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -265,75 +273,15 @@ class Binance:
                 delay=0.1,
                 instance=self,
             )
-            return result
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
-
-    def is_hedge_mode(self):
-        response = self.client.fapiPrivate_get_positionside_dual()
-        if response["dualSidePosition"]:
-            return True
-        else:
-            return False
-
-    def market_sltp_order(
-        self,
-        base: str,
-        quote: str,
-        type: str,
-        side: str,
-        amount: float,
-        stop_price: float,
-        profit_price: float,
-    ):
-        symbol = self.order_info.unified_symbol  # self.parse_symbol(base, quote)
-        inverted_side = (
-            "sell" if side.lower() == "buy" else "buy"
-        )  # buy면 sell, sell이면 buy * 진입 포지션과 반대로 주문 넣어줘 야함
-        self.client.create_order(
-            symbol,
-            "STOP_MARKET",
-            inverted_side,
-            amount,
-            None,
-            {"stopPrice": stop_price, "newClientOrderId": "STOP_MARKET"},
-        )  # STOP LOSS 오더
-        self.client.create_order(
-            symbol,
-            "TAKE_PROFIT_MARKET",
-            inverted_side,
-            amount,
-            None,
-            {"stopPrice": profit_price, "newClientOrderId": "TAKE_PROFIT_MARKET"},
-        )  # TAKE profit 오더
-
-        # response = self.future.private_post_order_oco({
-        #     'symbol': self.future.market(symbol)['id'],
-        #     'side': 'BUY',  # SELL, BUY
-        #     'quantity': self.future.amount_to_precision(symbol, amount),
-        #     'price': self.future.price_to_precision(symbol, profit_price),
-        #     'stopPrice': self.future.price_to_precision(symbol, stop_price),
-        #     # 'stopLimitPrice': self.future.price_to_precision(symbol, stop_limit_price),  # If provided, stopLimitTimeInForce is required
-        #     # 'stopLimitTimeInForce': 'GTC',  # GTC, FOK, IOC
-        #     # 'listClientOrderId': exchange.uuid(),  # A unique Id for the entire orderList
-        #     # 'limitClientOrderId': exchange.uuid(),  # A unique Id for the limit order
-        #     # 'limitIcebergQty': exchangea.amount_to_precision(symbol, limit_iceberg_quantity),
-        #     # 'stopClientOrderId': exchange.uuid()  # A unique Id for the stop loss/stop loss limit leg
-        #     # 'stopIcebergQty': exchange.amount_to_precision(symbol, stop_iceberg_quantity),
-        #     # 'newOrderRespType': 'ACK',  # ACK, RESULT, FULL
-        # })
-
-    def market_close(
-        self,
-        order_info: MarketOrder,
-    ):
-        from exchange.pexchange import retry
-
-        symbol = self.order_info.unified_symbol  # self.parse_symbol(base, quote)
-        close_amount = self.get_amount(order_info)
-        if self.position_mode == "one-way":
-            params = {"reduceOnly": True}
-        elif self.position_mode == "hedge":
+            raise error.OrderError(e, order_info)
+
+    def get_position_params(self, order_info: MarketOrder):
+        if order_info.position_mode == "one-way":
+            if order_info.is_close:
+                return {"reduceOnly": True}
+            return {}
+        elif order_info.position_mode == "hedge":
             if order_info.side == "buy":
                 if order_info.is_entry:
                     positionSide = "LONG"
@@ -344,10 +292,24 @@ class Binance:
                     positionSide = "SHORT"
                 elif order_info.is_close:
                     positionSide = "LONG"
-            params = {"positionSide": positionSide}
+            return {"positionSide": positionSide}
+
+    async def is_hedge_mode(self):
+        response = await self.client.fapiPrivateGetPositionSideDual()
+        if response["dualSidePosition"]:
+            return True
+        else:
+            return False
+
+    async def market_close(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
+
+        symbol = order_info.unified_symbol
+        close_amount = await self.get_amount(order_info)
+        params = self.get_position_params(order_info)
 
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -361,18 +323,4 @@ class Binance:
                 instance=self,
             )
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
-
-    def get_listen_key(self):
-        url = "https://fapi.binance.com/fapi/v1/listenKey"
-
-        listenkey = httpx.post(
-            url, headers={"X-MBX-APIKEY": self.client.apiKey}
-        ).json()["listenKey"]
-        return listenkey
-
-    def get_trades(self):
-        is_futures = self.order_info.is_futures
-        if is_futures:
-            trades = self.client.fetch_my_trades()
-            print(trades)
+            raise error.OrderError(e, order_info)
@@ -1,26 +1,35 @@
 from pprint import pprint
-from exchange.pexchange import ccxt
+from exchange.pexchange import ccxt_async
+from exchange.markets import async_load_markets
+from exchange.singleflight import tickers
+from exchange.position_mode import position_modes
+from exchange.account_config import account_configs, MISSING
 from exchange.database import db
 from exchange.model import MarketOrder
 import exchange.error as error
 from devtools import debug
 
 
-class Bitget:
+class AsyncBitget:
+    """ccxt.async_support 기반 비트겟"""
+
     def __init__(self, key, secret, passphrase=None):
-        self.client = ccxt.bitget(
+        self.client = ccxt_async.bitget(
             {
                 "apiKey": key,
                 "secret": secret,
                 "password": passphrase,
             }
         )
-        self.client.load_markets()
-        self.order_info: MarketOrder = None
-        self.position_mode = "hedge"
+
+    async def load_markets(self):
+        await async_load_markets(self.client)
+
+    async def close(self):
+        await self.client.close()
 
     def init_info(self, order_info: MarketOrder):
-        self.order_info = order_info
+        order_info.position_mode = position_modes.get(order_info.exchange, order_info.unified_symbol)
 
         unified_symbol = order_info.unified_symbol
         market = self.client.market(unified_symbol)
@@ -32,26 +41,31 @@ class Bitget:
                 )
             )
 
+        if order_info.is_futures and order_info.is_coinm:
+            is_contract = market.get("contract")
+            if is_contract:
+                order_info.is_contract = True
+                order_info.contract_size = market.get("contractSize")
+
+    def get_market_params(self, order_info: MarketOrder) -> dict:
+        # 클라이언트의 defaultType 을 바꾸지 않고 호출마다 마켓 종류를 지정 (동시에 다른 종류의 주문이 들어와도 안전)
         if order_info.is_futures:
-            if order_info.is_coinm:
-                self.client.options["defaultType"] = "delivery"
-                is_contract = market.get("contract")
-                if is_contract:
-                    order_info.is_contract = True
-                    order_info.contract_size = market.get("contractSize")
-            else:
-                self.client.options["defaultType"] = "swap"
-        else:
-            self.client.options["defaultType"] = "spot"
+            return {"type": "delivery" if order_info.is_coinm else "swap"}
+        return {"type": "spot"}
 
-    def get_ticker(self, symbol: str):
-        return self.client.fetch_ticker(symbol)
+    async def get_ticker(self, symbol: str):
+        return await tickers.ado(
+            (self.client.id, symbol), lambda: self.client.fetch_ticker(symbol)
+        )
+
+    async def get_price(self, symbol: str):
+        return (await self.get_ticker(symbol))["last"]
 
-    def get_price(self, symbol: str):
-        return self.get_ticker(symbol)["last"]
+    async def get_futures_position(self, order_info: MarketOrder, symbol):
+        positions = await self.client.fetch_positions([symbol])
+        return self.parse_futures_position(order_info, positions)
 
-    def get_futures_position(self, symbol):
-        positions = self.client.fetch_positions([symbol])
+    def parse_futures_position(self, order_info: MarketOrder, positions):
         long_contracts = None
         short_contracts = None
 
@@ -63,12 +77,12 @@ class Bitget:
                     elif position["side"] == "short":
                         short_contracts = float(position["info"]["available"])
 
-                if self.order_info.is_close and self.order_info.is_buy:
+                if order_info.is_close and order_info.is_buy:
                     if not short_contracts:
                         raise error.ShortPositionNoneError()
                     else:
                         return short_contracts
-                elif self.order_info.is_close and self.order_info.is_sell:
+                elif order_info.is_close and order_info.is_sell:
                     if not long_contracts:
                         raise error.LongPositionNoneError()
                     else:
@@ -82,23 +96,23 @@ class Bitget:
         else:
             raise error.PositionNoneError()
 
-    def get_balance(self, base: str):
+    async def get_balance(self, order_info: MarketOrder, base: str):
         free_balance_by_base = None
-        if self.order_info.is_entry or (
-            self.order_info.is_spot
-            and (self.order_info.is_buy or self.order_info.is_sell)
+        if order_info.is_entry or (
+            order_info.is_spot
+            and (order_info.is_buy or order_info.is_sell)
         ):
             free_balance = (
-                self.client.fetch_free_balance({"coin": base})
-                if not self.order_info.is_total
-                else self.client.fetch_total_balance({"coin": base})
+                await self.client.fetch_free_balance({"coin": base} | self.get_market_params(order_info))
+                if not order_info.is_total
+                else await self.client.fetch_total_balance({"coin": base} | self.get_market_params(order_info))
             )
             free_balance_by_base = free_balance.get(base)
         if free_balance_by_base is None or free_balance_by_base == 0:
             raise error.FreeAmountNoneError()
         return free_balance_by_base
 
-    def get_amount(self, order_info: MarketOrder) -> float:
+    async def get_amount(self, order_info: MarketOrder) -> float:
         if order_info.amount is not None and order_info.percent is not None:
             raise error.AmountPercentBothError()
         elif order_info.amount is not None:
@@ -106,15 +120,15 @@ class Bitget:
 
         elif order_info.percent is not None:
             if order_info.is_entry or (order_info.is_spot and order_info.is_buy):
-                free_quote = self.get_balance(order_info.quote)
+                free_quote = await self.get_balance(order_info, order_info.quote)
                 cash = free_quote * (order_info.percent - 1) / 100
-                current_price = self.get_price(order_info.unified_symbol)
+                current_price = await self.get_price(order_info.unified_symbol)
                 result = cash / current_price
-            elif self.order_info.is_close:
-                free_amount = self.get_futures_position(order_info.unified_symbol)
+            elif order_info.is_close:
+                free_amount = await self.get_futures_position(order_info, order_info.unified_symbol)
                 result = free_amount * order_info.percent / 100
             elif order_info.is_spot and order_info.is_sell:
-                free_amount = self.get_balance(order_info.base)
+                free_amount = await self.get_balance(order_info, order_info.base)
                 result = free_amount * order_info.percent / 100
             result = float(
                 self.client.amount_to_precision(order_info.unified_symbol, result)
@@ -124,33 +138,66 @@ class Bitget:
             raise error.AmountPercentNoneError()
         return result
 
-    def set_leverage(self, leverage, symbol):
-        if self.order_info.is_buy:
+    async def set_leverage(self, order_info: MarketOrder, leverage, symbol):
+        market = self.client.market(symbol)
+        margin_mode = account_configs.get("BITGET", market["id"], "margin_mode")
+        if margin_mode is MISSING:
+            account = await self.client.privateMixGetAccountAccount(
+                {"symbol": market["id"], "marginCoin": market["settleId"]}
+            )
+            margin_mode = account["data"]["marginMode"]
+            account_configs.set("BITGET", market["id"], "margin_mode", margin_mode)
+        request = self.get_leverage_request(order_info, leverage, market, margin_mode)
+        field = self.get_leverage_field(request)
+        if account_configs.is_set("BITGET", market["id"], field, leverage):
+            return
+        try:
+            result = await self.client.privateMixPostAccountSetLeverage(request)
+        except Exception:
+            account_configs.invalidate("BITGET", market["id"])
+            raise
+        account_configs.set("BITGET", market["id"], field, leverage)
+        return result
+
+    def get_leverage_request(self, order_info: MarketOrder, leverage, market, margin_mode):
+        if order_info.is_buy:
             hold_side = "long"
-        elif self.order_info.is_sell:
+        elif order_info.is_sell:
             hold_side = "short"
-        market = self.client.market(symbol)
         request = {
             "symbol": market["id"],
             "marginCoin": market["settleId"],
             "leverage": leverage,
             # 'holdSide': 'long' or 'short',
         }
-
-        account = self.client.privateMixGetAccountAccount(
-            {"symbol": market["id"], "marginCoin": market["settleId"]}
-        )
-        if account["data"]["marginMode"] == "fixed":
+        if margin_mode == "fixed":
             request |= {"holdSide": hold_side}
-        return self.client.privateMixPostAccountSetLeverage(request)
+        return request
+
+    def get_leverage_field(self, request: dict) -> str:
+        # 격리(fixed) 모드는 롱/숏 레버리지를 따로 설정
+        if "holdSide" in request:
+            return f"leverage:{request['holdSide']}"
+        return "leverage"
+
+    def get_position_params(self, order_info: MarketOrder):
+        if order_info.position_mode == "one-way":
+            new_side = order_info.side + "_single"
+            if order_info.is_close:
+                return {"reduceOnly": True, "side": new_side}
+            return {"side": new_side}
+        elif order_info.position_mode == "hedge":
+            if order_info.is_close:
+                return {"reduceOnly": True}
+            return {}
 
-    def market_order(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_order(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
         symbol = order_info.unified_symbol
         params = {}
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -166,35 +213,31 @@ class Bitget:
         except Exception as e:
             raise error.OrderError(e, order_info)
 
-    def market_buy(self, order_info: MarketOrder):
+    async def market_buy(self, order_info: MarketOrder):
         # 비용주문
-        buy_amount = self.get_amount(order_info)
+        buy_amount = await self.get_amount(order_info)
         order_info.amount = buy_amount
-        order_info.price = self.get_price(order_info.unified_symbol)
+        order_info.price = await self.get_price(order_info.unified_symbol)
 
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_sell(self, order_info: MarketOrder):
-        sell_amount = self.get_amount(order_info)
+    async def market_sell(self, order_info: MarketOrder):
+        sell_amount = await self.get_amount(order_info)
         order_info.amount = sell_amount
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_entry(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_entry(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
         symbol = order_info.unified_symbol
-        entry_amount = self.get_amount(order_info)
+        entry_amount = await self.get_amount(order_info)
         if entry_amount == 0:
             raise error.MinAmountError()
-        if self.position_mode == "one-way":
-            new_side = order_info.side + "_single"
-            params = {"side": new_side}
-        elif self.position_mode == "hedge":
-            params = {}
+        params = self.get_position_params(order_info)
         if order_info.leverage is not None:
-            self.set_leverage(order_info.leverage, symbol)
+            await self.set_leverage(order_info, order_info.leverage, symbol)
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -211,18 +254,14 @@ class Bitget:
         except Exception as e:
             raise error.OrderError(e, order_info)
 
-    def market_close(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_close(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
-        symbol = self.order_info.unified_symbol
-        close_amount = self.get_amount(order_info)
-        if self.position_mode == "one-way":
-            new_side = order_info.side + "_single"
-            params = {"reduceOnly": True, "side": new_side}
-        elif self.position_mode == "hedge":
-            params = {"reduceOnly": True}
+        symbol = order_info.unified_symbol
+        close_amount = await self.get_amount(order_info)
+        params = self.get_position_params(order_info)
         try:
-            result = retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -235,7 +274,5 @@ class Bitget:
                 delay=0.1,
                 instance=self,
             )
-
-            return result
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
+            raise error.OrderError(e, order_info)
@@ -1,29 +1,38 @@
 from pprint import pprint
-from exchange.pexchange import ccxt
+from exchange.pexchange import ccxt_async
+from exchange.markets import async_load_markets
+from exchange.singleflight import tickers
+from exchange.position_mode import position_modes
+from exchange.account_config import account_configs
 from exchange.model import MarketOrder
-import time
+import asyncio
 import exchange.error as error
 from devtools import debug
 
 
-class Bybit:
+class AsyncBybit:
+    """ccxt.async_support 기반 바이비트"""
+
     def __init__(self, key, secret):
-        self.client = ccxt.bybit(
+        self.client = ccxt_async.bybit(
             {
                 "apiKey": key,
                 "secret": secret,
                 "options": {"adjustForTimeDifference": True},
             }
         )
-        self.client.load_markets()
-        self.order_info: MarketOrder = None
-        self.position_mode = "one-way"
 
-    def load_time_difference(self):
-        self.client.load_time_difference()
+    async def load_markets(self):
+        await async_load_markets(self.client)
+
+    async def close(self):
+        await self.client.close()
+
+    async def load_time_difference(self):
+        await self.client.load_time_difference()
 
     def init_info(self, order_info: MarketOrder):
-        self.order_info = order_info
+        order_info.position_mode = position_modes.get(order_info.exchange, order_info.unified_symbol)
 
         unified_symbol = order_info.unified_symbol
         market = self.client.market(unified_symbol)
@@ -35,26 +44,31 @@ class Bybit:
                 )
             )
 
+        if order_info.is_futures and order_info.is_coinm:
+            is_contract = market.get("contract")
+            if is_contract:
+                order_info.is_contract = True
+                order_info.contract_size = market.get("contractSize")
+
+    def get_market_params(self, order_info: MarketOrder) -> dict:
+        # 클라이언트의 defaultType 을 바꾸지 않고 호출마다 마켓 종류를 지정 (동시에 다른 종류의 주문이 들어와도 안전)
         if order_info.is_futures:
-            if order_info.is_coinm:
-                self.client.options["defaultType"] = "delivery"
-                is_contract = market.get("contract")
-                if is_contract:
-                    order_info.is_contract = True
-                    order_info.contract_size = market.get("contractSize")
-            else:
-                self.client.options["defaultType"] = "swap"
-        else:
-            self.client.options["defaultType"] = "spot"
+            return {"type": "delivery" if order_info.is_coinm else "swap"}
+        return {"type": "spot"}
+
+    async def get_ticker(self, symbol: str):
+        return await tickers.ado(
+            (self.client.id, symbol), lambda: self.client.fetch_ticker(symbol)
+        )
 
-    def get_ticker(self, symbol: str):
-        return self.client.fetch_ticker(symbol)
+    async def get_price(self, symbol: str):
+        return (await self.get_ticker(symbol))["last"]
 
-    def get_price(self, symbol: str):
-        return self.get_ticker(symbol)["last"]
+    async def get_futures_position(self, order_info: MarketOrder, symbol):
+        positions = await self.client.fetch_positions(symbols=[symbol])
+        return self.parse_futures_position(order_info, positions)
 
-    def get_futures_position(self, symbol):
-        positions = self.client.fetch_positions(symbols=[symbol])
+    def parse_futures_position(self, order_info: MarketOrder, positions):
         long_contracts = None
         short_contracts = None
         if positions:
@@ -64,12 +78,12 @@ class Bybit:
                 elif position["side"] == "short":
                     short_contracts = position["contracts"]
 
-            if self.order_info.is_close and self.order_info.is_buy:
+            if order_info.is_close and order_info.is_buy:
                 if not short_contracts:
                     raise error.ShortPositionNoneError()
                 else:
                     return short_contracts
-            elif self.order_info.is_close and self.order_info.is_sell:
+            elif order_info.is_close and order_info.is_sell:
                 if not long_contracts:
                     raise error.LongPositionNoneError()
                 else:
@@ -77,16 +91,16 @@ class Bybit:
         else:
             raise error.PositionNoneError()
 
-    def get_balance(self, base: str):
+    async def get_balance(self, order_info: MarketOrder, base: str):
         free_balance_by_base = None
-        if self.order_info.is_entry or (
-            self.order_info.is_spot
-            and (self.order_info.is_buy or self.order_info.is_sell)
+        if order_info.is_entry or (
+            order_info.is_spot
+            and (order_info.is_buy or order_info.is_sell)
         ):
             free_balance = (
-                self.client.fetch_free_balance()
-                if not self.order_info.is_total
-                else self.client.fetch_total_balance()
+                await self.client.fetch_free_balance(self.get_market_params(order_info))
+                if not order_info.is_total
+                else await self.client.fetch_total_balance(self.get_market_params(order_info))
             )
             free_balance_by_base = free_balance.get(base)
 
@@ -94,30 +108,26 @@ class Bybit:
             raise error.FreeAmountNoneError()
         return free_balance_by_base
 
-    def get_amount(self, order_info: MarketOrder) -> float:
+    async def get_amount(self, order_info: MarketOrder) -> float:
         if order_info.amount is not None and order_info.percent is not None:
             raise error.AmountPercentBothError()
         elif order_info.amount is not None:
             if order_info.is_contract:
-                current_price = self.get_price(order_info.unified_symbol)
+                current_price = await self.get_price(order_info.unified_symbol)
                 result = (order_info.amount * current_price) // order_info.contract_size
             else:
                 result = order_info.amount
         elif order_info.percent is not None:
             if order_info.is_entry or (order_info.is_spot and order_info.is_buy):
-                free_quote = self.get_balance(order_info.quote)
+                free_quote = await self.get_balance(order_info, order_info.quote)
                 cash = free_quote * (order_info.percent - 0.5) / 100
-                current_price = self.get_price(order_info.unified_symbol)
+                current_price = await self.get_price(order_info.unified_symbol)
                 result = cash / current_price
-            elif self.order_info.is_close:
-                if order_info.is_contract:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * order_info.percent / 100
-                else:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * order_info.percent / 100
+            elif order_info.is_close:
+                free_amount = await self.get_futures_position(order_info, order_info.unified_symbol)
+                result = free_amount * order_info.percent / 100
             elif order_info.is_spot and order_info.is_sell:
-                free_amount = self.get_balance(order_info.base)
+                free_amount = await self.get_balance(order_info, order_info.base)
                 result = free_amount * order_info.percent / 100
             result = float(
                 self.client.amount_to_precision(order_info.unified_symbol, result)
@@ -127,40 +137,67 @@ class Bybit:
             raise error.AmountPercentNoneError()
         return result
 
-    def set_leverage(self, leverage: float, symbol: str):
+    async def set_leverage(self, order_info: MarketOrder, leverage: float, symbol: str):
+        market_id = self.client.market(symbol)["id"]
+        if account_configs.is_set("BYBIT", market_id, "leverage", leverage):
+            return
         try:
-            self.client.set_leverage(leverage, symbol)
+            await self.client.set_leverage(leverage, symbol)
         except Exception as e:
             error = str(e)
             if "leverage not modified" in error:
                 pass
             else:
+                account_configs.invalidate("BYBIT", market_id)
                 raise Exception(e)
+        account_configs.set("BYBIT", market_id, "leverage", leverage)
+
+    def get_position_params(self, order_info: MarketOrder):
+        if order_info.position_mode == "one-way":
+            if order_info.is_close:
+                return {"reduceOnly": True, "position_idx": 0}
+            return {"position_idx": 0}
+        elif order_info.position_mode == "hedge":
+            if order_info.side == "buy":
+                if order_info.is_entry:
+                    position_idx = 1
+                    params = {"position_idx": position_idx}
+                elif order_info.is_close:
+                    position_idx = 2
+                    params = {"reduceOnly": True, "position_idx": position_idx}
+            elif order_info.side == "sell":
+                if order_info.is_entry:
+                    position_idx = 2
+                    params = {"position_idx": position_idx}
+                elif order_info.is_close:
+                    position_idx = 1
+                    params = {"reduceOnly": True, "position_idx": position_idx}
+        return params
 
-    def get_order_amount(self, order_id: str, order_info: MarketOrder):
+    async def get_order_amount(self, order_id: str, order_info: MarketOrder):
         order_amount = None
         for i in range(8):
             try:
                 if order_info.is_futures:
-                    order_result = self.client.fetch_order(
+                    order_result = await self.client.fetch_order(
                         order_id, order_info.unified_symbol
                     )
                 else:
-                    order_result = self.client.fetch_order(order_id)
+                    order_result = await self.client.fetch_order(order_id)
                 order_amount = order_result["amount"]
                 break
             except Exception as e:
                 print("...", e)
-                time.sleep(0.5)
+                await asyncio.sleep(0.5)
         return order_amount
 
-    def market_order(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_order(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
         symbol = order_info.unified_symbol
         params = {}
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -176,53 +213,34 @@ class Bybit:
         except Exception as e:
             raise error.OrderError(e, order_info)
 
-    def market_buy(
-        self,
-        order_info: MarketOrder,
-    ):
+    async def market_buy(self, order_info: MarketOrder):
         # 비용주문
-        buy_amount = self.get_amount(order_info)
+        buy_amount = await self.get_amount(order_info)
         order_info.amount = buy_amount
-        order_info.price = self.get_price(order_info.unified_symbol)
+        order_info.price = await self.get_price(order_info.unified_symbol)
 
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_sell(self, order_info: MarketOrder):
-        sell_amount = self.get_amount(order_info)
+    async def market_sell(self, order_info: MarketOrder):
+        sell_amount = await self.get_amount(order_info)
         order_info.amount = sell_amount
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def market_entry(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_entry(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
         symbol = order_info.unified_symbol
 
-        entry_amount = self.get_amount(order_info)
+        entry_amount = await self.get_amount(order_info)
         if entry_amount == 0:
             raise error.MinAmountError()
 
-        if self.position_mode == "one-way":
-            params = {"position_idx": 0}
-        elif self.position_mode == "hedge":
-            if order_info.side == "buy":
-                if order_info.is_entry:
-                    position_idx = 1
-                    params = {"position_idx": position_idx}
-                elif order_info.is_close:
-                    position_idx = 2
-                    params = {"reduceOnly": True, "position_idx": position_idx}
-            elif order_info.side == "sell":
-                if order_info.is_entry:
-                    position_idx = 2
-                    params = {"position_idx": position_idx}
-                elif order_info.is_close:
-                    position_idx = 1
-                    params = {"reduceOnly": True, "position_idx": position_idx}
+        params = self.get_position_params(order_info)
 
         if order_info.leverage is not None:
-            self.set_leverage(order_info.leverage, symbol)
+            await self.set_leverage(order_info, order_info.leverage, symbol)
         try:
-            result = retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -235,38 +253,19 @@ class Bybit:
                 delay=0.1,
                 instance=self,
             )
-            # order_amount = self.get_order_amount(result["id"], order_info)
-            # result["amount"] = order_amount
-            return result
         except Exception as e:
             raise error.OrderError(e, order_info)
 
-    def market_close(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_close(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
-        symbol = self.order_info.unified_symbol
-        close_amount = self.get_amount(order_info)
+        symbol = order_info.unified_symbol
+        close_amount = await self.get_amount(order_info)
 
-        if self.position_mode == "one-way":
-            params = {"reduceOnly": True, "position_idx": 0}
-        elif self.position_mode == "hedge":
-            if order_info.side == "buy":
-                if order_info.is_entry:
-                    position_idx = 1
-                    params = {"position_idx": position_idx}
-                elif order_info.is_close:
-                    position_idx = 2
-                    params = {"reduceOnly": True, "position_idx": position_idx}
-            elif order_info.side == "sell":
-                if order_info.is_entry:
-                    position_idx = 2
-                    params = {"position_idx": position_idx}
-                elif order_info.is_close:
-                    position_idx = 1
-                    params = {"reduceOnly": True, "position_idx": position_idx}
+        params = self.get_position_params(order_info)
 
         try:
-            result = retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -279,8 +278,5 @@ class Bybit:
                 delay=0.1,
                 instance=self,
             )
-            # order_amount = self.get_order_amount(result["id"], order_info)
-            # result["amount"] = order_amount
-            return result
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
+            raise error.OrderError(e, order_info)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from loguru import logger
+from exchange.utility import settings
+
+# 서명 타임스탬프에 ccxt 의 options["timeDifference"] 를 빼 주는(nonce) 거래소
+NONCE_ADJUSTED_EXCHANGES = ("BINANCE", "BYBIT")
+# 서명 타임스탬프로 milliseconds() 를 그대로 쓰는 거래소, 클라이언트 시계를 서버 시각으로 옮겨서 적용
+CLOCK_SHIFTED_EXCHANGES = ("OKX", "BITGET")
+CLOCK_EXCHANGES = NONCE_ADJUSTED_EXCHANGES + CLOCK_SHIFTED_EXCHANGES
+# 한 번 동기화할 때 서버 시각을 조회하는 횟수, 왕복 시간이 가장 짧은 값을 사용
+SAMPLES = 3
+# 이보다 크게 바뀌면 경고 로그
+DRIFT_WARNING_MS = 500
+
+
+def shift_clock(client):
+    """client.milliseconds() 가 로컬 시각 대신 서버 시각을 반환하도록 교체"""
+    if "milliseconds" in client.__dict__:
+        return
+    client.milliseconds = lambda: int(time.time() * 1000) - client.options.get("timeDifference", 0)
+
+
+class ClockSync:
+    """서명 요청을 보내는 거래소의 서버 시각과 로컬 시각 차이를 주기적으로 측정해 클라이언트에 적용
+
+    주문이 타임스탬프 에러로 실패한 뒤에야 맞추지 않도록 CLOCK_SYNC_INTERVAL 초마다 미리 맞춥니다.
+    차이(ms)는 ccxt 와 같이 로컬 시각 - 서버 시각 입니다.
+    """
+
+    def __init__(self):
+        self.offsets: dict[str, int] = {}
+        self.rtts: dict[str, float] = {}
+        self.synced_at: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    def apply(self, exchange_name: str, client):
+        offset = self.offsets.get(exchange_name)
+        if exchange_name not in CLOCK_EXCHANGES or offset is None:
+            return
+        client.options["timeDifference"] = offset
+        if exchange_name in CLOCK_SHIFTED_EXCHANGES:
+            shift_clock(client)
+
+    async def fetch_time(self, client) -> int:
+        return await client.fetch_time()
+
+    async def sample(self, client) -> tuple[int, float]:
+        """(로컬 시각 - 서버 시각, 왕복 시간) 을 측정, 서버 시각은 요청과 응답의 중간 시점으로 간주"""
+        best = None
+        for _ in range(SAMPLES):
+            before = time.time()
+            server_time = await self.fetch_time(client)
+            after = time.time()
+            rtt = after - before
+            if best is None or rtt < best[1]:
+                best = (int((before + after) / 2 * 1000) - server_time, rtt)
+        return best
+
+    async def sync(self, exchange_name: str, clients: list):
+        try:
+            offset, rtt = await self.sample(clients[0])
+        except Exception as e:
+            self.errors[exchange_name] = str(e)
+            logger.warning(f"{exchange_name} 서버 시각 조회 실패: {e}")
+            return
+        previous = self.offsets.get(exchange_name)
+        if previous is not None and abs(offset - previous) > DRIFT_WARNING_MS:
+            logger.warning(f"{exchange_name} 시각 차이 변화 {previous}ms -> {offset}ms")
+        self.offsets[exchange_name] = offset
+        self.rtts[exchange_name] = rtt
+        self.synced_at[exchange_name] = time.time()
+        self.errors.pop(exchange_name, None)
+        for client in clients:
+            self.apply(exchange_name, client)
+
+    async def run(self, get_clients):
+        """get_clients() 가 돌려주는 {거래소: [클라이언트, ...]} 를 취소될 때까지 주기적으로 동기화
+
+        첫 번째 클라이언트로 측정하고, 같은 거래소의 다른 클라이언트에도 같은 값을 적용합니다.
+        """
+        while True:
+            clients = {
+                exchange_name: exchange_clients
+                for exchange_name, exchange_clients in get_clients().items()
+                if exchange_name in CLOCK_EXCHANGES and exchange_clients
+            }
+            await asyncio.gather(
+                *(self.sync(exchange_name, exchange_clients) for exchange_name, exchange_clients in clients.items())
+            )
+            await asyncio.sleep(settings.CLOCK_SYNC_INTERVAL)
+
+    def status(self) -> dict:
+        return {
+            exchange_name: {
+                "offset_ms": offset,
+                "rtt_ms": round(self.rtts[exchange_name] * 1000),
+                "synced_at": self.synced_at[exchange_name],
+            }
+            for exchange_name, offset in self.offsets.items()
+        } | {"errors": self.errors}
+
+
+clock_sync = ClockSync()
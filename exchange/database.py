@@ -1,6 +1,11 @@
 import sqlite3
 import traceback
 import os
+import queue
+from concurrent.futures import Future
+import threading
+import time
+import orjson
 from pathlib import Path
 
 current_file_direcotry = os.path.dirname(os.path.realpath(__file__))
@@ -16,28 +21,37 @@ class Database:
         cls = type(self)
         if not hasattr(cls, "_init"):
             self.database_url = database_url
-            self.con = sqlite3.connect(self.database_url)
+            # 스레드풀에서도 사용하므로 커넥션 공유 + 락으로 직렬화
+            self.con = sqlite3.connect(self.database_url, check_same_thread=False)
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute("PRAGMA synchronous=NORMAL")
             self.cursor = self.con.cursor()
+            self.lock = threading.RLock()
             cls._init = True
 
     def close(self):
-        self.con.close()
+        with self.lock:
+            self.con.close()
 
     def excute(self, query: str, value: dict | tuple):
-        self.cursor.execute(query, value)
-        self.con.commit()
+        with self.lock:
+            self.cursor.execute(query, value)
+            self.con.commit()
 
     def excute_many(self, query: str, values: list[dict | tuple]):
-        self.cursor.executemany(query, values)
-        self.con.commit()
+        with self.lock:
+            self.cursor.executemany(query, values)
+            self.con.commit()
 
     def fetch_one(self, query: str, value: dict | tuple):
-        self.cursor.execute(query, value)
-        return self.cursor.fetchone()
+        with self.lock:
+            self.cursor.execute(query, value)
+            return self.cursor.fetchone()
 
     def fetch_all(self, query: str, value: dict | tuple):
-        self.cursor.execute(query, value)
-        return self.cursor.fetchall()
+        with self.lock:
+            self.cursor.execute(query, value)
+            return self.cursor.fetchall()
 
     def set_auth(self, exchange, access_token, access_token_token_expired):
         query = """
@@ -70,10 +84,217 @@ class Database:
         );
         """
         self.excute(query, {})
+        query = """
+        CREATE TABLE IF NOT EXISTS order_journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket TEXT NOT NULL,
+            state TEXT NOT NULL,
+            data TEXT,
+            created_at REAL NOT NULL
+        );
+        """
+        self.excute(query, {})
+        query = """
+        CREATE INDEX IF NOT EXISTS order_journal_ticket ON order_journal (ticket, id);
+        """
+        self.excute(query, {})
+        query = """
+        CREATE INDEX IF NOT EXISTS order_journal_state ON order_journal (state, created_at);
+        """
+        self.excute(query, {})
+        query = """
+        CREATE TABLE IF NOT EXISTS position_modes (
+            exchange TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (exchange, symbol)
+        );
+        """
+        self.excute(query, {})
+        query = """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        """
+        self.excute(query, {})
         # self.clear_auth()
 
+    def set_position_mode(self, exchange: str, symbol: str, mode: str):
+        query = """
+        INSERT INTO position_modes (exchange, symbol, mode, updated_at)
+        VALUES (:exchange, :symbol, :mode, :updated_at)
+        ON CONFLICT(exchange, symbol) DO UPDATE SET
+        mode=excluded.mode,
+        updated_at=excluded.updated_at;
+        """
+        return self.excute(
+            query,
+            {"exchange": exchange, "symbol": symbol, "mode": mode, "updated_at": time.time()},
+        )
+
+    def get_position_modes(self):
+        query = """
+        SELECT exchange, symbol, mode FROM position_modes;
+        """
+        return self.fetch_all(query, {})
+
+    def get_unfinished_orders(self, before: float):
+        """before 이전에 접수되어 마지막 상태가 accepted/executing 인 주문의 (ticket, state, 접수 payload) 목록"""
+        query = """
+        SELECT last.ticket, last.state, accepted.data
+        FROM order_journal AS last
+        JOIN order_journal AS accepted
+            ON accepted.ticket = last.ticket AND accepted.state = 'accepted'
+        WHERE last.id = (SELECT MAX(id) FROM order_journal WHERE ticket = last.ticket)
+            AND last.state IN ('accepted', 'executing')
+            AND accepted.created_at < :before
+        ORDER BY accepted.id;
+        """
+        return self.fetch_all(query, {"before": before})
+
+    def get_order_journal(self, ticket: str):
+        """티켓의 (state, data, created_at) 기록을 저널 순서대로"""
+        query = """
+        SELECT state, data, created_at FROM order_journal WHERE ticket = :ticket ORDER BY id;
+        """
+        return self.fetch_all(query, {"ticket": ticket})
+
+    def count_pending_pair_orders(self, pair: str, ticket: str, since: float) -> int:
+        """since 이후 ticket 보다 먼저 접수되어 아직 끝나지 않은 같은 페어 주문 수"""
+        query = """
+        SELECT COUNT(*)
+        FROM order_journal AS accepted
+        WHERE accepted.state = 'accepted'
+            AND accepted.created_at > :since
+            AND accepted.id < (
+                SELECT id FROM order_journal WHERE ticket = :ticket AND state = 'accepted'
+            )
+            AND json_extract(accepted.data, '$.pair') = :pair
+            AND (
+                SELECT state FROM order_journal WHERE ticket = accepted.ticket ORDER BY id DESC LIMIT 1
+            ) IN ('accepted', 'executing');
+        """
+        return self.fetch_one(query, {"pair": pair, "ticket": ticket, "since": since})[0]
+
+    def delete_finished_orders(self, before: float) -> int:
+        """before 이전에 체결/실패로 끝난 주문의 저널 기록을 삭제 (끝나지 않은 주문은 복구용으로 남김)"""
+        query = """
+        DELETE FROM order_journal WHERE ticket IN (
+            SELECT last.ticket FROM order_journal AS last
+            WHERE last.state IN ('filled', 'failed')
+                AND last.created_at < :before
+                AND last.id = (SELECT MAX(id) FROM order_journal WHERE ticket = last.ticket)
+        );
+        """
+        with self.lock:
+            self.cursor.execute(query, {"before": before})
+            self.con.commit()
+            return self.cursor.rowcount
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """만료됐거나 자신이 가진 lease 만 가져옴(갱신), 여러 프로세스가 같은 파일을 써도 원자적"""
+        now = time.time()
+        query = """
+        INSERT INTO leases (name, owner, expires_at) VALUES (:name, :owner, :expires_at)
+        ON CONFLICT(name) DO UPDATE SET
+        owner=excluded.owner,
+        expires_at=excluded.expires_at
+        WHERE leases.owner = excluded.owner OR leases.expires_at < :now;
+        """
+        with self.lock:
+            self.cursor.execute(
+                query,
+                {"name": name, "owner": owner, "expires_at": now + ttl, "now": now},
+            )
+            self.con.commit()
+            return self.cursor.rowcount > 0
+
+    def release_lease(self, name: str, owner: str):
+        query = """
+        DELETE FROM leases WHERE name = :name AND owner = :owner;
+        """
+        return self.excute(query, {"name": name, "owner": owner})
+
+
+class OrderJournal:
+    """주문 상태 전이를 order_journal 테이블에 기록하는 write-ahead 저널
+
+    append 는 큐에 넣기만 하고 바로 반환하며, 전용 스레드가 쌓인 기록을 한 트랜잭션으로
+    모아서 커밋(group commit)합니다. 웹훅 처리 경로에는 수 마이크로초만 더해집니다.
+    커밋을 기다려야 하면 append 가 반환한 Future 를 기다립니다.
+    """
+
+    def __init__(self, database_url: str, batch_size: int = 256):
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: threading.Thread | None = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name="order-journal", daemon=True
+                )
+                self.thread.start()
+
+    def append(self, ticket: str, state: str, data=None) -> Future:
+        """기록을 큐에 넣고, 그 기록이 커밋되면 완료되는 Future 를 반환"""
+        if self.thread is None:
+            self.start()
+        if data is not None:
+            data = orjson.dumps(data, default=str).decode()
+        committed = Future()
+        self.queue.put(((ticket, state, data, time.time()), committed))
+        return committed
+
+    def flush(self, timeout: float | None = None):
+        """지금까지 append 된 기록이 커밋될 때까지 대기"""
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        con = sqlite3.connect(self.database_url)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        query = """
+        INSERT INTO order_journal (ticket, state, data, created_at)
+        VALUES (?, ?, ?, ?);
+        """
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            waiters = [r for r in records if isinstance(r, threading.Event)]
+            writes = [r for r in records if not isinstance(r, threading.Event)]
+            try:
+                if writes:
+                    with con:
+                        con.executemany(query, [row for row, _ in writes])
+            except Exception as e:
+                print(traceback.format_exc())
+                for _, committed in writes:
+                    committed.set_exception(e)
+            else:
+                for _, committed in writes:
+                    committed.set_result(None)
+            for waiter in waiters:
+                waiter.set()
+
 
 db = Database()
+journal = OrderJournal(db.database_url)
 # print(os.path.realpath(__file__))
 # print(os.getcwd())
 # print(os.path.dirname(os.path.realpath(__file__)))
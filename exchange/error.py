@@ -75,3 +75,8 @@ class OrderError(Exception):
                 side = "매도"
 
         super().__init__(f"[{side} 주문 오류]\n{msg}", *args, **kwargs)
+
+
+class MailboxFullError(Exception):
+    def __init__(self, key="", *args, **kwargs):
+        super().__init__(f"[대기열 초과]\n{key} 주문 대기열이 가득 찼습니다", *args, **kwargs)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+import uuid
+from exchange.database import db
+
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaseTimeout(Exception):
+    def __init__(self, name="", *args, **kwargs):
+        super().__init__(f"{name} lease 를 얻지 못했습니다", *args, **kwargs)
+
+
+class Lease:
+    """store.db 의 leases 테이블을 이용한 프로세스 간 배타 잠금
+
+    uvicorn 워커가 여러 개일 때 여러 워커가 동시에 KIS 토큰을 발급받거나
+    정리 작업을 중복 실행하는 것을 막습니다.
+    lease 는 ttl 이 지나면 만료되므로 보유한 프로세스가 죽어도 영원히 잠기지 않고,
+    async with 로 잡은 동안에는 백그라운드에서 주기적으로 갱신합니다.
+    """
+
+    def __init__(self, name: str, ttl: float = 30.0, timeout: float | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.timeout = timeout
+        self.owner = f"{PROCESS_ID}:{uuid.uuid4().hex[:8]}"
+        self.renew_task: asyncio.Task | None = None
+
+    def acquire(self) -> bool:
+        return db.acquire_lease(self.name, self.owner, self.ttl)
+
+    def release(self):
+        db.release_lease(self.name, self.owner)
+
+    def _delays(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        delay = 0.05
+        while deadline is None or time.monotonic() < deadline:
+            yield delay
+            delay = min(delay * 2, 1.0)
+        raise LeaseTimeout(self.name)
+
+    def __enter__(self):
+        for delay in self._delays():
+            if self.acquire():
+                return self
+            time.sleep(delay)
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        for delay in self._delays():
+            if await asyncio.to_thread(self.acquire):
+                self.renew_task = asyncio.create_task(self._renew())
+                return self
+            await asyncio.sleep(delay)
+
+    async def __aexit__(self, *exc):
+        await self.arelease()
+
+    async def arelease(self):
+        if self.renew_task is not None:
+            self.renew_task.cancel()
+            self.renew_task = None
+        await asyncio.to_thread(self.release)
+
+    async def hold(self) -> bool:
+        """기다리지 않고 한 번만 시도, 얻으면 release 할 때까지 계속 갱신하며 보유"""
+        if not await asyncio.to_thread(self.acquire):
+            return False
+        self.renew_task = asyncio.create_task(self._renew())
+        return True
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await asyncio.to_thread(self.acquire)
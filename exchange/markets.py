@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+import zlib
+import ccxt
+import orjson
+from pathlib import Path
+from loguru import logger
+from exchange.utility import settings
+
+cache_directory = Path(os.path.dirname(os.path.realpath(__file__))).parent / "cache" / "markets"
+
+# set_markets 가 채우는 속성들, 새로 받은 마켓으로 교체할 때 한 번에 바꿈
+MARKET_ATTRIBUTES = (
+    "markets",
+    "markets_by_id",
+    "symbols",
+    "ids",
+    "currencies",
+    "currencies_by_id",
+    "baseCurrencies",
+    "quoteCurrencies",
+    "codes",
+)
+
+
+def get_cache_path(exchange_id: str) -> Path:
+    return cache_directory / f"{exchange_id}.bin"
+
+
+def read_cache(exchange_id: str, ttl: float | None = None) -> dict | None:
+    """저장된 마켓 캐시 (ttl 초가 지났거나 없거나 깨졌으면 None)"""
+    ttl = settings.MARKETS_CACHE_TTL if ttl is None else ttl
+    try:
+        cache = orjson.loads(zlib.decompress(get_cache_path(exchange_id).read_bytes()))
+    except (OSError, zlib.error, orjson.JSONDecodeError):
+        return None
+    if time.time() - cache["saved_at"] > ttl:
+        return None
+    return cache
+
+
+def write_cache(client: ccxt.Exchange):
+    """마켓 정보를 orjson + zlib 로 저장 (임시 파일에 쓴 뒤 교체)"""
+    data = {
+        "saved_at": time.time(),
+        "markets": list(client.markets.values()),
+        "currencies": client.currencies,
+    }
+    path = get_cache_path(client.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(zlib.compress(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS), 6))
+    os.replace(tmp_path, path)
+
+
+def hydrate(client: ccxt.Exchange) -> float | None:
+    """캐시로 마켓을 채우고 캐시가 저장된 지 몇 초 지났는지 반환 (캐시가 없으면 None)"""
+    cache = read_cache(client.id)
+    if cache is None:
+        return None
+    client.set_markets(cache["markets"], cache["currencies"] or None)
+    return time.time() - cache["saved_at"]
+
+
+def needs_refresh(age: float) -> bool:
+    return age > settings.MARKETS_REFRESH_AGE
+
+
+def build_markets(exchange_id: str, markets: list, currencies: dict | None) -> dict:
+    # 사용 중인 클라이언트가 아닌 별도 인스턴스에서 인덱스를 만들어 둠
+    scratch = getattr(ccxt, exchange_id)()
+    scratch.set_markets(markets, currencies)
+    return {name: getattr(scratch, name) for name in MARKET_ATTRIBUTES}
+
+
+def swap_markets(client: ccxt.Exchange, attributes: dict):
+    # 속성을 한 번에 교체해서 주문 중인 쪽이 반쯤 바뀐 마켓 정보를 보지 않도록 함
+    client.__dict__.update(attributes)
+
+
+async def async_refresh_markets(client):
+    start = time.perf_counter()
+    try:
+        currencies = (
+            await client.fetch_currencies() if client.has["fetchCurrencies"] is True else None
+        )
+        markets = await client.fetch_markets()
+        swap_markets(
+            client, await asyncio.to_thread(build_markets, client.id, markets, currencies)
+        )
+        await asyncio.to_thread(write_cache, client)
+    except Exception as e:
+        logger.warning(f"{client.id} 마켓 갱신 실패: {e}")
+    else:
+        logger.info(f"{client.id} 마켓 갱신 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+refresh_tasks = set()
+
+
+async def async_load_markets(client):
+    # 캐시 읽기/인덱싱/저장은 수 MB 를 다루므로 이벤트 루프 밖에서 실행
+    age = await asyncio.to_thread(hydrate, client)
+    if age is not None:
+        # 캐시에서 채우면 fetch_markets 를 건너뛰므로 거기서 하던 서버 시각 차이 보정을 따로 수행
+        if client.options.get("adjustForTimeDifference"):
+            try:
+                await client.load_time_difference()
+            except Exception as e:
+                logger.warning(f"{client.id} 시각 차이 조회 실패: {e}")
+        if needs_refresh(age):
+            task = asyncio.create_task(async_refresh_markets(client))
+            refresh_tasks.add(task)
+            task.add_done_callback(refresh_tasks.discard)
+        return
+    await client.load_markets()
+    await asyncio.to_thread(write_cache, client)
@@ -1 +1,3 @@
 from exchange.model.schemas import *
+from exchange.model.order import OrderContext, parse_order
+
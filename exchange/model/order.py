@@ -0,0 +1,116 @@
+from typing import get_args
+import orjson
+from exchange.model.schemas import (
+    MarketOrder,
+    EXCHANGE_LITERAL,
+    QUOTE_LITERAL,
+    SIDE_LITERAL,
+    check_password,
+    complete_order_info,
+)
+
+EXCHANGES = frozenset(get_args(EXCHANGE_LITERAL))
+QUOTES = frozenset(get_args(QUOTE_LITERAL))
+SIDES = frozenset(get_args(SIDE_LITERAL))
+
+ORDER_DEFAULTS = {name: field.default for name, field in MarketOrder.__fields__.items()}
+REQUIRED_FIELDS = ("exchange", "base", "quote", "side", "password")
+FLOAT_FIELDS = (
+    "amount",
+    "price",
+    "cost",
+    "percent",
+    "amount_by_percent",
+    "stop_price",
+    "profit_price",
+    "contract_size",
+)
+INT_FIELDS = ("leverage", "kis_number")
+# 허용 값 목록과 비교하는 필드 (문자열만 허용)
+CHOICE_FIELDS = ("exchange", "quote", "side")
+# 숫자로 와도 문자열로 바꿔서 쓰는 필드 (종목 코드, 페어 ID 등)
+STR_FIELDS = ("base", "pair", "pair_id")
+
+
+class OrderContext:
+    """웹훅 주문 한 건 (MarketOrder 와 같은 속성을 가진 가벼운 객체)
+
+    pydantic 모델 생성 없이 orjson 으로 읽은 값을 그대로 담고,
+    is_* 플래그와 unified_symbol 은 파싱할 때 한 번만 계산합니다.
+    """
+
+    __slots__ = tuple(ORDER_DEFAULTS)
+
+    def __init__(self, **values):
+        for name, default in ORDER_DEFAULTS.items():
+            setattr(self, name, values.get(name, default))
+
+    @classmethod
+    def construct(cls, **values) -> "OrderContext":
+        return cls(**values)
+
+    def dict(self, *, exclude: set | None = None, exclude_none: bool = False) -> dict:
+        result = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if (exclude and name in exclude) or (exclude_none and value is None):
+                continue
+            result[name] = value
+        return result
+
+    def __repr__(self):
+        fields = " ".join(
+            f"{name}={value!r}"
+            for name, value in self.dict(exclude={"password"}, exclude_none=True).items()
+        )
+        return f"OrderContext({fields})"
+
+
+def parse_order(body: bytes | str) -> OrderContext:
+    """웹훅 본문(JSON, 트레이딩뷰 text/plain 포함)을 검증하고 OrderContext 로 변환
+
+    MarketOrder 와 같은 규칙으로 검증하며, 잘못된 값이면 ValueError 를 발생시킵니다.
+    """
+    values = orjson.loads(body)
+    if not isinstance(values, dict):
+        raise ValueError("주문은 JSON 객체여야 합니다")
+
+    for key, value in values.items():
+        if value in ("NaN", ""):
+            values[key] = None
+
+    for name in REQUIRED_FIELDS:
+        if values.get(name) is None:
+            raise ValueError(f"{name} 값이 없습니다")
+    for name in CHOICE_FIELDS:
+        if not isinstance(values[name], str):
+            raise ValueError(f"{name} 값은 문자열이어야 합니다: {values[name]}")
+    for name in STR_FIELDS:
+        value = values.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            raise ValueError(f"{name} 값은 문자열이어야 합니다: {value}")
+        values[name] = str(value)
+    if values["exchange"] not in EXCHANGES:
+        raise ValueError(f"지원하지 않는 exchange 입니다: {values['exchange']}")
+    if values["quote"] not in QUOTES:
+        raise ValueError(f"지원하지 않는 quote 입니다: {values['quote']}")
+    if values["side"] not in SIDES:
+        raise ValueError(f"지원하지 않는 side 입니다: {values['side']}")
+    if values.get("type", "market") != "market":
+        raise ValueError("type 은 market 만 가능합니다")
+    if not check_password(str(values["password"])):
+        raise ValueError("비밀번호가 틀렸습니다")
+
+    try:
+        for name in FLOAT_FIELDS:
+            if values.get(name) is not None:
+                values[name] = float(values[name])
+        for name in INT_FIELDS:
+            if values.get(name) is not None:
+                values[name] = int(values[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 값이 숫자가 아닙니다: {values[name]}")
+
+    return OrderContext(**complete_order_info(values))
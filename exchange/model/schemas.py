@@ -1,5 +1,8 @@
 from pydantic import BaseModel, BaseSettings, validator, root_validator
 from typing import Literal
+from functools import lru_cache
+import hmac
+import ipaddress
 import os
 from pathlib import Path
 from enum import Enum
@@ -120,12 +123,52 @@ class Settings(BaseSettings):
     KIS4_SECRET: str | None = None
     DB_ID: str = "poa@admin.com"
     DB_PASSWORD: str = "poabot!@#$"
+    PAIR_QUEUE_SIZE: int = 100
+    PAIR_ORDER_TIMEOUT: int = 300
+    ORDER_JOURNAL_RETENTION: int = 7 * 86400
+    ORDER_FAST_ACK: bool = False
+    ORDER_WORKERS: int = 4
+    WORKERS: int = 1
+    WEBHOOK_SECRET: str | None = None
+    WEBHOOK_SIGNATURE_REQUIRED: bool = False
+    WEBHOOK_SIGNATURE_WINDOW: int = 30
+    MARKETS_CACHE_TTL: int = 86400
+    MARKETS_REFRESH_AGE: int = 3600
+    TICKER_TTL: float = 0.2
+    BINANCE_USER_STREAM: bool = True
+    KIS_RATE_LIMIT: int = 20
+    KIS_PAPER_RATE_LIMIT: int = 2
+    ORDER_RETRY_DEADLINE: float = 10.0
+    ORDER_RETRY_MAX_DELAY: float = 2.0
+    FEE_CACHE_TTL: int = 86400
+    CLOCK_SYNC_INTERVAL: int = 60
+
+    @validator("WHITELIST", each_item=True)
+    def whitelist_validate(cls, v):
+        # 잘못된 항목이 있으면 시작할 때 어떤 값인지 알려줌
+        entry = v.strip()
+        try:
+            ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            raise ValueError(f"WHITELIST 의 {v!r} 는 IP 또는 CIDR 가 아닙니다")
+        return entry
 
     class Config:
         env_file = env_path  # ".env"
         env_file_encoding = "utf-8"
 
 
+@lru_cache()
+def get_password() -> bytes:
+    # 웹훅마다 .env 를 다시 읽지 않도록 처음 한 번만 읽어 둠
+    return Settings().PASSWORD.encode()
+
+
+def check_password(password: str) -> bool:
+    # 일치하는 앞부분 길이로 비밀번호를 추측할 수 없도록 상수 시간 비교
+    return hmac.compare_digest(password.encode(), get_password())
+
+
 def get_extra_order_info(order_info):
     extra_order_info = {
         "is_futures": None,
@@ -147,23 +190,24 @@ def get_extra_order_info(order_info):
     elif order_info["exchange"] in STOCK_EXCHANGES:
         extra_order_info["is_stock"] = True
 
-    if order_info["side"] in ("entry/buy", "entry/sell"):
+    side = order_info.get("side")
+    if side in ("entry/buy", "entry/sell"):
         extra_order_info["is_entry"] = True
-        _side = order_info["side"].split("/")[-1]
+        _side = side.split("/")[-1]
         if _side == "buy":
             extra_order_info["is_buy"] = True
         elif _side == "sell":
             extra_order_info["is_sell"] = True
-    elif order_info["side"] in ("close/buy", "close/sell"):
+    elif side in ("close/buy", "close/sell"):
         extra_order_info["is_close"] = True
-        _side = order_info["side"].split("/")[-1]
+        _side = side.split("/")[-1]
         if _side == "buy":
             extra_order_info["is_buy"] = True
         elif _side == "sell":
             extra_order_info["is_sell"] = True
-    elif order_info["side"] == "buy":
+    elif side == "buy":
         extra_order_info["is_buy"] = True
-    elif order_info["side"] == "sell":
+    elif side == "sell":
         extra_order_info["is_sell"] = True
 
     return extra_order_info
@@ -183,6 +227,34 @@ def parse_quote(quote: str):
         return quote
 
 
+def get_unified_symbol(base: str, quote: str, is_futures: bool | None):
+    if is_futures:
+        if quote == "USD":
+            return f"{base}/{quote}:{base}"
+        return f"{base}/{quote}:{quote}"
+    return f"{base}/{quote}"
+
+
+def complete_order_info(values: dict) -> dict:
+    """주문 값에 is_* 플래그, side/quote 정리, unified_symbol 을 채움"""
+    values |= get_extra_order_info(values)
+
+    values["side"] = parse_side(values["side"])
+    values["quote"] = parse_quote(values["quote"])
+    if values["is_futures"] and values["quote"] == "USD":
+        values["is_coinm"] = True
+
+    if not values["is_stock"]:
+        values["unified_symbol"] = get_unified_symbol(
+            values["base"], values["quote"], values["is_futures"]
+        )
+
+    if values["exchange"] in STOCK_EXCHANGES:
+        values["is_stock"] = True
+    # debug("after", values)
+    return values
+
+
 class OrderRequest(BaseModel):
     exchange: EXCHANGE_LITERAL
     base: str
@@ -217,6 +289,7 @@ class OrderRequest(BaseModel):
     is_contract: bool | None = None
     contract_size: float | None = None
     margin_mode: str | None = None
+    position_mode: str | None = None
 
     class Config:
         use_enum_values = True
@@ -228,28 +301,7 @@ class OrderRequest(BaseModel):
             if value in ("NaN", ""):
                 values[key] = None
 
-        values |= get_extra_order_info(values)
-
-        values["side"] = parse_side(values["side"])
-        values["quote"] = parse_quote(values["quote"])
-        base = values["base"]
-        quote = values["quote"]
-        unified_symbol = f"{base}/{quote}"
-        exchange = values["exchange"]
-        if values["is_futures"]:
-            if quote == "USD":
-                unified_symbol = f"{base}/{quote}:{base}"
-                values["is_coinm"] = True
-            else:
-                unified_symbol = f"{base}/{quote}:{quote}"
-
-        if not values["is_stock"]:
-            values["unified_symbol"] = unified_symbol
-
-        if values["exchange"] in STOCK_EXCHANGES:
-            values["is_stock"] = True
-        # debug("after", values)
-        return values
+        return complete_order_info(values)
 
 
 class OrderBase(OrderRequest):
@@ -257,8 +309,7 @@ class OrderBase(OrderRequest):
 
     @validator("password")
     def password_validate(cls, v):
-        setting = Settings()
-        if v != setting.PASSWORD:
+        if not check_password(v):
             raise ValueError("비밀번호가 틀렸습니다")
         return v
 
@@ -272,6 +323,8 @@ class PriceRequest(BaseModel):
     exchange: EXCHANGE_LITERAL
     base: str
     quote: QUOTE_LITERAL
+    kis_number: int | None = 1
+    unified_symbol: str | None = None
     is_crypto: bool | None = None
     is_stock: bool | None = None
     is_futures: bool | None = None
@@ -285,6 +338,12 @@ class PriceRequest(BaseModel):
 
         values |= get_extra_order_info(values)
 
+        if values["is_crypto"]:
+            quote = parse_quote(values["quote"])
+            values["unified_symbol"] = get_unified_symbol(
+                values["base"], quote, values["is_futures"]
+            )
+
         return values
 
 
@@ -315,8 +374,7 @@ class HedgeData(BaseModel):
 
     @validator("password")
     def password_validate(cls, v):
-        setting = Settings()
-        if v != setting.PASSWORD:
+        if not check_password(v):
             raise ValueError("비밀번호가 틀렸습니다")
         return v
 
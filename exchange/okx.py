@@ -1,27 +1,35 @@
-import ccxt
 import ccxt.async_support as ccxt_async
 from devtools import debug
 
 from exchange.model import MarketOrder
+from exchange.markets import async_load_markets
+from exchange.singleflight import tickers
+from exchange.position_mode import position_modes
+from exchange.account_config import account_configs, MISSING
 import exchange.error as error
 from decimal import Decimal
 
 
-class Okx:
+class AsyncOkx:
+    """ccxt.async_support 기반 OKX"""
+
     def __init__(self, key, secret, passphrase):
-        self.client = ccxt.okx(
+        self.client = ccxt_async.okx(
             {
                 "apiKey": key,
                 "secret": secret,
                 "password": passphrase,
             }
         )
-        self.client.load_markets()
-        self.order_info: MarketOrder = None
-        self.position_mode = "one-way"
+
+    async def load_markets(self):
+        await async_load_markets(self.client)
+
+    async def close(self):
+        await self.client.close()
 
     def init_info(self, order_info: MarketOrder):
-        self.order_info = order_info
+        order_info.position_mode = position_modes.get(order_info.exchange, order_info.unified_symbol)
 
         unified_symbol = order_info.unified_symbol
         market = self.client.market(unified_symbol)
@@ -31,10 +39,9 @@ class Okx:
             order_info.is_contract = True
             order_info.contract_size = market.get("contractSize")
 
-        if order_info.is_futures:
-            self.client.options["defaultType"] = "swap"
-        else:
-            self.client.options["defaultType"] = "spot"
+    def get_market_params(self, order_info: MarketOrder) -> dict:
+        # 클라이언트의 defaultType 을 바꾸지 않고 호출마다 마켓 종류를 지정 (동시에 다른 종류의 주문이 들어와도 안전)
+        return {"type": "swap" if order_info.is_futures else "spot"}
 
     def get_amount_precision(self, symbol):
         market = self.client.market(symbol)
@@ -50,28 +57,30 @@ class Okx:
         market = self.client.market(symbol)
         return market.get("contractSize")
 
-    def parse_symbol(self, base: str, quote: str):
-        if self.order_info.is_futures:
+    def parse_symbol(self, order_info: MarketOrder, base: str, quote: str):
+        if order_info.is_futures:
             return f"{base}/{quote}:{quote}"
         else:
             return f"{base}/{quote}"
 
-    def get_ticker(self, symbol: str):
-        return self.client.fetch_ticker(symbol)
+    async def get_ticker(self, symbol: str):
+        return await tickers.ado(
+            (self.client.id, symbol), lambda: self.client.fetch_ticker(symbol)
+        )
 
-    def get_price(self, symbol: str):
-        return self.get_ticker(symbol)["last"]
+    async def get_price(self, symbol: str):
+        return (await self.get_ticker(symbol))["last"]
 
-    def get_balance(self, base: str):
+    async def get_balance(self, order_info: MarketOrder, base: str):
         free_balance_by_base = None
-        if self.order_info.is_entry or (
-            self.order_info.is_spot
-            and (self.order_info.is_buy or self.order_info.is_sell)
+        if order_info.is_entry or (
+            order_info.is_spot
+            and (order_info.is_buy or order_info.is_sell)
         ):
             free_balance = (
-                self.client.fetch_free_balance()
-                if not self.order_info.is_total
-                else self.client.fetch_total_balance()
+                await self.client.fetch_free_balance(self.get_market_params(order_info))
+                if not order_info.is_total
+                else await self.client.fetch_total_balance(self.get_market_params(order_info))
             )
             free_balance_by_base = free_balance.get(base)
 
@@ -79,9 +88,9 @@ class Okx:
             raise error.FreeAmountNoneError()
         return free_balance_by_base
 
-    def get_futures_position(self, symbol=None, all=False):
+    async def get_futures_position(self, order_info: MarketOrder, symbol=None, all=False):
         if symbol is None and all:
-            positions = self.client.fetch_balance()["info"]["positions"]
+            positions = (await self.client.fetch_balance(self.get_market_params(order_info)))["info"]["positions"]
             positions = [
                 position
                 for position in positions
@@ -89,7 +98,10 @@ class Okx:
             ]
             return positions
 
-        positions = self.client.fetch_positions([symbol])
+        positions = await self.client.fetch_positions([symbol])
+        return self.parse_futures_position(order_info, positions)
+
+    def parse_futures_position(self, order_info: MarketOrder, positions):
         long_contracts = None
         short_contracts = None
         if positions:
@@ -99,12 +111,12 @@ class Okx:
                 elif position["side"] == "short":
                     short_contracts = position["contracts"]
 
-            if self.order_info.is_close and self.order_info.is_buy:
+            if order_info.is_close and order_info.is_buy:
                 if not short_contracts:
                     raise error.ShortPositionNoneError()
                 else:
                     return short_contracts
-            elif self.order_info.is_close and self.order_info.is_sell:
+            elif order_info.is_close and order_info.is_sell:
                 if not long_contracts:
                     raise error.LongPositionNoneError()
                 else:
@@ -112,7 +124,7 @@ class Okx:
         else:
             raise error.PositionNoneError()
 
-    def get_amount(self, order_info: MarketOrder) -> float:
+    async def get_amount(self, order_info: MarketOrder) -> float:
         if order_info.amount is not None and order_info.percent is not None:
             raise error.AmountPercentBothError()
         elif order_info.amount is not None:
@@ -128,9 +140,9 @@ class Okx:
             else:
                 result = order_info.amount
         elif order_info.percent is not None:
-            if self.order_info.is_entry or (order_info.is_spot and order_info.is_buy):
+            if order_info.is_entry or (order_info.is_spot and order_info.is_buy):
                 if order_info.is_coinm:
-                    free_base = self.get_balance(order_info.base)
+                    free_base = await self.get_balance(order_info, order_info.base)
                     if order_info.is_contract:
                         result = (
                             free_base * (order_info.percent - 0.5) / 100
@@ -138,23 +150,19 @@ class Okx:
                     else:
                         result = free_base * order_info.percent / 100
                 else:
-                    free_quote = self.get_balance(order_info.quote)
+                    free_quote = await self.get_balance(order_info, order_info.quote)
                     cash = free_quote * (order_info.percent - 0.5) / 100
-                    current_price = self.get_price(order_info.unified_symbol)
+                    current_price = await self.get_price(order_info.unified_symbol)
                     if order_info.is_contract:
                         result = (cash / current_price) // order_info.contract_size
                     else:
                         result = cash / current_price
-            elif self.order_info.is_close:
-                if order_info.is_contract:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * order_info.percent / 100
-                else:
-                    free_amount = self.get_futures_position(order_info.unified_symbol)
-                    result = free_amount * float(order_info.percent) / 100
+            elif order_info.is_close:
+                free_amount = await self.get_futures_position(order_info, order_info.unified_symbol)
+                result = free_amount * float(order_info.percent) / 100
 
             elif order_info.is_spot and order_info.is_sell:
-                free_amount = self.get_balance(order_info.base)
+                free_amount = await self.get_balance(order_info, order_info.base)
                 result = free_amount * float(order_info.percent) / 100
 
             result = float(
@@ -166,16 +174,14 @@ class Okx:
 
         return float(result)
 
-    def market_order(self, order_info: MarketOrder):
-        from exchange.pexchange import retry
+    async def market_order(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
 
-        symbol = (
-            order_info.unified_symbol
-        )  # self.parse_symbol(order_info.base, order_info.quote)
+        symbol = order_info.unified_symbol
         params = {"tgtCcy": "base_ccy"}
 
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -189,98 +195,81 @@ class Okx:
                 instance=self,
             )
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
+            raise error.OrderError(e, order_info)
 
-    def market_buy(
-        self,
-        order_info: MarketOrder,
-    ):
+    async def market_buy(self, order_info: MarketOrder):
         # 수량기반
-        buy_amount = self.get_amount(order_info)
-        fee = self.client.fetch_trading_fee(self.order_info.unified_symbol)
+        buy_amount = await self.get_amount(order_info)
+        fee = await self.fetch_trading_fee(order_info.unified_symbol)
         order_info.amount = buy_amount
-        result = self.market_order(order_info)
+        result = await self.market_order(order_info)
         order_info.amount = buy_amount * (1 - fee["taker"])
         return result
 
-    def market_sell(
-        self,
-        order_info: MarketOrder,
-    ):
+    async def market_sell(self, order_info: MarketOrder):
         # 수량기반
-        symbol = (
-            order_info.unified_symbol
-        )  # self.parse_symbol(order_info.base, order_info.quote)
-        fee = self.client.fetch_trading_fee(symbol)
-        sell_amount = self.get_amount(order_info)
+        symbol = order_info.unified_symbol
+        fee = await self.fetch_trading_fee(symbol)
+        sell_amount = await self.get_amount(order_info)
 
         if order_info.percent is not None:
             order_info.amount = sell_amount
         else:
             order_info.amount = sell_amount * (1 - fee["taker"])
 
-        return self.market_order(order_info)
+        return await self.market_order(order_info)
 
-    def set_leverage(self, leverage, symbol):
-        if self.order_info.is_futures:
-            if self.order_info.is_futures and self.order_info.is_entry:
-                if self.order_info.is_buy:
-                    pos_side = "long"
-                elif self.order_info.is_sell:
-                    pos_side = "short"
+    async def fetch_trading_fee(self, symbol):
+        market_id = self.client.market(symbol)["id"]
+        fee = account_configs.get_fee("OKX", market_id)
+        if fee is MISSING:
+            fee = await self.client.fetch_trading_fee(symbol)
+            account_configs.set_fee("OKX", market_id, fee)
+        return fee
+
+    async def set_leverage(self, order_info: MarketOrder, leverage, symbol):
+        if order_info.is_futures:
+            market_id = self.client.market(symbol)["id"]
             try:
-                if (
-                    self.order_info.margin_mode is None
-                    or self.order_info.margin_mode == "isolated"
-                ):
-                    if self.position_mode == "hedge":
-                        self.client.set_leverage(
-                            leverage,
-                            symbol,
-                            params={"mgnMode": "isolated", "posSide": pos_side},
-                        )
-                    elif self.position_mode == "one-way":
-                        self.client.set_leverage(
-                            leverage,
-                            symbol,
-                            params={"mgnMode": "isolated", "posSide": "net"},
-                        )
-                else:
-                    self.client.set_leverage(
-                        leverage,
-                        symbol,
-                        params={"mgnMode": self.order_info.margin_mode},
-                    )
+                params = self.get_leverage_params(order_info)
+                field = self.get_leverage_field(params)
+                if account_configs.is_set("OKX", market_id, field, leverage):
+                    return
+                await self.client.set_leverage(leverage, symbol, params=params)
+                account_configs.set("OKX", market_id, field, leverage)
             except Exception as e:
-                pass
+                account_configs.invalidate("OKX", market_id)
 
-    def market_entry(
-        self,
-        order_info: MarketOrder,
-    ):
-        from exchange.pexchange import retry
+    def get_leverage_field(self, params: dict) -> str:
+        return f"leverage:{params.get('mgnMode')}:{params.get('posSide', '')}"
 
-        symbol = (
-            order_info.unified_symbol
-        )  # self.parse_symbol(order_info.base, order_info.quote)
-
-        entry_amount = self.get_amount(order_info)
-        if entry_amount == 0:
-            raise error.MinAmountError()
+    def get_leverage_params(self, order_info: MarketOrder):
+        if order_info.is_futures and order_info.is_entry:
+            if order_info.is_buy:
+                pos_side = "long"
+            elif order_info.is_sell:
+                pos_side = "short"
+        if (
+            order_info.margin_mode is None
+            or order_info.margin_mode == "isolated"
+        ):
+            if order_info.position_mode == "hedge":
+                return {"mgnMode": "isolated", "posSide": pos_side}
+            elif order_info.position_mode == "one-way":
+                return {"mgnMode": "isolated", "posSide": "net"}
+        else:
+            return {"mgnMode": order_info.margin_mode}
 
+    def get_entry_params(self, order_info: MarketOrder):
         params = {}
-        if order_info.leverage is None:
-            self.set_leverage(1, symbol)
-        else:
-            self.set_leverage(order_info.leverage, symbol)
         if order_info.margin_mode is None:
             params |= {"tdMode": "isolated"}
         else:
             params |= {"tdMode": order_info.margin_mode}
 
-        if self.position_mode == "one-way":
+        if order_info.position_mode == "one-way":
             params |= {}
-        elif self.position_mode == "hedge":
+        elif order_info.position_mode == "hedge":
             if order_info.is_futures and order_info.side == "buy":
                 if order_info.is_entry:
                     pos_side = "long"
@@ -292,43 +281,19 @@ class Okx:
                 elif order_info.is_close:
                     pos_side = "long"
             params |= {"posSide": pos_side}
+        return params
 
-        try:
-            return retry(
-                self.client.create_order,
-                symbol,
-                order_info.type.lower(),
-                order_info.side,
-                abs(entry_amount),
-                None,
-                params,
-                order_info=order_info,
-                max_attempts=5,
-                delay=0.1,
-                instance=self,
-            )
-        except Exception as e:
-            raise error.OrderError(e, self.order_info)
-
-    def market_close(
-        self,
-        order_info: MarketOrder,
-    ):
-        from exchange.pexchange import retry
-
-        symbol = self.order_info.unified_symbol
-        close_amount = self.get_amount(order_info)
-
-        if self.position_mode == "one-way":
+    def get_close_params(self, order_info: MarketOrder):
+        if order_info.position_mode == "one-way":
             if (
-                self.order_info.margin_mode is None
-                or self.order_info.margin_mode == "isolated"
+                order_info.margin_mode is None
+                or order_info.margin_mode == "isolated"
             ):
                 params = {"reduceOnly": True, "tdMode": "isolated"}
-            elif self.order_info.margin_mode == "cross":
+            elif order_info.margin_mode == "cross":
                 params = {"reduceOnly": True, "tdMode": "cross"}
 
-        elif self.position_mode == "hedge":
+        elif order_info.position_mode == "hedge":
             if order_info.is_futures and order_info.side == "buy":
                 if order_info.is_entry:
                     pos_side = "long"
@@ -340,15 +305,55 @@ class Okx:
                 elif order_info.is_close:
                     pos_side = "long"
             if (
-                self.order_info.margin_mode is None
-                or self.order_info.margin_mode == "isolated"
+                order_info.margin_mode is None
+                or order_info.margin_mode == "isolated"
             ):
                 params = {"posSide": pos_side, "tdMode": "isolated"}
-            elif self.order_info.margin_mode == "cross":
+            elif order_info.margin_mode == "cross":
                 params = {"posSide": pos_side, "tdMode": "cross"}
+        return params
+
+    async def market_entry(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
+
+        symbol = order_info.unified_symbol
+
+        entry_amount = await self.get_amount(order_info)
+        if entry_amount == 0:
+            raise error.MinAmountError()
+
+        if order_info.leverage is None:
+            await self.set_leverage(order_info, 1, symbol)
+        else:
+            await self.set_leverage(order_info, order_info.leverage, symbol)
+        params = self.get_entry_params(order_info)
+
+        try:
+            return await async_retry(
+                self.client.create_order,
+                symbol,
+                order_info.type.lower(),
+                order_info.side,
+                abs(entry_amount),
+                None,
+                params,
+                order_info=order_info,
+                max_attempts=5,
+                delay=0.1,
+                instance=self,
+            )
+        except Exception as e:
+            raise error.OrderError(e, order_info)
+
+    async def market_close(self, order_info: MarketOrder):
+        from exchange.retry import async_retry
+
+        symbol = order_info.unified_symbol
+        close_amount = await self.get_amount(order_info)
+        params = self.get_close_params(order_info)
 
         try:
-            return retry(
+            return await async_retry(
                 self.client.create_order,
                 symbol,
                 order_info.type.lower(),
@@ -362,4 +367,4 @@ class Okx:
                 instance=self,
             )
         except Exception as e:
-            raise error.OrderError(e, self.order_info)
+            raise error.OrderError(e, order_info)
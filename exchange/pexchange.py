@@ -2,18 +2,22 @@ import ccxt
 import ccxt.async_support as ccxt_async
 import httpx
 from fastapi import HTTPException
-from pydantic import BaseModel
-from .binance import Binance
-from .upbit import Upbit
-from .bybit import Bybit
-from .bitget import Bitget
-from .okx import Okx
-from .stock import KoreaInvestment
+from fastapi.concurrency import run_in_threadpool
+from .binance import AsyncBinance
+from .upbit import AsyncUpbit
+from .bybit import AsyncBybit
+from .bitget import AsyncBitget
+from .okx import AsyncOkx
+from .stock import AsyncKoreaInvestment
 from exchange.utility import settings, log_message
 from .database import db
+from .singleflight import tickers
+from .position_mode import position_modes, probe_position_mode
+from .clock import clock_sync
 from typing import Literal
 import pendulum
 import time
+import asyncio
 from devtools import debug
 from loguru import logger
 
@@ -21,70 +25,216 @@ from loguru import logger
 from .model import CRYPTO_EXCHANGES, STOCK_EXCHANGES, MarketOrder
 
 
-class Exchange(BaseModel):
-    UPBIT: Upbit | None = None
-    BINANCE: Binance | None = None
-    BYBIT: Bybit | None = None
-    BITGET: Bitget | None = None
-    OKX: Okx | None = None
-    KIS1: KoreaInvestment | None = None
-    KIS2: KoreaInvestment | None = None
-    KIS3: KoreaInvestment | None = None
-    KIS4: KoreaInvestment | None = None
+class ExchangeRegistry:
+    """거래소/계좌 키(BINANCE, KIS1 ...)별 봇 저장소 (factory 는 코루틴 함수)
 
-    class Config:
-        arbitrary_types_allowed = True
+    이미 만든 봇은 잠금 없이 dict 조회 한 번으로 돌려주고,
+    처음 요청될 때만 키별 잠금을 잡고 한 번 생성합니다.
+    (동시에 들어온 첫 요청들이 load_markets 를 중복 실행하지 않음)
+    """
 
+    def __init__(self, factory):
+        self.factory = factory
+        self.bots = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+        self.timings: dict[str, float] = {}
 
-payload = {}
+    async def get(self, key: str):
+        bot = self.bots.get(key)
+        if bot is not None:
+            return bot
+        key_lock = self.locks.setdefault(key, asyncio.Lock())
+        async with key_lock:
+            bot = self.bots.get(key)
+            if bot is None:
+                start = time.perf_counter()
+                bot = await self.factory(key)
+                self.timings[key] = time.perf_counter() - start
+                logger.info(f"{key} 초기화 {self.timings[key] * 1000:.0f}ms")
+                self.bots[key] = bot
+        return bot
 
+    def values(self):
+        return list(self.bots.values())
 
-def get_exchange(exchange_name: str, kis_number=None):
-    global payload
+    def clear(self):
+        self.bots.clear()
+
+
+def get_bot_key(exchange_name: str, kis_number=None) -> str:
     if exchange_name in CRYPTO_EXCHANGES:
-        KEY, SECRET, PASSPHRASE = check_key(exchange_name)
-        if not payload.get(exchange_name):
-            if exchange_name in ("BITGET", "OKX"):
-                payload |= {
-                    exchange_name: globals()[exchange_name.title()](
-                        KEY, SECRET, PASSPHRASE
-                    )
-                }
-            else:
-                if not payload.get(exchange_name):
-                    payload |= {
-                        exchange_name: globals()[exchange_name.title()](KEY, SECRET)
-                    }
-
-        return Exchange(**payload)
-
-    elif exchange_name in ("KRX", "NASDAQ", "NYSE", "AMEX"):
-        _kis = f"KIS{kis_number}"
-        key = check_key(_kis)
-        KEY, SECRET, ACCOUNT_NUMBER, ACCOUNT_CODE = key
-        if not payload.get(_kis):
-            payload |= {
-                _kis: globals()["KoreaInvestment"](
-                    KEY, SECRET, ACCOUNT_NUMBER, ACCOUNT_CODE, kis_number
-                )
-            }
-        exchange = Exchange(**payload)
-        kis: KoreaInvestment = exchange.dict()[_kis]
-        kis.auth()
-        return kis
+        return exchange_name
+    return f"KIS{kis_number}"
+
 
+async def create_async_bot(key: str):
+    if key not in CRYPTO_EXCHANGES:
+        # 토큰 발급이 동기 호출이므로 생성은 스레드에서
+        KEY, SECRET, ACCOUNT_NUMBER, ACCOUNT_CODE = check_key(key)
+        return await asyncio.to_thread(
+            AsyncKoreaInvestment, KEY, SECRET, ACCOUNT_NUMBER, ACCOUNT_CODE, int(key[3:])
+        )
+    KEY, SECRET, PASSPHRASE = check_key(key)
+    exchange_class = globals()["Async" + key.title()]
+    if key in ("BITGET", "OKX"):
+        bot = exchange_class(KEY, SECRET, PASSPHRASE)
+    else:
+        bot = exchange_class(KEY, SECRET)
+    await bot.load_markets()
+    clock_sync.apply(key, bot.client)
+    return bot
 
-def get_bot(
+
+async_bots = ExchangeRegistry(create_async_bot)
+
+
+async def get_async_bot(
     exchange_name: Literal[
         "BINANCE", "UPBIT", "BYBIT", "BITGET", "KRX", "NASDAQ", "NYSE", "AMEX", "OKX"
     ],
     kis_number=None,
-) -> Binance | Upbit | Bybit | Bitget | KoreaInvestment | Okx:
+) -> AsyncBinance | AsyncUpbit | AsyncBybit | AsyncBitget | AsyncKoreaInvestment | AsyncOkx:
+    """이벤트 루프를 막지 않는 ccxt.async_support / httpx.AsyncClient 기반 봇을 반환"""
     exchange_name = exchange_name.upper()
     if exchange_name in CRYPTO_EXCHANGES:
-        return get_exchange(exchange_name, kis_number).dict()[exchange_name]
+        return await async_bots.get(exchange_name)
     elif exchange_name in STOCK_EXCHANGES:
-        return get_exchange(exchange_name, kis_number)
+        bot = await async_bots.get(get_bot_key(exchange_name, kis_number))
+        if not bot.is_token_fresh():
+            await run_in_threadpool(bot.auth)
+        return bot
+
+
+async def fetch_prices(
+    exchange_name: str, symbols: list[str], kis_number=None
+) -> dict[str, float | None]:
+    """한 거래소의 여러 심볼 현재가 {심볼: 가격}, 조회하지 못한 심볼은 None
+
+    암호화폐는 fetch_tickers 로 한 번에 받고(현물/선물 심볼은 따로) 빠진 심볼만 하나씩 조회합니다.
+    주식은 종목 코드를 받아 KIS 멀티종목 시세 조회를 사용합니다.
+    """
+    bot = await get_async_bot(exchange_name, kis_number)
+    if exchange_name in STOCK_EXCHANGES:
+        return await bot.fetch_current_prices(exchange_name, symbols)
+
+    symbols = list(dict.fromkeys(symbols))
+    prices = {}
+    if bot.client.has.get("fetchTickers"):
+        groups = {}
+        for symbol in symbols:
+            groups.setdefault(":" in symbol, []).append(symbol)
+        results = await asyncio.gather(
+            *(
+                tickers.ado(
+                    (bot.client.id, tuple(group)),
+                    lambda group=group: bot.client.fetch_tickers(group),
+                )
+                for group in groups.values()
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning(f"{exchange_name} fetch_tickers 실패: {result}")
+                continue
+            for symbol, ticker in result.items():
+                # 이어지는 단건 조회(get_price)도 같은 결과를 쓰도록 채워 둠
+                tickers.set_cached((bot.client.id, symbol), ticker, tickers.ttl)
+                prices[symbol] = ticker.get("last")
+
+    missing = [symbol for symbol in symbols if prices.get(symbol) is None]
+    results = await asyncio.gather(
+        *(bot.get_price(symbol) for symbol in missing), return_exceptions=True
+    )
+    for symbol, price in zip(missing, results):
+        prices[symbol] = None if isinstance(price, BaseException) else price
+    return prices
+
+
+def get_configured_bot_keys() -> list[str]:
+    """.env 에 키가 설정된 거래소/KIS 계좌 목록"""
+    keys = [
+        name
+        for name in CRYPTO_EXCHANGES
+        if getattr(settings, f"{name}_KEY") and getattr(settings, f"{name}_SECRET")
+    ]
+    for kis_number in range(1, 5):
+        _kis = f"KIS{kis_number}"
+        if all(
+            getattr(settings, f"{_kis}_{field}")
+            for field in ("KEY", "SECRET", "ACCOUNT_NUMBER", "ACCOUNT_CODE")
+        ):
+            keys.append(_kis)
+    return keys
+
+
+class WarmUp:
+    """서버 시작 시 설정된 모든 거래소 봇과 KIS 세션을 동시에 미리 생성
+
+    첫 웹훅이 load_markets/토큰 발급을 기다리지 않도록 하고, 끝나면 done 이 True 가 됩니다.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    async def run(self):
+        start = time.perf_counter()
+        keys = get_configured_bot_keys()
+        await asyncio.gather(*[self.warm_up(key) for key in keys])
+        self.done = True
+        elapsed = time.perf_counter() - start
+        summary = ", ".join(f"{key} {ms:.0f}ms" for key, ms in self.timings.items())
+        log_message(f"웜업 완료 ({elapsed * 1000:.0f}ms) {summary}")
+        for key, error in self.errors.items():
+            log_message(f"{key} 웜업 실패: {error}")
+
+    async def warm_up(self, key: str):
+        start = time.perf_counter()
+        try:
+            bot = await async_bots.get(key)
+        except Exception as e:
+            self.errors[key] = str(e)
+            return
+        self.timings[key] = (time.perf_counter() - start) * 1000
+        if key in CRYPTO_EXCHANGES:
+            await self.probe_position_mode(key, bot)
+
+    async def probe_position_mode(self, exchange_name: str, bot):
+        try:
+            mode = await probe_position_mode(exchange_name, bot)
+        except Exception as e:
+            # 조회에 실패하면 저장된 값(또는 주문 중 알게 되는 값)을 사용
+            logger.warning(f"{exchange_name} 포지션 모드 조회 실패: {e}")
+            return
+        if mode is not None:
+            position_modes.set(exchange_name, mode)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.done,
+            "timings_ms": {key: round(ms) for key, ms in self.timings.items()},
+            "errors": self.errors,
+        }
+
+
+warm_up = WarmUp()
+
+
+def get_exchange_clients() -> dict[str, list]:
+    """거래소별로 지금 만들어져 있는 ccxt 클라이언트"""
+    return {
+        key: [bot.client]
+        for key, bot in list(async_bots.bots.items())
+        if key in CRYPTO_EXCHANGES
+    }
+
+
+async def close_async_bots():
+    for bot in async_bots.values():
+        await bot.close()
+    async_bots.clear()
 
 
 def check_key(exchange_name):
@@ -118,201 +268,3 @@ def get_today_timestamp(timezone="Asia/Seoul"):
     today_start = int(today.start_of("day").timestamp() * 1000)
     today_end = int(today.end_of("day").timestamp() * 1000)
     return today_start, today_end
-
-
-def retry(
-    func,
-    *args,
-    order_info: MarketOrder,
-    max_attempts=3,
-    delay=1,
-    instance: Binance | Bybit | Bitget | Upbit | Okx = None,
-):
-    attempts = 0
-
-    while attempts < max_attempts:
-        try:
-            result = func(*args)  # 함수 실행
-            return result
-        except Exception as e:
-            logger.error(f"에러 발생: {str(e)}")
-            attempts += 1
-            if func.__name__ == "create_order":
-                if order_info.exchange in ("BINANCE"):
-                    if "Internal error" in str(e):
-                        time.sleep(delay)  # 재시도 간격 설정
-                    elif "position side does not match" in str(e):
-                        if instance.position_mode == "one-way":
-                            instance.position_mode = "hedge"
-                            if order_info.side == "buy":
-                                if order_info.is_entry:
-                                    positionSide = "LONG"
-                                elif order_info.is_close:
-                                    positionSide = "SHORT"
-                            elif order_info.side == "sell":
-                                if order_info.is_entry:
-                                    positionSide = "SHORT"
-                                elif order_info.is_close:
-                                    positionSide = "LONG"
-
-                            params = {"positionSide": positionSide}
-                        elif instance.position_mode == "hedge":
-                            instance.position_mode = "one-way"
-                            if order_info.is_entry:
-                                params = {}
-                            elif order_info.is_close:
-                                params = {"reduceOnly": True}
-
-                        args = tuple(
-                            params if i == 5 else arg for i, arg in enumerate(args)
-                        )
-
-                    else:
-                        attempts = max_attempts
-                elif order_info.exchange in ("BYBIT"):
-                    if "position idx not match position mode" in str(e):
-                        if instance.position_mode == "one-way":
-                            instance.position_mode = "hedge"
-                            position_idx = None
-                            if order_info.side == "buy":
-                                if order_info.is_entry:
-                                    position_idx = 1
-                                    params = {"position_idx": position_idx}
-                                elif order_info.is_close:
-                                    position_idx = 2
-                                    params = {
-                                        "reduceOnly": True,
-                                        "position_idx": position_idx,
-                                    }
-                            elif order_info.side == "sell":
-                                if order_info.is_entry:
-                                    position_idx = 2
-                                    params = {"position_idx": position_idx}
-                                elif order_info.is_close:
-                                    position_idx = 1
-                                    params = {
-                                        "reduceOnly": True,
-                                        "position_idx": position_idx,
-                                    }
-                        elif instance.position_mode == "hedge":
-                            instance.position_mode = "one-way"
-                            if order_info.is_entry:
-                                params = {"position_idx": 0}
-                            elif order_info.is_close:
-                                params = {"reduceOnly": True, "position_idx": 0}
-
-                        args = tuple(
-                            params if i == 5 else arg for i, arg in enumerate(args)
-                        )
-                    elif "check your server timestamp" in str(e):
-                        bybit: Bybit = instance
-                        bybit.load_time_difference()
-                    else:
-                        attempts = max_attempts
-
-                elif order_info.exchange in ("OKX"):
-                    if "posSide error" in str(e):
-                        params = {}
-
-                        if instance.position_mode == "one-way":
-                            instance.position_mode = "hedge"
-                            pos_side = "net"
-                            if order_info.is_futures and order_info.side == "buy":
-                                if order_info.is_entry:
-                                    pos_side = "long"
-                                elif order_info.is_close:
-                                    pos_side = "short"
-                            elif order_info.is_futures and order_info.side == "sell":
-                                if order_info.is_entry:
-                                    pos_side = "short"
-                                elif order_info.is_close:
-                                    pos_side = "long"
-
-                            if (
-                                order_info.margin_mode is None
-                                or order_info.margin_mode == "isolated"
-                            ):
-                                params |= {"posSide": pos_side, "tdMode": "isolated"}
-                            elif order_info.margin_mode == "cross":
-                                params |= {"posSide": pos_side, "tdMode": "cross"}
-                        elif instance.position_mode == "hedge":
-                            instance.position_mode = "one-way"
-                            if order_info.is_entry:
-                                params |= {}
-                            elif order_info.is_close:
-                                params |= {"reduceOnly": True}
-
-                        if order_info.is_entry:
-                            if order_info.leverage is None:
-                                instance.set_leverage(1, order_info.unified_symbol)
-                            else:
-                                instance.set_leverage(
-                                    order_info.leverage, order_info.unified_symbol
-                                )
-                            if order_info.margin_mode is None:
-                                params |= {"tdMode": "isolated"}
-                            else:
-                                params |= {"tdMode": order_info.margin_mode}
-
-                        args = tuple(
-                            params if i == 5 else arg for i, arg in enumerate(args)
-                        )
-                    else:
-                        attempts = max_attempts
-                elif order_info.exchange in ("BITGET"):
-                    if "unilateral position" in str(e):
-                        if instance.position_mode == "hedge":
-                            instance.position_mode = "one-way"
-                            new_side = order_info.side + "_single"
-                            new_params = {"side": new_side}
-                            args = tuple(
-                                new_side if i == 2 else arg
-                                for i, arg in enumerate(args)
-                            )
-                            args = tuple(
-                                new_params if i == 5 else arg
-                                for i, arg in enumerate(args)
-                            )
-                        elif instance.position_mode == "one-way":
-                            instance.position_mode = "hedge"
-                            if order_info.is_entry:
-                                new_params = {}
-                            elif order_info.is_close:
-                                new_params = {"reduceOnly": True}
-                            args = tuple(
-                                new_params if i == 5 else arg
-                                for i, arg in enumerate(args)
-                            )
-
-                    elif "two-way positions" in str(e):
-                        if instance.position_mode == "hedge":
-                            instance.position_mode = "one-way"
-                            new_side = order_info.side + "_single"
-                            new_params = {"reduceOnly": True, "side": new_side}
-                            args = tuple(
-                                new_side if i == 2 else arg
-                                for i, arg in enumerate(args)
-                            )
-                            args = tuple(
-                                new_params if i == 5 else arg
-                                for i, arg in enumerate(args)
-                            )
-                        elif instance.position_mode == "one-way":
-                            instance.position_mode = "hedge"
-                            if order_info.is_entry:
-                                new_params = {}
-                            elif order_info.is_close:
-                                new_params = {"reduceOnly": True}
-                            args = tuple(
-                                new_params if i == 5 else arg
-                                for i, arg in enumerate(args)
-                            )
-                    else:
-                        attempts = max_attempts
-                else:
-                    attempts = max_attempts
-
-            if attempts == max_attempts:
-                raise
-            else:
-                logger.error(f"재시도 {max_attempts - attempts}번 남았음")
@@ -3,6 +3,7 @@ import jwt
 from exchange.utility import log_message, log_error_message, settings
 import time
 import traceback
+from loguru import logger
 from datetime import datetime, timedelta
 
 
@@ -49,13 +50,12 @@ def delete(collection, id):
 
 def get_full_list(collection, batch_size=200, query_params=None):
     try:
-        print(f"DEBUG: get_full_list 호출 - collection: {collection}, batch_size: {batch_size}, query_params: {query_params}")
         reauth()
         return pb.collection(collection).get_full_list(
             batch=batch_size, query_params=query_params
         )
     except Exception as e:
-        print(f"DEBUG: PocketBase에서 get_full_list 호출 중 오류 발생 - {str(e)}")
+        logger.error(f"PocketBase get_full_list 오류 - {str(e)}")
         raise Exception("DB get_full_list error")
 
 
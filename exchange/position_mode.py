@@ -0,0 +1,75 @@
+import threading
+from loguru import logger
+from exchange.database import db
+
+# 계정 전체에 적용되는 모드를 저장할 때 쓰는 심볼 자리
+ACCOUNT = "*"
+# 계정(상품) 단위로 모드가 정해지는 거래소, 바이비트는 심볼마다 다를 수 있음
+ACCOUNT_WIDE_EXCHANGES = ("BINANCE", "OKX", "BITGET")
+DEFAULT_MODES = {
+    "BINANCE": "one-way",
+    "BYBIT": "one-way",
+    "OKX": "one-way",
+    "BITGET": "hedge",
+}
+
+
+class PositionModes:
+    """거래소(바이비트는 심볼)별 포지션 모드("hedge" / "one-way")
+
+    기동할 때 거래소에 물어본 값과 주문이 모드 불일치로 거절돼 알게 된 값을 sqlite 에 저장해 두고,
+    재시작 후에도 첫 주문부터 맞는 모드로 보냅니다.
+    """
+
+    def __init__(self):
+        self.modes: dict[tuple[str, str], str] | None = None
+        self.lock = threading.Lock()
+
+    def load(self) -> dict[tuple[str, str], str]:
+        if self.modes is None:
+            with self.lock:
+                if self.modes is None:
+                    self.modes = {
+                        (exchange, symbol): mode
+                        for exchange, symbol, mode in db.get_position_modes()
+                    }
+        return self.modes
+
+    def get(self, exchange: str, symbol: str | None = None) -> str:
+        modes = self.load()
+        return (
+            modes.get((exchange, symbol))
+            or modes.get((exchange, ACCOUNT))
+            or DEFAULT_MODES.get(exchange, "one-way")
+        )
+
+    def set(self, exchange: str, mode: str, symbol: str = ACCOUNT):
+        modes = self.load()
+        if modes.get((exchange, symbol)) == mode:
+            return
+        modes[(exchange, symbol)] = mode
+        db.set_position_mode(exchange, symbol, mode)
+        logger.info(f"{exchange} {symbol} 포지션 모드: {mode}")
+
+    def learn(self, exchange: str, symbol: str, mode: str):
+        """모드 불일치로 반대 모드로 다시 보냈을 때 호출"""
+        self.set(exchange, mode, ACCOUNT if exchange in ACCOUNT_WIDE_EXCHANGES else symbol)
+
+
+async def probe_position_mode(exchange_name: str, bot) -> str | None:
+    """거래소에 계정의 포지션 모드를 물어봄 (심볼별로 정해지는 바이비트는 None)"""
+    if exchange_name == "BINANCE":
+        return "hedge" if await bot.is_hedge_mode() else "one-way"
+    elif exchange_name == "OKX":
+        response = await bot.client.privateGetAccountConfig()
+        return "hedge" if response["data"][0]["posMode"] == "long_short_mode" else "one-way"
+    elif exchange_name == "BITGET":
+        # holdMode 는 USDT-M 상품 전체에 적용되므로 아무 심볼로나 조회
+        response = await bot.client.privateMixGetAccountAccount(
+            {"symbol": "BTCUSDT_UMCBL", "marginCoin": "USDT"}
+        )
+        return "hedge" if response["data"]["holdMode"] == "double_hold" else "one-way"
+    return None
+
+
+position_modes = PositionModes()
@@ -0,0 +1,275 @@
+import asyncio
+import inspect
+import random
+import threading
+import time
+import ccxt
+from loguru import logger
+from exchange.model import MarketOrder
+from exchange.position_mode import position_modes
+from exchange.account_config import account_configs
+from exchange.utility import settings
+
+# 에러 분류
+RETRYABLE = "retryable"  # 같은 주문을 잠시 뒤 다시 보냄
+PARAM_FIX = "param_fix"  # 주문 인자를 고쳐서 바로 다시 보냄
+FATAL = "fatal"  # 다시 보내지 않음
+
+
+class OrderCall:
+    """create_order 인자 (symbol, type, side, amount, price, params)"""
+
+    __slots__ = ("symbol", "type", "side", "amount", "price", "params")
+
+    def __init__(self, symbol, type, side, amount, price=None, params=None):
+        self.symbol = symbol
+        self.type = type
+        self.side = side
+        self.amount = amount
+        self.price = price
+        self.params = params if params is not None else {}
+
+    def args(self) -> tuple:
+        return (self.symbol, self.type, self.side, self.amount, self.price, self.params)
+
+
+def get_hedge_side(order_info: MarketOrder) -> str:
+    # 진입은 주문 방향, 종료는 반대 방향 포지션
+    if order_info.is_close:
+        return "short" if order_info.side == "buy" else "long"
+    return "long" if order_info.side == "buy" else "short"
+
+
+def flip_position_mode(order_info: MarketOrder) -> str:
+    order_info.position_mode = "hedge" if order_info.position_mode == "one-way" else "one-way"
+    return order_info.position_mode
+
+
+def fix_binance_position_side(call: OrderCall, order_info: MarketOrder, instance):
+    if flip_position_mode(order_info) == "hedge":
+        call.params = {"positionSide": get_hedge_side(order_info).upper()}
+    else:
+        call.params = {"reduceOnly": True} if order_info.is_close else {}
+
+
+def fix_bybit_position_idx(call: OrderCall, order_info: MarketOrder, instance):
+    if flip_position_mode(order_info) == "hedge":
+        position_idx = 1 if get_hedge_side(order_info) == "long" else 2
+    else:
+        position_idx = 0
+    call.params = {"position_idx": position_idx}
+    if order_info.is_close:
+        call.params["reduceOnly"] = True
+
+
+def sync_bybit_time(call: OrderCall, order_info: MarketOrder, instance):
+    return instance.load_time_difference()
+
+
+def fix_okx_pos_side(call: OrderCall, order_info: MarketOrder, instance):
+    params = {}
+    if flip_position_mode(order_info) == "hedge":
+        pos_side = get_hedge_side(order_info) if order_info.is_futures else "net"
+        td_mode = "cross" if order_info.margin_mode == "cross" else "isolated"
+        params |= {"posSide": pos_side, "tdMode": td_mode}
+    elif order_info.is_close:
+        params |= {"reduceOnly": True}
+
+    pending = None
+    if order_info.is_entry:
+        pending = instance.set_leverage(order_info, order_info.leverage or 1, order_info.unified_symbol)
+        params |= {"tdMode": order_info.margin_mode or "isolated"}
+    call.params = params
+    return pending
+
+
+def fix_bitget_hold_mode(call: OrderCall, order_info: MarketOrder, instance, reduce_only: bool = False):
+    if flip_position_mode(order_info) == "one-way":
+        call.side = order_info.side + "_single"
+        call.params = {"side": call.side}
+        if reduce_only:
+            call.params["reduceOnly"] = True
+    else:
+        call.side = order_info.side
+        call.params = {"reduceOnly": True} if order_info.is_close else {}
+
+
+def fix_bitget_two_way(call: OrderCall, order_info: MarketOrder, instance):
+    # 양방향 포지션이 남아 있다는 에러는 단방향으로 바꿔 포지션을 줄이는 주문으로만 보냄
+    fix_bitget_hold_mode(call, order_info, instance, reduce_only=True)
+
+
+# 거래소별 에러 분류표: (에러 메시지에 들어 있는 문구 또는 예외 클래스, 분류, 처리 함수)
+# 처리 함수는 OrderCall 을 고치고, 기다려야 하는 후속 호출(코루틴)을 반환할 수 있음
+ERROR_RULES = {
+    "BINANCE": [
+        ("Internal error", RETRYABLE, None),
+        ("position side does not match", PARAM_FIX, fix_binance_position_side),
+    ],
+    "BYBIT": [
+        ("position idx not match position mode", PARAM_FIX, fix_bybit_position_idx),
+        ("check your server timestamp", RETRYABLE, sync_bybit_time),
+    ],
+    "OKX": [
+        ("posSide error", PARAM_FIX, fix_okx_pos_side),
+    ],
+    "BITGET": [
+        ("unilateral position", PARAM_FIX, fix_bitget_hold_mode),
+        ("two-way positions", PARAM_FIX, fix_bitget_two_way),
+    ],
+    # 모든 거래소 공통 (주문이 처리되기 전에 거절된 경우만)
+    "*": [
+        (ccxt.RateLimitExceeded, RETRYABLE, None),
+    ],
+}
+
+
+def classify(exchange: str, e: Exception):
+    """(분류, 처리 함수), 분류표에 없으면 FATAL"""
+    message = str(e)
+    for match, kind, action in ERROR_RULES.get(exchange, []) + ERROR_RULES["*"]:
+        if isinstance(match, str):
+            if match in message:
+                return kind, action
+        elif isinstance(e, match):
+            return kind, action
+    return FATAL, None
+
+
+def get_backoff(retry_count: int, base: float) -> float:
+    # 지수 백오프 상한 + 절반 지터 (동시에 실패한 주문들이 같은 순간에 다시 몰리지 않도록)
+    wait = min(settings.ORDER_RETRY_MAX_DELAY, base * 2**retry_count)
+    return wait / 2 + random.uniform(0, wait / 2)
+
+
+class RetryStats:
+    """거래소별 주문 시도 횟수와 재시도에 쓴 시간"""
+
+    def __init__(self):
+        self.exchanges: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def record(self, exchange: str, attempts: int, retry_seconds: float, ok: bool, errors: list[str]):
+        with self.lock:
+            stats = self.exchanges.setdefault(
+                exchange,
+                {
+                    "orders": 0,
+                    "attempts": 0,
+                    "retried_orders": 0,
+                    "failed_orders": 0,
+                    "retry_seconds": 0.0,
+                    "errors": {},
+                },
+            )
+            stats["orders"] += 1
+            stats["attempts"] += attempts
+            if attempts > 1:
+                stats["retried_orders"] += 1
+                stats["retry_seconds"] += retry_seconds
+            if not ok:
+                stats["failed_orders"] += 1
+            for kind in errors:
+                stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                exchange: stats | {"retry_seconds": round(stats["retry_seconds"], 3), "errors": dict(stats["errors"])}
+                for exchange, stats in self.exchanges.items()
+            }
+
+
+retry_stats = RetryStats()
+
+
+class RetryState:
+    """주문 한 건의 재시도 진행 상황"""
+
+    def __init__(self, args: tuple, order_info: MarketOrder, max_attempts: int, delay: float, instance):
+        self.call = OrderCall(*args)
+        self.order_info = order_info
+        self.exchange = order_info.exchange
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self.instance = instance
+        self.attempts = 0
+        self.retries = 0
+        self.errors: list[str] = []
+        self.started = time.monotonic()
+        self.deadline = self.started + settings.ORDER_RETRY_DEADLINE
+        self.first_error_at: float | None = None
+
+    def handle(self, e: Exception):
+        """다시 보낼 거면 (대기 시간, 후속 호출)을, 포기할 거면 None 을 반환"""
+        self.attempts += 1
+        if self.first_error_at is None:
+            self.first_error_at = time.monotonic()
+        logger.error(f"에러 발생: {str(e)}")
+        kind, action = classify(self.exchange, e)
+        self.errors.append(kind)
+        if kind == FATAL or self.attempts >= self.max_attempts:
+            self.finish(ok=False)
+            return None
+
+        wait = 0.0
+        if kind == RETRYABLE:
+            wait = get_backoff(self.retries, self.delay)
+            self.retries += 1
+        if time.monotonic() + wait > self.deadline:
+            logger.error(f"재시도 마감 시간({settings.ORDER_RETRY_DEADLINE}초) 초과")
+            self.finish(ok=False)
+            return None
+
+        # 다시 보내기로 정한 뒤에만 처리 함수 실행 (포기할 주문에 레버리지 설정 등을 보내거나
+        # 비동기 후속 호출을 만들어 놓고 기다리지 않는 일이 없도록)
+        position_mode = self.order_info.position_mode
+        pending = action(self.call, self.order_info, self.instance) if action else None
+        if self.order_info.position_mode != position_mode:
+            # 다음 주문부터는 처음부터 맞는 모드로 보내도록 저장
+            position_modes.learn(self.exchange, self.order_info.unified_symbol, self.order_info.position_mode)
+        logger.error(f"재시도 {self.max_attempts - self.attempts}번 남았음")
+        return wait, pending
+
+    def finish(self, ok: bool):
+        retry_seconds = time.monotonic() - self.first_error_at if self.first_error_at else 0.0
+        attempts = self.attempts + 1 if ok else self.attempts
+        retry_stats.record(self.exchange, attempts, retry_seconds, ok, self.errors)
+        if not ok:
+            self.invalidate_config()
+
+    def invalidate_config(self):
+        # 주문이 거절됐으면 캐시한 레버리지/마진 모드가 실제와 다를 수 있으므로 다음 주문에서 다시 설정
+        try:
+            market_id = self.instance.client.market(self.call.symbol)["id"]
+        except Exception:
+            account_configs.invalidate(self.exchange)
+        else:
+            account_configs.invalidate(self.exchange, market_id)
+
+
+async def async_retry(
+    func,
+    *args,
+    order_info: MarketOrder,
+    max_attempts=3,
+    delay=1,
+    instance=None,
+):
+    """create_order 를 분류표에 따라 재시도 (지터가 있는 지수 백오프, 주문당 마감 시간)"""
+    state = RetryState(args, order_info, max_attempts, delay, instance)
+    while True:
+        try:
+            result = await func(*state.call.args())
+        except Exception as e:
+            decision = state.handle(e)
+            if decision is None:
+                raise
+            wait, pending = decision
+            if inspect.isawaitable(pending):
+                await pending
+            if wait:
+                await asyncio.sleep(wait)
+        else:
+            state.finish(ok=True)
+            return result
@@ -0,0 +1,110 @@
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable
+from loguru import logger
+import exchange.error as error
+
+
+class PairScheduler:
+    """페어별 직렬 워커 스케줄러
+
+    같은 키(페어)의 작업은 도착 순서대로 하나씩 처리하고, 서로 다른 키는 병렬로 처리합니다.
+    키마다 크기가 제한된 메일박스와 asyncio 워커 태스크를 하나씩 두며, 메일박스가 비면 워커는 종료됩니다.
+    submit 은 이벤트 루프 안에서만 호출되므로 별도의 락이 필요 없습니다.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        maxsize: int = 100,
+    ):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.mailboxes: dict[str, asyncio.Queue] = {}
+        self.workers: dict[str, asyncio.Task] = {}
+
+    def submit(self, key: str, item: Any) -> int:
+        """작업을 메일박스에 넣고 현재 대기 건수를 반환, 가득 찼으면 MailboxFullError"""
+        mailbox = self.mailboxes.get(key)
+        if mailbox is None:
+            mailbox = asyncio.Queue(self.maxsize)
+            self.mailboxes[key] = mailbox
+        try:
+            mailbox.put_nowait(item)
+        except asyncio.QueueFull:
+            raise error.MailboxFullError(key)
+
+        if key not in self.workers:
+            self.workers[key] = asyncio.create_task(self._run(key, mailbox))
+        return mailbox.qsize()
+
+    async def _run(self, key: str, mailbox: asyncio.Queue):
+        try:
+            while not mailbox.empty():
+                item = mailbox.get_nowait()
+                try:
+                    await self.handler(item)
+                except Exception:
+                    logger.error(f"{key} 작업 처리 중 에러\n{traceback.format_exc()}")
+                finally:
+                    mailbox.task_done()
+        finally:
+            self.workers.pop(key, None)
+            if mailbox.empty():
+                self.mailboxes.pop(key, None)
+
+    def depth(self, key: str) -> int:
+        mailbox = self.mailboxes.get(key)
+        return mailbox.qsize() if mailbox is not None else 0
+
+    async def close(self):
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.workers.clear()
+        self.mailboxes.clear()
+
+
+class WorkerPool:
+    """고정 개수의 asyncio 워커가 하나의 큐를 나눠 처리하는 풀"""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        size: int = 4,
+        maxsize: int = 1000,
+    ):
+        self.handler = handler
+        self.size = size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.workers: list[asyncio.Task] = []
+
+    def start(self):
+        if not self.workers:
+            self.workers = [
+                asyncio.create_task(self._run(i)) for i in range(self.size)
+            ]
+
+    def submit(self, item: Any) -> int:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            raise error.MailboxFullError("worker pool")
+        return self.queue.qsize()
+
+    async def _run(self, index: int):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.handler(item)
+            except Exception:
+                logger.error(f"워커 {index} 작업 처리 중 에러\n{traceback.format_exc()}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
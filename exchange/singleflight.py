@@ -0,0 +1,70 @@
+import asyncio
+import time
+from exchange.utility import settings
+
+MISSING = object()
+
+
+class SingleFlight:
+    """같은 키의 동시 조회를 한 번의 호출로 합침
+
+    진행 중인 호출이 있으면 새로 보내지 않고 그 결과를 함께 받으며,
+    끝난 결과는 ttl 초 동안 그대로 돌려줍니다 (0 이면 진행 중인 호출만 공유).
+    """
+
+    def __init__(self, ttl: float = 0.0):
+        self.ttl = ttl
+        # 키별 (만료 시각, 결과)
+        self.results: dict = {}
+        self.next_sweep = 0.0
+        self.async_calls: dict = {}
+
+    def get_cached(self, key, ttl: float):
+        if ttl <= 0:
+            return MISSING
+        cached = self.results.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        return MISSING
+
+    def set_cached(self, key, value, ttl: float):
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.evict_expired(now)
+            self.next_sweep = now + ttl
+        self.results[key] = (now + ttl, value)
+
+    def evict_expired(self, now: float):
+        # 심볼 묶음마다 키가 생기므로 만료된 결과를 지우지 않으면 계속 늘어남
+        expired = [key for key, (expires_at, _) in self.results.items() if expires_at <= now]
+        for key in expired:
+            del self.results[key]
+
+    async def run(self, key, fetch, ttl: float):
+        try:
+            value = await fetch()
+            self.set_cached(key, value, ttl)
+            return value
+        finally:
+            del self.async_calls[key]
+
+    async def ado(self, key, fetch, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        value = self.get_cached(key, ttl)
+        if value is not MISSING:
+            return value
+
+        task = self.async_calls.get(key)
+        if task is None:
+            task = self.async_calls[key] = asyncio.ensure_future(self.run(key, fetch, ttl))
+        # 먼저 부른 쪽이 취소돼도 같은 조회를 기다리는 다른 요청은 결과를 받도록 보호
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self.results.clear()
+
+
+# (거래소, 심볼)별 티커 조회
+tickers = SingleFlight(ttl=settings.TICKER_TTL)
@@ -1,18 +1,62 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
 import json
+import threading
+import time
 import httpx
 from exchange.stock.error import TokenExpired
 from exchange.stock.schemas import *
 from exchange.database import db
+from exchange.lease import Lease
+from exchange.stock.limiter import limiters
+from exchange.singleflight import tickers
 from pydantic import validate_arguments
 import traceback
 import copy
 from exchange.model import MarketOrder
-from pydantic import ValidationError  # kis.py 파일에 추가
 from devtools import debug
 
 
-class KoreaInvestment:
+# 주문 경로에서 auth() 를 다시 부르는 기준 (만료까지 남은 시간)
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+# 백그라운드 갱신 시점 (check_auth 가 만료 1시간 전부터 재발급 대상으로 봄)
+TOKEN_REFRESH_BEFORE = timedelta(hours=1)
+TOKEN_REFRESH_RETRY = 60
+
+# 잔고 캐시 유지 시간(초)과 연속조회 최대 페이지 수
+HOLDINGS_TTL = 2.0
+HOLDINGS_MAX_PAGES = 20
+
+# 현재가 캐시 유지 시간(초)과 멀티종목 시세 조회 한 번에 묻는 종목 수
+QUOTE_TTL = 0.3
+QUOTE_BATCH_SIZE = 30
+
+# 초당 거래건수 초과 응답 코드와 다시 보내는 횟수
+RATE_LIMIT_CODE = b"EGW00201"
+RATE_LIMIT_RETRIES = 5
+
+# 체결 조회 간격(초): 처음에는 짧게 보고 두 배씩 늘려 최대 FILL_POLL_MAX 까지
+FILL_POLL_START = 0.02
+FILL_POLL_MAX = 1.0
+FILL_TIMEOUT = 30.0
+
+# 계좌별 연결 풀 (주문이 몰릴 때도 매번 TLS 핸드셰이크를 하지 않도록 연결을 오래 유지)
+SESSION_LIMITS = httpx.Limits(
+    max_connections=20, max_keepalive_connections=20, keepalive_expiry=120
+)
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+# 호출 종류별 타임아웃 (초)
+ORDER_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+QUOTE_TIMEOUT = httpx.Timeout(3.0, connect=2.0)
+BALANCE_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+
+
+class AsyncKoreaInvestment:
+    """async_session(httpx.AsyncClient) 기반 한국투자증권
+
+    토큰 발급(auth)은 토큰 갱신 타이머에서도 부르므로 send_sync 로 동기 처리하며 생성도 스레드에서 합니다.
+    """
+
     def __init__(
         self,
         key: str,
@@ -30,10 +74,21 @@ class KoreaInvestment:
             else BaseUrls.paper_base_url.value
         )
         self.is_auth = False
+        self.access_token: str | None = None
+        self.token_expired_at: datetime | None = None
+        self.refresh_timer: threading.Timer | None = None
+        # 시장(KRX/USA)별 (조회 시각, {티커: (보유 수량, 현재가)})
+        self.holdings: dict[str, tuple[float, dict]] = {}
+        self.holdings_version = 0
+        # (거래소, 티커)별 (조회 시각, 현재가)
+        self.quotes: dict[tuple[str, str], tuple[float, float]] = {}
         self.account_number = account_number
         self.base_headers = {}
-        self.session = httpx.Client()
-        self.async_session = httpx.AsyncClient()
+        self.session = httpx.Client(limits=SESSION_LIMITS, timeout=DEFAULT_TIMEOUT)
+        # KIS 가 HTTP/2 를 지원하면 한 연결로 여러 요청을 동시에 보내고, 아니면 HTTP/1.1 keep-alive 풀 사용
+        self.async_session = httpx.AsyncClient(
+            http2=True, limits=SESSION_LIMITS, timeout=DEFAULT_TIMEOUT
+        )
         self.auth()
 
         self.base_body = {}
@@ -51,35 +106,84 @@ class KoreaInvestment:
             "AMEX": QueryExchangeCode.AMEX,
         }
 
+    async def close(self):
+        await self.async_session.aclose()
+        self.close_session()
+
     def init_info(self, order_info: MarketOrder):
-        self.order_info = order_info
+        # 주문 정보는 호출마다 인자로 넘기므로 봇에는 저장하지 않음 (같은 계좌로 여러 주문을 동시에 실행)
+        pass
 
     def close_session(self):
+        if self.refresh_timer is not None:
+            self.refresh_timer.cancel()
         self.session.close()
 
-    def get(self, endpoint: str, params: dict = None, headers: dict = None):
+    def get_bucket(self, url: str):
+        # 토큰 확인처럼 모의 계좌도 실전 서버를 부르는 경우가 있어 URL 로 버킷을 고름
+        if url.startswith(BaseUrls.paper_base_url.value):
+            return limiters.get(BaseUrls.paper_base_url.value, self.kis_number)
+        return limiters.get(BaseUrls.base_url.value, self.kis_number)
+
+    def is_rate_limited(self, response: httpx.Response) -> bool:
+        return RATE_LIMIT_CODE in response.content
+
+    async def send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """계좌별 초당 한도 안에서 요청을 보내고, 한도 초과(EGW00201) 응답이면 다시 보냄"""
+        bucket = self.get_bucket(url)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            wait = bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            response = await self.async_session.request(method, url, **kwargs)
+            if attempt == RATE_LIMIT_RETRIES or not self.is_rate_limited(response):
+                return response
+            bucket.drain()
+
+    def send_sync(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """send 의 동기 버전, 토큰 발급/확인과 해시키는 스레드(타이머 포함)에서 부르므로 이 경로를 씀"""
+        bucket = self.get_bucket(url)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            response = self.session.request(method, url, **kwargs)
+            if attempt == RATE_LIMIT_RETRIES or not self.is_rate_limited(response):
+                return response
+            bucket.drain()
+
+    async def get(
+        self, endpoint: str, params: dict = None, headers: dict = None, timeout=None
+    ):
         url = f"{self.base_url}{endpoint}"
-        # headers |= self.base_headers
-        return self.session.get(url, params=params, headers=headers).json()
+        response = await self.send(
+            "GET", url, params=params, headers=headers, timeout=timeout or DEFAULT_TIMEOUT
+        )
+        return response.json()
 
-    def post_with_error_handling(
-        self, endpoint: str, data: dict = None, headers: dict = None
+    async def post_with_error_handling(
+        self, endpoint: str, data: dict = None, headers: dict = None, timeout=None
     ):
         url = f"{self.base_url}{endpoint}"
-        response = self.session.post(url, json=data, headers=headers).json()
+        response = await self.send(
+            "POST", url, json=data, headers=headers, timeout=timeout or DEFAULT_TIMEOUT
+        )
+        response = response.json()
         if "access_token" in response.keys() or response["rt_cd"] == "0":
             return response
         else:
             raise Exception(response)
 
-    def post(self, endpoint: str, data: dict = None, headers: dict = None):
-        return self.post_with_error_handling(endpoint, data, headers)
+    async def post(
+        self, endpoint: str, data: dict = None, headers: dict = None, timeout=None
+    ):
+        return await self.post_with_error_handling(endpoint, data, headers, timeout)
 
     def get_hashkey(self, data) -> str:
         headers = {"appKey": self.key, "appSecret": self.secret}
         endpoint = "/uapi/hashkey"
         url = f"{self.base_url}{endpoint}"
-        return self.session.post(url, json=data, headers=headers).json()["HASH"]
+        return self.send_sync("POST", url, json=data, headers=headers).json()["HASH"]
 
     def open_auth(self):
         return self.open_json("auth.json")
@@ -96,7 +200,8 @@ class KoreaInvestment:
                 return False
             else:
                 if not self.is_auth:
-                    response = self.session.get(
+                    response = self.send_sync(
+                        "GET",
                         "https://openapi.koreainvestment.com:9443/uapi/domestic-stock/v1/quotations/inquire-ccnl",
                         headers={
                             "authorization": f"BEARER {access_token}",
@@ -133,7 +238,7 @@ class KoreaInvestment:
 
         url = f"{base_url}{endpoint}"
 
-        response = self.session.post(url, json=data).json()
+        response = self.send_sync("POST", url, json=data).json()
         if "access_token" in response.keys() or response.get("rt_cd") == "0":
             return response["access_token"], response["access_token_token_expired"]
         else:
@@ -143,8 +248,14 @@ class KoreaInvestment:
         auth_id = f"KIS{self.kis_number}"
         auth = db.get_auth(auth_id)
         if not self.check_auth(auth, self.key, self.secret, self.kis_number):
-            auth = self.create_auth(self.key, self.secret)
-            db.set_auth(auth_id, auth[0], auth[1])
+            # 여러 워커/스레드가 동시에 토큰을 발급받지 않도록 lease 를 가진 한 곳에서만 발급
+            with Lease(f"kis_token:{auth_id}", timeout=30):
+                auth = db.get_auth(auth_id)
+                if not self.check_auth(auth, self.key, self.secret, self.kis_number):
+                    auth = self.create_auth(self.key, self.secret)
+                    db.set_auth(auth_id, auth[0], auth[1])
+                else:
+                    self.is_auth = True
         else:
             self.is_auth = True
         access_token = auth[0]
@@ -154,10 +265,36 @@ class KoreaInvestment:
             appsecret=self.secret,
             custtype="P",
         ).dict()
+        self.access_token = access_token
+        self.token_expired_at = datetime.strptime(auth[1], "%Y-%m-%d %H:%M:%S")
+        self.schedule_token_refresh()
         return auth
 
-    @validate_arguments
-    def create_order(
+    def is_token_fresh(self) -> bool:
+        return (
+            self.token_expired_at is not None
+            and self.token_expired_at - datetime.now() > TOKEN_EXPIRY_MARGIN
+        )
+
+    def schedule_token_refresh(self, delay: float | None = None):
+        """토큰 만료 1시간 전에 백그라운드에서 새 토큰으로 교체 (check_auth 가 재발급하는 시점)"""
+        if self.refresh_timer is not None:
+            self.refresh_timer.cancel()
+        if delay is None:
+            refresh_at = self.token_expired_at - TOKEN_REFRESH_BEFORE
+            delay = max((refresh_at - datetime.now()).total_seconds(), 1)
+        self.refresh_timer = threading.Timer(delay, self.refresh_token)
+        self.refresh_timer.daemon = True
+        self.refresh_timer.start()
+
+    def refresh_token(self):
+        try:
+            self.auth()
+        except Exception:
+            print(traceback.format_exc())
+            self.schedule_token_refresh(TOKEN_REFRESH_RETRY)
+
+    def get_order_request(
         self,
         exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"],
         ticker: str,
@@ -166,7 +303,9 @@ class KoreaInvestment:
         amount: int,
         price: int = 0,
         mintick=0.01,
+        current_price: float | None = None,
     ):
+        """주문 요청의 (endpoint, body, headers), 미국 주식은 current_price 기준으로 지정가 계산"""
         endpoint = (
             Endpoints.korea_order.value
             if exchange == "KRX"
@@ -204,7 +343,6 @@ class KoreaInvestment:
                 )
         elif exchange in ("NASDAQ", "NYSE", "AMEX"):
             exchange_code = self.order_exchange_code.get(exchange)
-            current_price = self.fetch_current_price(exchange, ticker)
             price = (
                 current_price + mintick * 50
                 if side == "buy"
@@ -244,42 +382,31 @@ class KoreaInvestment:
                     OVRS_ORD_UNPR=price,
                     OVRS_EXCG_CD=exchange_code,
                 )
-        return self.post(endpoint, body, headers)
-
-    def create_market_buy_order(
-        self,
-        exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"],
-        ticker: str,
-        amount: int,
-        price: int = 0,
-    ):
-        if exchange == "KRX":
-            return self.create_order(exchange, ticker, "market", "buy", amount)
-        elif exchange == "usa":
-            return self.create_order(exchange, ticker, "market", "buy", amount, price)
+        return endpoint, body, headers
 
-    def create_market_sell_order(
+    @validate_arguments
+    async def create_order(
         self,
         exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"],
         ticker: str,
+        order_type: Literal["limit", "market"],
+        side: Literal["buy", "sell"],
         amount: int,
         price: int = 0,
+        mintick=0.01,
     ):
-        if exchange == "KRX":
-            return self.create_order(exchange, ticker, "market", "sell", amount)
-        elif exchange == "usa":
-            return self.create_order(exchange, ticker, "market", "sell", amount, price)
-
-    def create_korea_market_buy_order(self, ticker: str, amount: int):
-        return self.create_market_buy_order("KRX", ticker, amount)
-
-    def create_korea_market_sell_order(self, ticker: str, amount: int):
-        return self.create_market_sell_order("KRX", ticker, amount)
-
-    def create_usa_market_buy_order(self, ticker: str, amount: int, price: int):
-        return self.create_market_buy_order("usa", ticker, amount, price) 
+        current_price = (
+            await self.fetch_current_price(exchange, ticker) if exchange != "KRX" else None
+        )
+        endpoint, body, headers = self.get_order_request(
+            exchange, ticker, order_type, side, amount, price, mintick, current_price
+        )
+        try:
+            return await self.post(endpoint, body, headers, timeout=ORDER_TIMEOUT)
+        finally:
+            self.invalidate_holdings()
 
-    def fetch_ticker(
+    def get_ticker_request(
         self, exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"], ticker: str
     ):
         if exchange == "KRX":
@@ -291,20 +418,117 @@ class KoreaInvestment:
             endpoint = Endpoints.usa_ticker.value
             headers = UsaTickerHeaders(**self.base_headers).dict()
             query = UsaTickerQuery(EXCD=exchange_code, SYMB=ticker).dict()
-        ticker = self.get(endpoint, query, headers)
+        return endpoint, query, headers
+
+    async def fetch_ticker(
+        self, exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"], ticker: str
+    ):
+        endpoint, query, headers = self.get_ticker_request(exchange, ticker)
+        ticker = await self.get(endpoint, query, headers, timeout=QUOTE_TIMEOUT)
         return ticker.get("output")
 
-    def fetch_current_price(self, exchange, ticker: str):
+    def parse_current_price(self, exchange, ticker: dict):
         try:
             if exchange == "KRX":
-                return float(self.fetch_ticker(exchange, ticker)["stck_prpr"])
+                return float(ticker["stck_prpr"])
             elif exchange in ("NASDAQ", "NYSE", "AMEX"):
-                return float(self.fetch_ticker(exchange, ticker)["last"])
+                return float(ticker["last"])
 
-        except KeyError:
+        except (KeyError, TypeError):
             print(traceback.format_exc())
             return None
 
+    def get_cached_price(self, exchange: str, ticker: str) -> float | None:
+        cached = self.quotes.get((exchange, ticker))
+        if cached is not None and time.monotonic() - cached[0] < QUOTE_TTL:
+            return cached[1]
+        return None
+
+    def set_cached_price(self, exchange: str, ticker: str, price: float | None):
+        if price is not None:
+            self.quotes[(exchange, ticker)] = (time.monotonic(), price)
+
+    def can_batch_quotes(self, exchange: str) -> bool:
+        # 멀티종목 시세 조회는 국내 주식, 실전 서버만 지원
+        return exchange == "KRX" and self.base_url == BaseUrls.base_url
+
+    def get_multi_price_request(self, tickers: list[str]):
+        headers = KoreaMultiPriceHeaders(**self.base_headers).dict()
+        params = {}
+        for index, ticker in enumerate(tickers, start=1):
+            params[f"FID_COND_MRKT_DIV_CODE_{index}"] = "J"
+            params[f"FID_INPUT_ISCD_{index}"] = ticker
+        return Endpoints.korea_multi_price.value, params, headers
+
+    def parse_multi_price(self, response: dict) -> dict[str, float]:
+        prices = {}
+        for item in response.get("output") or []:
+            try:
+                prices[item["inter_shrn_iscd"]] = float(item["inter2_prpr"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return prices
+
+    def split_cached_prices(self, exchange: str, tickers: list[str]):
+        """캐시에 있는 현재가와 새로 조회해야 할 티커 목록으로 나눔 (중복 티커는 한 번만)"""
+        prices, missing = {}, []
+        for ticker in dict.fromkeys(tickers):
+            price = self.get_cached_price(exchange, ticker)
+            if price is None:
+                missing.append(ticker)
+            else:
+                prices[ticker] = price
+        return prices, missing
+
+    def get_quote_batches(self, tickers: list[str]) -> list[list[str]]:
+        return [
+            tickers[index : index + QUOTE_BATCH_SIZE]
+            for index in range(0, len(tickers), QUOTE_BATCH_SIZE)
+        ]
+
+    async def fetch_current_price(self, exchange, ticker: str):
+        price = self.get_cached_price(exchange, ticker)
+        if price is None:
+            price = await tickers.ado(
+                (self.base_url, exchange, ticker),
+                lambda: self.fetch_uncached_price(exchange, ticker),
+                ttl=0,
+            )
+            self.set_cached_price(exchange, ticker, price)
+        return price
+
+    async def fetch_uncached_price(self, exchange, ticker: str):
+        return self.parse_current_price(exchange, await self.fetch_ticker(exchange, ticker))
+
+    async def fetch_multi_price(self, tickers: list[str]) -> dict[str, float]:
+        try:
+            endpoint, params, headers = self.get_multi_price_request(tickers)
+            response = await self.get(endpoint, params, headers, timeout=QUOTE_TIMEOUT)
+            return self.parse_multi_price(response)
+        except Exception as e:
+            print(f"멀티종목 시세 조회 중 오류 발생: {str(e)}")
+            return {}
+
+    async def fetch_current_prices(self, exchange, tickers: list[str]) -> dict[str, float | None]:
+        # 묶음 조회와 나머지 종목 조회를 각각 동시에 보냄
+        prices, missing = self.split_cached_prices(exchange, tickers)
+        if self.can_batch_quotes(exchange):
+            batches = await asyncio.gather(
+                *(self.fetch_multi_price(batch) for batch in self.get_quote_batches(missing))
+            )
+            for fetched in batches:
+                for ticker, price in fetched.items():
+                    self.set_cached_price(exchange, ticker, price)
+                    prices[ticker] = price
+        rest = [ticker for ticker in missing if prices.get(ticker) is None]
+        results = await asyncio.gather(
+            *(self.fetch_current_price(exchange, ticker) for ticker in rest),
+            return_exceptions=True,
+        )
+        for ticker, price in zip(rest, results):
+            prices[ticker] = None if isinstance(price, BaseException) else price
+        return prices
+
     def open_json(self, path):
         with open(path, "r") as f:
             return json.load(f)
@@ -313,143 +537,230 @@ class KoreaInvestment:
         with open(path, "w") as f:
             json.dump(data, f)
 
-    @validate_arguments
-    def korea_fetch_balance(self):
-        try:
-            endpoint = Endpoints.korea_balance.value
-            headers = copy.deepcopy(self.base_headers)
-            headers["tr_id"] = TransactionId.korea_balance.value  # 'TTTC8434R'
-
-            # 요청 파라미터 설정
-            request_params = KoreaStockBalanceRequest(
-                CANO=self.account_number,  # 8자리 계좌번호
-                ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,  # 2자리 계좌상품코드
-                AFHR_FLPR_YN="N",  # 시간외단일가여부
-                OFL_YN="",  # 오프라인 여부
-                INQR_DVSN="02",  # 조회구분: 종목별
-                UNPR_DVSN="01",  # 단가구분
-                FUND_STTL_ICLD_YN="N",  # 펀드결제분포함여부
-                FNCG_AMT_AUTO_RDPT_YN="N",  # 융자금액자동상환여부
-                PRCS_DVSN="00",  # 처리구분: 전일매매포함
-                CTX_AREA_FK100="",  # 연속조회검색조건100
-                CTX_AREA_NK100="",  # 연속조회키100
-            ).dict()
-
-            # 디버깅: 잔고 조회 요청 파라미터 출력
-            print("잔고 조회 요청 파라미터:")
-            print(json.dumps(request_params, indent=2, ensure_ascii=False))
-
-            # API 호출 (GET 요청)
-            response = self.get(endpoint, params=request_params, headers=headers)
+    def get_korea_balance_request(self, ctx_fk: str = "", ctx_nk: str = ""):
+        endpoint = Endpoints.korea_balance.value
+        headers = copy.deepcopy(self.base_headers)
+        headers["tr_id"] = TransactionId.korea_balance.value  # 'TTTC8434R'
+
+        # 요청 파라미터 설정
+        request_params = KoreaStockBalanceRequest(
+            CANO=self.account_number,  # 8자리 계좌번호
+            ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,  # 2자리 계좌상품코드
+            AFHR_FLPR_YN="N",  # 시간외단일가여부
+            OFL_YN="",  # 오프라인 여부
+            INQR_DVSN="02",  # 조회구분: 종목별
+            UNPR_DVSN="01",  # 단가구분
+            FUND_STTL_ICLD_YN="N",  # 펀드결제분포함여부
+            FNCG_AMT_AUTO_RDPT_YN="N",  # 융자금액자동상환여부
+            PRCS_DVSN="00",  # 처리구분: 전일매매포함
+            CTX_AREA_FK100=ctx_fk,  # 연속조회검색조건100
+            CTX_AREA_NK100=ctx_nk,  # 연속조회키100
+        ).dict()
+        return endpoint, request_params, headers
 
-            # 디버깅: 잔고 조회 응답 출력
-            print("잔고 조회 응답:")
-            print(json.dumps(response, indent=2, ensure_ascii=False))
+    def get_usa_balance_request(self, ctx_fk: str = "", ctx_nk: str = ""):
+        endpoint = Endpoints.usa_balance.value
+        headers = copy.deepcopy(self.base_headers)
+        headers["tr_id"] = TransactionId.usa_balance.value  # 'TTTS3012R'
+
+        # 요청 파라미터 설정
+        request_params = UsaStockBalanceRequest(
+            CANO=self.account_number,  # 8자리 계좌번호
+            ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,  # 2자리 계좌상품코드
+            OVRS_EXCG_CD="NASD",  # 매핑된 해외 거래소 코드
+            TR_CRCY_CD="USD",     # 거래 통화 코드
+            CTX_AREA_FK200=ctx_fk,    # 연속조회 검색조건200
+            CTX_AREA_NK200=ctx_nk,    # 연속조회 키200
+        ).dict()
+        return endpoint, request_params, headers
+
+    def get_holdings_market(self, exchange_name: str) -> str:
+        if exchange_name == "KRX":
+            return "KRX"
+        elif exchange_name in ("NASDAQ", "NYSE", "AMEX"):
+            return "USA"
+        raise ValueError(f"지원하지 않는 거래소: {exchange_name}")
+
+    def get_holdings_page_request(self, market: str, ctx_fk: str, ctx_nk: str):
+        if market == "KRX":
+            endpoint, params, headers = self.get_korea_balance_request(ctx_fk, ctx_nk)
+        else:
+            endpoint, params, headers = self.get_usa_balance_request(ctx_fk, ctx_nk)
+        # 두 번째 페이지부터는 연속조회
+        headers["tr_cont"] = "N" if ctx_nk else ""
+        return endpoint, params, headers
+
+    def index_holdings_page(self, market: str, response: dict, holdings: dict):
+        """잔고 한 페이지를 티커별 (보유 수량, 현재가)로 색인하고 다음 페이지 연속조회 키를 반환"""
+        if response.get("rt_cd") != "0":
+            raise Exception(f"잔고 조회 실패: {response.get('msg1', response)}")
+        if market == "KRX":
+            for item in response.get("output1", []):
+                holdings[item["pdno"]] = (int(item["hldg_qty"]), float(item["prpr"]))
+            return response.get("ctx_area_fk100", ""), response.get("ctx_area_nk100", "")
+        for item in response.get("output1", []):
+            if item.get("ovrs_pdno"):
+                holdings[item["ovrs_pdno"]] = (
+                    int(float(item["ovrs_cblc_qty"] or 0)),
+                    float(item["now_pric2"] or 0),
+                )
+        return response.get("ctx_area_fk200", ""), response.get("ctx_area_nk200", "")
+
+    def get_cached_holdings(self, market: str) -> dict | None:
+        cached = self.holdings.get(market)
+        if cached is not None and time.monotonic() - cached[0] < HOLDINGS_TTL:
+            return cached[1]
+        return None
+
+    def set_cached_holdings(self, market: str, holdings: dict, version: int):
+        # 조회 중에 주문이 나갔으면 이미 지난 잔고이므로 저장하지 않음
+        if version == self.holdings_version:
+            self.holdings[market] = (time.monotonic(), holdings)
+
+    def invalidate_holdings(self):
+        self.holdings_version += 1
+        self.holdings.clear()
+
+    async def fetch_holdings(self, exchange_name: str) -> dict[str, tuple[int, float]]:
+        market = self.get_holdings_market(exchange_name)
+        holdings = self.get_cached_holdings(market)
+        if holdings is not None:
+            return holdings
+        version = self.holdings_version
+        holdings = {}
+        ctx_fk = ctx_nk = ""
+        for _ in range(HOLDINGS_MAX_PAGES):
+            endpoint, params, headers = self.get_holdings_page_request(market, ctx_fk, ctx_nk)
+            response = await self.send(
+                "GET", f"{self.base_url}{endpoint}", params=params, headers=headers, timeout=BALANCE_TIMEOUT
+            )
+            ctx_fk, ctx_nk = self.index_holdings_page(market, response.json(), holdings)
+            if response.headers.get("tr_cont") not in ("F", "M") or not ctx_nk.strip():
+                break
+        self.set_cached_holdings(market, holdings, version)
+        return holdings
 
-            if response["rt_cd"] == "0":
-                print("잔고 조회 성공")
-                return KoreaStockBalanceResponse(**response)
-            else:
-                print(f"잔고 조회 실패: {response['msg1']}")
-                return None
+    async def fetch_balance_and_price(self, exchange_name: str, fetch_ticker: str):
+        try:
+            holdings = await self.fetch_holdings(exchange_name)
+            return holdings.get(fetch_ticker, (0, 0.0))
 
         except Exception as e:
             print(f"잔고 조회 중 오류 발생: {str(e)}")
-            return None  # 예외 발생 시 None 반환
-        
-
+            return 0, 0.0  # 오류 발생 시 기본값 반환
 
-    @validate_arguments
-    def usa_fetch_balance(self):
+    def get_order_number(self, order_result: dict) -> str | None:
         try:
-            endpoint = Endpoints.usa_balance.value
-            headers = copy.deepcopy(self.base_headers)
-            headers["tr_id"] = TransactionId.usa_balance.value  # 'TTTS3012R'
-
-            # 요청 파라미터 설정
-            request_params = UsaStockBalanceRequest(
-                CANO=self.account_number,  # 8자리 계좌번호
-                ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,  # 2자리 계좌상품코드
-                OVRS_EXCG_CD="NASD",  # 매핑된 해외 거래소 코드
-                TR_CRCY_CD="USD",     # 거래 통화 코드
-                CTX_AREA_FK200="",    # 연속조회 검색조건200
-                CTX_AREA_NK200="",    # 연속조회 키200
+            return order_result["output"]["ODNO"] or None
+        except (KeyError, TypeError):
+            return None
+
+    def get_order_fill_request(
+        self, exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"], ticker: str, order_no: str
+    ):
+        headers = copy.deepcopy(self.base_headers)
+        is_paper = self.base_url == BaseUrls.paper_base_url
+        today = datetime.now()
+        if exchange == "KRX":
+            endpoint = Endpoints.korea_fills.value
+            headers["tr_id"] = (
+                TransactionId.korea_paper_fills.value if is_paper else TransactionId.korea_fills.value
+            )
+            params = KoreaOrderFillRequest(
+                CANO=self.account_number,
+                ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,
+                INQR_STRT_DT=today.strftime("%Y%m%d"),
+                INQR_END_DT=today.strftime("%Y%m%d"),
+                PDNO=ticker,
+                ODNO=order_no,
             ).dict()
+        else:
+            endpoint = Endpoints.usa_fills.value
+            headers["tr_id"] = (
+                TransactionId.usa_paper_fills.value if is_paper else TransactionId.usa_fills.value
+            )
+            # 조회 일자는 현지 기준이므로 한국 날짜 하루 전부터 조회
+            params = UsaOrderFillRequest(
+                CANO=self.account_number,
+                ACNT_PRDT_CD=self.base_order_body.ACNT_PRDT_CD,
+                PDNO=ticker,
+                ORD_STRT_DT=(today - timedelta(days=1)).strftime("%Y%m%d"),
+                ORD_END_DT=today.strftime("%Y%m%d"),
+                ODNO=order_no,
+            ).dict()
+        return endpoint, params, headers
 
-            # 디버깅: 해외 잔고 조회 요청 파라미터 출력
-            print("해외 잔고 조회 요청 파라미터:")
-            print(json.dumps(request_params, indent=2, ensure_ascii=False))
-
-            # API 호출 (GET 요청)
-            response = self.get(endpoint, params=request_params, headers=headers)
-
-            # 디버깅: 해외 잔고 조회 응답 출력
-            print("해외 잔고 조회 응답:")
-            print(json.dumps(response, indent=2, ensure_ascii=False))
-
-            if response.get("rt_cd") == "0":
-                print("해외 잔고 조회 성공")
-
-                # `output1` 리스트에서 모든 필드가 빈 문자열인 항목을 필터링
-                filtered_output1 = [
-                    item for item in response.get("output1", [])
-                    if any(value not in ("", "0", "0.0000", "0.00000000", "0.000000") for value in item.values())
-                ]
-                response["output1"] = filtered_output1
-
-                try:
-                    usa_balance = UsaStockBalanceResponse(**response)
-                    print(f"Parsed USA Balance: {usa_balance}")
-                    return usa_balance
-                except ValidationError as ve:
-                    print(f"해외 잔고 조회 중 Pydantic 검증 오류 발생: {ve}")
-                    return None
-            else:
-                print(f"해외 잔고 조회 실패: {response.get('msg1', '알 수 없는 오류')}")
-                return None
+    def parse_order_fill(self, exchange: str, response: dict, order_no: str) -> dict | None:
+        """체결 조회 응답에서 주문번호의 체결 현황, 아직 조회되지 않으면 None
 
-        except ValidationError as ve:
-            print(f"해외 잔고 조회 중 유효성 검사 오류 발생: {ve.errors()}")
+        반환값: {"order_no", "filled": 체결 수량, "value": 체결 금액, "price": 평균 체결가,
+                 "remaining": 미체결 수량, "done": 더 이상 체결될 수량이 없는지}
+        """
+        if response.get("rt_cd") != "0":
             return None
-        except Exception as e:
-            print(f"해외 잔고 조회 중 오류 발생: {str(e)}")
-            print(traceback.format_exc())
-            return None  # 예외 발생 시 None 반환
-      
-        
-    @validate_arguments
-    def fetch_balance_and_price(self, exchange_name: str, fetch_ticker: str):
-        try:
-            # KRX 거래소 처리
-            if exchange_name == "KRX":
-                balance = self.korea_fetch_balance()
-                if balance is None:
-                    raise ValueError("KRX 잔고 조회 실패")
-
-                holding = next((item for item in balance.output1 if item.pdno == fetch_ticker), None)
-                holding_qty = int(holding.hldg_qty) if holding else 0
-                holding_price = float(holding.prpr) if holding else 0.0  # 가격 조회
-
-            # 미국 거래소 처리
-            elif exchange_name in ["NASDAQ", "NYSE", "AMEX"]:
-                balance = self.usa_fetch_balance()
-                if balance is None:
-                    raise ValueError(f"{exchange_name} 잔고 조회 실패")
-
-                holding = next((item for item in balance.output1 if item.ovrs_pdno == fetch_ticker), None)
-                holding_qty = int(holding.ovrs_cblc_qty) if holding else 0
-                holding_price = float(holding.now_pric2) if holding else 0.0  # 가격 조회
-
-            # 지원하지 않는 거래소 처리
+        items = response.get("output1") if exchange == "KRX" else response.get("output")
+        for item in items or []:
+            # 주문 응답과 조회 응답의 주문번호 자릿수가 다를 수 있음
+            if item.get("odno", "").lstrip("0") != order_no.lstrip("0"):
+                continue
+            if exchange == "KRX":
+                filled = int(item.get("tot_ccld_qty") or 0)
+                value = float(item.get("tot_ccld_amt") or 0)
+                price = float(item.get("avg_prvs") or 0)
+                remaining = int(item.get("rmn_qty") or 0)
+                cancelled = item.get("cncl_yn") == "Y"
             else:
-                raise ValueError(f"지원하지 않는 거래소: {exchange_name}")
-
-            # 보유 수량과 페어 가격 반환
-            return holding_qty, holding_price
+                filled = int(float(item.get("ft_ccld_qty") or 0))
+                value = float(item.get("ft_ccld_amt3") or 0)
+                price = float(item.get("ft_ccld_unpr3") or 0)
+                remaining = int(float(item.get("nccs_qty") or 0))
+                cancelled = bool(item.get("rjct_rson"))
+            return {
+                "order_no": order_no,
+                "filled": filled,
+                "value": value or filled * price,
+                "price": price,
+                "remaining": remaining,
+                "done": cancelled or (filled > 0 and remaining == 0),
+            }
+        return None
+
+    async def fetch_order_fill(
+        self, exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"], ticker: str, order_no: str
+    ) -> dict | None:
+        endpoint, params, headers = self.get_order_fill_request(exchange, ticker, order_no)
+        response = await self.get(endpoint, params, headers, timeout=QUOTE_TIMEOUT)
+        return self.parse_order_fill(exchange, response, order_no)
+
+    async def wait_for_fill(
+        self,
+        exchange: Literal["KRX", "NASDAQ", "NYSE", "AMEX"],
+        ticker: str,
+        order_no: str | None,
+        timeout: float = FILL_TIMEOUT,
+    ) -> dict | None:
+        """주문번호의 체결이 끝날 때까지 체결 조회 (간격은 20ms 부터 두 배씩, 최대 1초)
+
+        체결이 끝나면 바로 반환하고, timeout 이 지나면 마지막 체결 현황(없으면 None)을 반환합니다.
+        """
+        if not order_no:
+            return None
+        deadline = time.monotonic() + timeout
+        delay = FILL_POLL_START
+        fill = None
+        while True:
+            try:
+                fill = await self.fetch_order_fill(exchange, ticker, order_no) or fill
+            except Exception as e:
+                print(f"체결 조회 중 오류 발생: {str(e)}")
+            if fill is not None and fill["done"]:
+                return fill
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0:
+                return fill
+            await asyncio.sleep(min(delay, remaining_time))
+            delay = min(delay * 2, FILL_POLL_MAX)
 
-        except Exception as e:
-            print(f"잔고 조회 중 오류 발생: {str(e)}")
-            return 0, 0.0  # 오류 발생 시 기본값 반환
 
 if __name__ == "__main__":
     pass
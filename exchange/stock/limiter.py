@@ -0,0 +1,81 @@
+import threading
+import time
+from exchange.stock.schemas import BaseUrls
+from exchange.utility import settings
+
+# 초당 한도 중 꾸준히 쓰는 비율, 나머지는 한가할 때 모아 두는 순간 여유분
+SUSTAINED_RATIO = 0.75
+
+
+class TokenBucket:
+    """초당 rate 개씩 채워지고 최대 capacity 개까지 쌓이는 토큰 버킷
+
+    reserve() 는 토큰을 먼저 가져가고 기다릴 시간만 돌려주므로 스레드와 이벤트 루프에서 함께 쓸 수 있고,
+    먼저 요청한 호출이 먼저 나갑니다.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """토큰 하나를 예약하고 사용할 수 있을 때까지 기다려야 하는 시간(초)을 반환"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def drain(self):
+        # 한도 초과 응답을 받으면 서버 쪽 창이 지날 때까지 모아 둔 여유분을 버림
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = time.monotonic()
+
+
+def get_rate_limit(base_url: str) -> float:
+    """이 프로세스가 쓸 수 있는 초당 호출 수 (버킷은 프로세스마다 따로 있으므로 워커 수로 나눔)"""
+    if base_url == BaseUrls.paper_base_url:
+        limit = settings.KIS_PAPER_RATE_LIMIT
+    else:
+        limit = settings.KIS_RATE_LIMIT
+    return limit / max(settings.WORKERS, 1)
+
+
+def create_bucket(base_url: str) -> TokenBucket:
+    # 1초 동안 나갈 수 있는 최대 호출 수(rate + capacity)가 초당 한도를 넘지 않도록 나눔
+    # 한도가 작으면(모의 서버, 워커 여러 개) capacity 가 1 보다 작아 첫 호출부터 기다릴 수 있음
+    limit = get_rate_limit(base_url)
+    rate = limit * SUSTAINED_RATIO
+    return TokenBucket(rate, limit - rate)
+
+
+class RateLimiters:
+    """(서버, KIS 번호)별 토큰 버킷
+
+    같은 계좌라도 실전/모의 서버는 한도가 다르므로 서버마다 버킷을 따로 둡니다.
+    """
+
+    def __init__(self):
+        self.buckets: dict[tuple[str, int], TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def get(self, base_url: str, kis_number: int) -> TokenBucket:
+        key = (base_url, kis_number)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = create_bucket(base_url)
+        return bucket
+
+    def clear(self):
+        self.buckets.clear()
+
+
+limiters = RateLimiters()
@@ -23,14 +23,17 @@ class Endpoints(str, Enum):
     korea_order = f"{korea_order_base}/trading/order-cash"  # 현금 주문
     korea_order_buyable = f"{korea_order_base}/trading/inquire-psbl-order"  # 주문 가능 여부 조회
     korea_balance = f"{korea_order_base}/trading/inquire-balance"  # 주식 잔고 조회 (국내)
+    korea_fills = f"{korea_order_base}/trading/inquire-daily-ccld"  # 주식 일별 주문 체결 조회 (국내)
     
     usa_order_base = "/uapi/overseas-stock/v1"
     usa_order = f"{usa_order_base}/trading/order"  # 현금 주문
     usa_order_buyable = f"{usa_order_base}/trading/inquire-psamount"  # 주문 가능 여부 조회
     usa_current_price = f"/uapi/overseas-price/v1/quotations/price"  # 미국 주식 현재 가격 조회
     usa_balance = f"{usa_order_base}/trading/inquire-balance"  # 미국 주식 잔고 조회
+    usa_fills = f"{usa_order_base}/trading/inquire-ccnl"  # 미국 주식 주문 체결 내역 조회
 
     korea_ticker = "/uapi/domestic-stock/v1/quotations/inquire-price"
+    korea_multi_price = "/uapi/domestic-stock/v1/quotations/intstock-multprice"  # 멀티종목 시세 조회 (최대 30종목)
     usa_ticker = "/uapi/overseas-price/v1/quotations/price"
 
 
@@ -39,6 +42,8 @@ class TransactionId(str, Enum):
     korea_sell = "TTTC0801U"  # 한국 주식 매도
     korea_balance = "TTTC8434R"  # 한국 주식 잔고 조회 (실전)
     korea_paper_balance = "VTTC8434R"  # 한국 주식 잔고 조회 (모의)
+    korea_fills = "TTTC8001R"  # 한국 주식 체결 조회 (실전)
+    korea_paper_fills = "VTTC8001R"  # 한국 주식 체결 조회 (모의)
 
     korea_paper_buy = "VTTC0802U"  # 모의 매수
     korea_paper_sell = "VTTC0801U"  # 모의 매도
@@ -48,11 +53,14 @@ class TransactionId(str, Enum):
     usa_sell = "JTTT1006U"  # 미국 주식 매도
     usa_balance = "TTTS3012R"  # 미국 주식 잔고 조회 (실전)
     usa_balance_mock = "VTTS3012R"  # 미국 주식 잔고 조회 (모의)
+    usa_fills = "JTTT3001R"  # 미국 주식 체결 조회 (실전)
+    usa_paper_fills = "VTTS3035R"  # 미국 주식 체결 조회 (모의)
  
     usa_paper_buy = "VTTT1002U"  # 모의 매수
     usa_paper_sell = "VTTT1001U"  # 모의 매도
 
     korea_ticker = "FHKST01010100"  # 한국 주식 티커 조회
+    korea_multi_price = "FHKST11300006"  # 한국 주식 멀티종목 시세 조회 (실전만 지원)
     usa_ticker = "HHDFS00000300"    # 미국 주식 티커 조회
 
 
@@ -106,6 +114,10 @@ class UsaTickerHeaders(BaseHeaders):
     tr_id: str = TransactionId.usa_ticker.value    # 거래 ID를 미국 티커 조회로 설정
 
 
+class KoreaMultiPriceHeaders(BaseHeaders):
+    tr_id: str = TransactionId.korea_multi_price.value  # 거래 ID를 멀티종목 시세 조회로 설정
+
+
 class KoreaBuyOrderHeaders(BaseHeaders):
     tr_id: str = TransactionId.korea_buy.value      # 거래 ID를 매수로 설정
 
@@ -178,6 +190,23 @@ class KoreaStockBalanceRequest(BaseModel):
     CTX_AREA_FK100: str = ""        # 연속조회 검색조건 (공란 시 최초 조회)
     CTX_AREA_NK100: str = ""        # 연속조회 키 (공란 시 최초 조회)
 
+# 한국 주식 주문 체결 조회 요청 스키마 정의
+class KoreaOrderFillRequest(BaseModel):
+    CANO: str                       # 종합계좌번호 (8자리)
+    ACNT_PRDT_CD: str               # 계좌상품코드 (2자리)
+    INQR_STRT_DT: str               # 조회시작일자 (YYYYMMDD)
+    INQR_END_DT: str                # 조회종료일자 (YYYYMMDD)
+    SLL_BUY_DVSN_CD: Literal['00', '01', '02'] = '00'  # 매도매수구분 (00: 전체, 01: 매도, 02: 매수)
+    INQR_DVSN: Literal['00', '01'] = '00'  # 조회구분 (00: 역순, 01: 정순)
+    PDNO: str = ""                  # 종목번호
+    CCLD_DVSN: Literal['00', '01', '02'] = '00'  # 체결구분 (00: 전체, 01: 체결, 02: 미체결)
+    ORD_GNO_BRNO: str = ""          # 주문채번지점번호
+    ODNO: str = ""                  # 주문번호
+    INQR_DVSN_3: str = '00'         # 조회구분3 (00: 전체)
+    INQR_DVSN_1: str = ""           # 조회구분1
+    CTX_AREA_FK100: str = ""        # 연속조회 검색조건
+    CTX_AREA_NK100: str = ""        # 연속조회 키
+
 # 한국 주식 잔고 조회 응답 스키마 정의
 class KoreaStockBalanceItem(BaseModel):
     pdno: str                      # 종목번호
@@ -210,6 +239,23 @@ class UsaStockBalanceRequest(BaseModel):
     CTX_AREA_FK200: str = ""        # 연속조회 검색조건200 (공란 시 최초 조회)
     CTX_AREA_NK200: str = ""        # 연속조회 키200 (공란 시 최초 조회)
 
+# 미국 주식 주문 체결 조회 요청 스키마 정의
+class UsaOrderFillRequest(BaseModel):
+    CANO: str                       # 종합계좌번호 (8자리)
+    ACNT_PRDT_CD: str               # 계좌상품코드 (2자리)
+    PDNO: str = "%"                 # 종목번호 (% : 전체)
+    ORD_STRT_DT: str                # 주문시작일자 (YYYYMMDD, 현지 기준)
+    ORD_END_DT: str                 # 주문종료일자 (YYYYMMDD, 현지 기준)
+    SLL_BUY_DVSN: Literal['00', '01', '02'] = '00'  # 매도매수구분 (00: 전체, 01: 매도, 02: 매수)
+    CCLD_NCCS_DVSN: Literal['00', '01', '02'] = '00'  # 체결미체결구분 (00: 전체, 01: 체결, 02: 미체결)
+    OVRS_EXCG_CD: str = "%"         # 해외거래소코드 (% : 전체)
+    SORT_SQN: Literal['DS', 'AS'] = 'DS'  # 정렬순서 (DS: 정순, AS: 역순)
+    ORD_DT: str = ""                # 주문일자
+    ORD_GNO_BRNO: str = ""          # 주문채번지점번호
+    ODNO: str = ""                  # 주문번호
+    CTX_AREA_NK200: str = ""        # 연속조회 키200
+    CTX_AREA_FK200: str = ""        # 연속조회 검색조건200
+
 # 미국 주식 잔고 조회 응답 항목을 정의하는 클래스입니다.
 class UsaStockBalanceItem(BaseModel):
     cano: Optional[str] = Field(None, alias="cano")                           # 종목번호 (미국 티커)
@@ -0,0 +1,213 @@
+import asyncio
+import time
+import uuid
+import orjson
+from collections import OrderedDict
+from concurrent.futures import Future
+from exchange.model import OrderContext
+from exchange.database import db, journal
+from exchange.lease import Lease
+
+ACCEPTED = "accepted"
+EXECUTING = "executing"
+FILLED = "filled"
+FAILED = "failed"
+
+# 복구를 맡은 워커가 보유하는 동안 주기적으로 갱신하는 lease 의 만료 시간(초)
+REPLAY_LEASE_TTL = 60
+
+
+def get_replay_lease(boot_time: float) -> Lease:
+    """미완료 주문 복구는 기동마다 워커 하나만 수행
+
+    lease 이름에 기동 시각을 넣어서, 비정상 종료된 이전 프로세스의 lease 가 아직 만료되지 않았어도
+    곧바로 다시 기동한 프로세스의 복구를 막지 않도록 합니다. (같은 기동의 워커들은 같은 이름을 씀)
+    """
+    return Lease(f"journal_replay:{boot_time}", ttl=REPLAY_LEASE_TTL)
+
+
+class OrderTicket:
+    """웹훅 한 건의 처리 상태 (접수 → 실행 중 → 체결/실패)"""
+
+    __slots__ = (
+        "id",
+        "order",
+        "status",
+        "fills",
+        "error",
+        "accepted_at",
+        "started_at",
+        "finished_at",
+        "journaled",
+    )
+
+    def __init__(self, order: OrderContext, ticket_id: str | None = None):
+        self.id = ticket_id or uuid.uuid4().hex
+        self.order = order
+        self.status = ACCEPTED
+        self.fills: list[dict] = []
+        self.error: str | None = None
+        self.accepted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        # 접수 기록의 커밋 완료 (저널에서 복구한 티켓은 None)
+        self.journaled: Future | None = None
+
+    def start(self):
+        self.status = EXECUTING
+        self.started_at = time.time()
+        journal.append(self.id, EXECUTING)
+
+    def fill(self, fills: list[dict]):
+        self.status = FILLED
+        self.fills = fills
+        self.finished_at = time.time()
+        journal.append(self.id, FILLED, fills)
+
+    def fail(self, error: str):
+        self.status = FAILED
+        self.error = error
+        self.finished_at = time.time()
+        journal.append(self.id, FAILED, {"error": error})
+
+    @classmethod
+    def from_journal(cls, ticket_id: str, rows) -> "OrderTicket | None":
+        """저널 기록 (state, data, created_at) 으로 티켓 상태를 재구성, 접수 기록이 없으면 None"""
+        ticket = None
+        for state, data, created_at in rows:
+            data = orjson.loads(data) if data else None
+            if state == ACCEPTED:
+                ticket = cls(OrderContext.construct(**data), ticket_id)
+                ticket.accepted_at = created_at
+            elif ticket is None:
+                continue
+            elif state == EXECUTING:
+                ticket.status = EXECUTING
+                ticket.started_at = created_at
+            elif state == FILLED:
+                ticket.status = FILLED
+                ticket.fills = data or []
+                ticket.finished_at = created_at
+            elif state == FAILED:
+                ticket.status = FAILED
+                ticket.error = (data or {}).get("error")
+                ticket.finished_at = created_at
+        return ticket
+
+    @property
+    def is_done(self):
+        return self.status in (FILLED, FAILED)
+
+    def timings(self) -> dict:
+        def ms(start, end):
+            if start is None or end is None:
+                return None
+            return round((end - start) * 1000, 2)
+
+        return {
+            "accepted_at": self.accepted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_ms": ms(self.accepted_at, self.started_at),
+            "execution_ms": ms(self.started_at, self.finished_at),
+            "total_ms": ms(self.accepted_at, self.finished_at),
+        }
+
+    def dict(self) -> dict:
+        return {
+            "ticket": self.id,
+            "status": self.status,
+            "exchange": self.order.exchange,
+            "base": self.order.base,
+            "side": self.order.side,
+            "pair": self.order.pair,
+            "fills": self.fills,
+            "error": self.error,
+            "timings": self.timings(),
+        }
+
+
+class TicketBook:
+    """최근 티켓을 보관하는 메모리 저장소, 끝난 티켓은 오래된 것부터 밀려나고 그 뒤에는 저널에서 조회"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.maxlen = maxlen
+        self.tickets: OrderedDict[str, OrderTicket] = OrderedDict()
+
+    def create(self, order: OrderContext, ticket_id: str | None = None) -> OrderTicket:
+        """티켓 생성, 새 티켓이면 접수 기록을 저널에 남김 (재시작 복구 시에는 ticket_id 를 넘김)"""
+        ticket = OrderTicket(order, ticket_id)
+        if ticket_id is None:
+            ticket.journaled = journal.append(
+                ticket.id,
+                ACCEPTED,
+                order.dict(exclude={"password"}, exclude_none=True),
+            )
+        self.tickets[ticket.id] = ticket
+        self.evict()
+        return ticket
+
+    def evict(self):
+        """maxlen 을 넘으면 끝난 티켓을 오래된 것부터 제거 (진행 중인 티켓은 끝날 때까지 남김)"""
+        excess = len(self.tickets) - self.maxlen
+        if excess <= 0:
+            return
+        done = []
+        for ticket_id, ticket in self.tickets.items():
+            if ticket.is_done:
+                done.append(ticket_id)
+                if len(done) == excess:
+                    break
+        for ticket_id in done:
+            del self.tickets[ticket_id]
+
+    async def wait_journaled(self, ticket: OrderTicket):
+        """접수 기록이 커밋될 때까지 대기, 실행 전에 응답하는 경우 응답 뒤에 죽어도 재시작 시 복구되도록 함"""
+        if ticket.journaled is not None:
+            await asyncio.wrap_future(ticket.journaled)
+
+    def get(self, ticket_id: str) -> OrderTicket | None:
+        """이 워커의 티켓, 없으면 다른 워커가 접수했을 수 있으므로 저널에서 재구성"""
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None:
+            ticket = OrderTicket.from_journal(ticket_id, db.get_order_journal(ticket_id))
+        return ticket
+
+    async def wait_pair_turn(self, ticket: OrderTicket, timeout: float):
+        """같은 페어에서 먼저 접수된(저널의 행 순서) 주문이 모두 끝날 때까지 대기
+
+        워커가 여러 개면 매도와 뒤이은 매수가 서로 다른 워커로 들어갈 수 있으므로
+        저널의 접수 순서를 페어의 실행 순서로 사용합니다.
+        timeout 초보다 오래 전에 접수된 주문은 워커가 죽어 끝나지 않은 것으로 보고 기다리지 않습니다.
+        """
+        # 자신의 접수 기록이 커밋되어야 순서를 비교할 수 있음
+        await asyncio.to_thread(journal.flush)
+        delay = 0.05
+        while await asyncio.to_thread(
+            db.count_pending_pair_orders,
+            ticket.order.pair,
+            ticket.id,
+            time.time() - timeout,
+        ):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def restore(self, before: float) -> list[OrderTicket]:
+        """저널에서 before(서버 기동 시각) 이전에 접수되어 끝나지 않은 주문을 티켓으로 복구
+
+        접수만 된 주문은 다시 실행할 수 있도록 accepted 티켓으로 돌려주고,
+        실행 중에 끊긴 주문은 거래소에 이미 나갔을 수 있으므로 중복 주문을 막기 위해 실패 처리합니다.
+        기동 이후 다른 워커가 접수한 주문은 그 워커가 실행하므로 제외합니다.
+        """
+        pending = []
+        for ticket_id, state, data in db.get_unfinished_orders(before):
+            order = OrderContext.construct(**orjson.loads(data))
+            ticket = self.create(order, ticket_id)
+            if state == ACCEPTED:
+                pending.append(ticket)
+            else:
+                ticket.fail("실행 중 재시작되어 체결 여부를 확인할 수 없습니다")
+        return pending
+
+
+tickets = TicketBook()
@@ -1,2 +1,3 @@
 from exchange.utility.setting import settings
+from exchange.utility.auth import verify_signature, sign
 from exchange.utility.LogMaker import log_message, log_error_message, log_order_message, log_alert_message, print_alert_message, log_order_error_message, logger_test, log_validation_error_message, log_hedge_message
\ No newline at end of file
@@ -0,0 +1,48 @@
+import hashlib
+import hmac
+import time
+from fastapi import HTTPException, Request, status
+from exchange.utility.setting import settings
+
+SIGNATURE_HEADER = "X-POA-Signature"
+# 서명한 시각 (유닉스 초), 서명 대상에 포함되므로 바꿀 수 없음
+TIMESTAMP_HEADER = "X-POA-Timestamp"
+secret = settings.WEBHOOK_SECRET.encode() if settings.WEBHOOK_SECRET else None
+
+
+def sign(body: bytes, timestamp: str) -> str:
+    """"{timestamp}." + 본문의 HMAC-SHA256 서명"""
+    return "sha256=" + hmac.new(secret, timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+
+
+def is_fresh(timestamp: str) -> bool:
+    try:
+        signed_at = int(timestamp)
+    except ValueError:
+        return False
+    return abs(time.time() - signed_at) <= settings.WEBHOOK_SIGNATURE_WINDOW
+
+
+async def verify_signature(request: Request):
+    """WEBHOOK_SECRET 이 있으면 요청의 HMAC-SHA256 서명 헤더를 검증
+
+    서명 대상은 타임스탬프 헤더와 본문이며, 타임스탬프가 WEBHOOK_SIGNATURE_WINDOW 초보다 차이 나면
+    가로챈 요청을 다시 보내는 것(재전송)으로 보고 거부합니다.
+    서명 헤더를 보내는 요청만 검증하고, WEBHOOK_SIGNATURE_REQUIRED 이면 헤더가 없는 요청도 거부합니다.
+    (트레이딩뷰처럼 서명할 수 없는 곳은 기존처럼 password 로 인증)
+    """
+    if secret is None:
+        return
+    signature = request.headers.get(SIGNATURE_HEADER)
+    if signature is None and not settings.WEBHOOK_SIGNATURE_REQUIRED:
+        return
+    timestamp = request.headers.get(TIMESTAMP_HEADER)
+    if (
+        signature is None
+        or timestamp is None
+        or not is_fresh(timestamp)
+        or not hmac.compare_digest(signature.encode(), sign(await request.body(), timestamp).encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="서명이 올바르지 않습니다"
+        )
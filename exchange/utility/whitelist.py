@@ -0,0 +1,54 @@
+import ipaddress
+from functools import lru_cache
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+
+# 트레이딩뷰 웹훅 발신 IP
+TRADINGVIEW_IPS = [
+    "52.89.214.238",
+    "34.212.75.30",
+    "54.218.53.128",
+    "52.32.178.7",
+]
+
+
+class IPWhitelist:
+    """IP/CIDR 화이트리스트
+
+    항목은 Settings 에서 검증된 값이며 시작할 때 한 번만 네트워크로 파싱해 두고,
+    같은 IP 는 반복해서 들어오므로 허용 여부를 LRU 캐시에 저장합니다.
+    사설 IP 는 항상 허용합니다.
+    """
+
+    def __init__(self, entries: list[str], cache_size: int = 1024):
+        self.networks = [ipaddress.ip_network(entry.strip(), strict=False) for entry in entries]
+        self.is_allowed = lru_cache(maxsize=cache_size)(self._is_allowed)
+
+    def _is_allowed(self, host: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if ip.is_private:
+            return True
+        return any(ip in network for network in self.networks if network.version == ip.version)
+
+
+class WhitelistMiddleware:
+    """허용되지 않은 IP 는 요청 본문을 읽기 전에 403 으로 거부하는 ASGI 미들웨어"""
+
+    def __init__(self, app, whitelist: IPWhitelist):
+        self.app = app
+        self.whitelist = whitelist
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            host = scope["client"][0] if scope.get("client") else ""
+            if not self.whitelist.is_allowed(host):
+                print(f"{host}는 안됩니다")
+                response = ORJSONResponse(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    content={"detail": f"{host}는 허용되지 않습니다"},
+                )
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -1,70 +1,247 @@
-# from toolbox import Client
-
-from client import Client
-import websocket
-import _thread
+import asyncio
 import time
-import rel
-import json
-from pprint import pprint
-
+import orjson
+import websockets
+from loguru import logger
+from exchange.account_config import account_configs
+
+STREAM_URL = "wss://fstream.binance.com/ws/"
+# 리슨 키는 60분 뒤 만료되므로 30분마다 연장
+KEEPALIVE_INTERVAL = 30 * 60
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+# 이보다 오래 연결돼 있었으면 끊겼을 때 바로 다시 연결
+STABLE_CONNECTION = 60.0
+# 마크 가격이 움직이면 이벤트 없이도 미실현 손익(증거금)이 바뀌므로 잔고는 이 시간(초)만 재사용
+BALANCE_TTL = 3.0
+
+
+class AccountBook:
+    """유저 데이터 스트림으로 유지하는 바이낸스 USDⓈ-M 선물 계정 상태
+
+    포지션과 미체결 주문은 스트림 이벤트로 갱신하고, 잔고는 REST 로 받은 값을 계정에 변화가 생기거나
+    BALANCE_TTL 이 지날 때까지만 재사용합니다.
+    연결이 끊겨 있으면(ready=False) 모든 조회가 None 을 반환하므로 호출하는 쪽은 REST 로 조회합니다.
+    """
 
-class Websocket:
+    def __init__(self):
+        # (심볼 ID, positionSide) -> {"amount", "entry_price", "updated"}
+        self.positions: dict[tuple[str, str], dict] = {}
+        # 자산 -> {"wallet", "cross"}
+        self.balances: dict[str, dict] = {}
+        # 주문 ID -> 미체결 주문
+        self.orders: dict[int, dict] = {}
+        # "free"/"total" -> (저장 시각, fetch_free_balance / fetch_total_balance 결과)
+        self.balance_cache: dict[str, tuple[float, dict]] = {}
+        self.version = 0
+        self.ready = False
+        self.updated_at: float | None = None
+
+    def load(self, risks: list[dict], orders: list[dict]):
+        """연결 직후 REST 스냅샷으로 포지션과 미체결 주문을 채움"""
+        self.positions = {}
+        for risk in risks:
+            amount = float(risk["positionAmt"])
+            if amount != 0:
+                self.positions[(risk["symbol"], risk["positionSide"])] = {
+                    "amount": amount,
+                    "entry_price": float(risk["entryPrice"]),
+                    "updated": int(risk.get("updateTime") or 0),
+                }
+        self.orders = {
+            int(order["orderId"]): {
+                "symbol": order["symbol"],
+                "side": order["side"],
+                "type": order["type"],
+                "status": order["status"],
+                "position_side": order.get("positionSide"),
+                "amount": float(order["origQty"]),
+                "filled": float(order["executedQty"]),
+                "stop_price": float(order.get("stopPrice") or 0),
+                "client_order_id": order.get("clientOrderId"),
+            }
+            for order in orders
+        }
+        self.invalidate_balances()
+
+    def invalidate_balances(self):
+        self.version += 1
+        self.balance_cache.clear()
+
+    def apply(self, event: dict):
+        kind = event.get("e")
+        if kind == "ACCOUNT_UPDATE":
+            transaction_time = int(event.get("T") or 0)
+            data = event.get("a", {})
+            for balance in data.get("B", []):
+                self.balances[balance["a"]] = {
+                    "wallet": float(balance["wb"]),
+                    "cross": float(balance["cw"]),
+                }
+            for position in data.get("P", []):
+                key = (position["s"], position["ps"])
+                current = self.positions.get(key)
+                # 스냅샷보다 먼저 일어난 변경은 무시
+                if current is not None and transaction_time < current["updated"]:
+                    continue
+                amount = float(position["pa"])
+                if amount == 0:
+                    self.positions.pop(key, None)
+                else:
+                    self.positions[key] = {
+                        "amount": amount,
+                        "entry_price": float(position["ep"]),
+                        "updated": transaction_time,
+                    }
+            self.invalidate_balances()
+        elif kind == "ORDER_TRADE_UPDATE":
+            order = event["o"]
+            if order["X"] in ("NEW", "PARTIALLY_FILLED"):
+                self.orders[int(order["i"])] = {
+                    "symbol": order["s"],
+                    "side": order["S"],
+                    "type": order["ot"],
+                    "status": order["X"],
+                    "position_side": order.get("ps"),
+                    "amount": float(order["q"]),
+                    "filled": float(order["z"]),
+                    "stop_price": float(order.get("sp") or 0),
+                    "client_order_id": order.get("c"),
+                }
+            else:
+                self.orders.pop(int(order["i"]), None)
+            self.invalidate_balances()
+        elif kind == "ACCOUNT_CONFIG_UPDATE":
+            # 레버리지가 바뀌면(웹/앱에서 직접 바꾼 경우 포함) 캐시도 그 값으로 맞춤
+            config = event.get("ac")
+            if config is not None:
+                account_configs.set("BINANCE", config["s"], "leverage", int(config["l"]))
+        else:
+            return
+        self.updated_at = time.time()
+
+    def get_positions(self, symbol_id: str) -> list[dict] | None:
+        """심볼의 포지션을 ccxt fetch_positions 와 같은 side/contracts 형태로 반환"""
+        if not self.ready:
+            return None
+        positions = []
+        for (symbol, position_side), position in self.positions.items():
+            if symbol != symbol_id:
+                continue
+            amount = position["amount"]
+            if position_side == "BOTH":
+                side = "long" if amount > 0 else "short"
+            else:
+                side = position_side.lower()
+            positions.append({"symbol": symbol, "side": side, "contracts": abs(amount)})
+        return positions
+
+    def get_open_orders(self, symbol_id: str | None = None) -> list[dict] | None:
+        if not self.ready:
+            return None
+        return [
+            order
+            for order in self.orders.values()
+            if symbol_id is None or order["symbol"] == symbol_id
+        ]
+
+    def get_balance(self, kind: str) -> dict | None:
+        if not self.ready:
+            return None
+        cached = self.balance_cache.get(kind)
+        if cached is None or time.monotonic() - cached[0] >= BALANCE_TTL:
+            return None
+        return cached[1]
+
+    def set_balance(self, kind: str, balance: dict, version: int):
+        # 조회 중에 계정 이벤트가 들어왔으면 이미 지난 잔고이므로 저장하지 않음
+        if self.ready and version == self.version:
+            self.balance_cache[kind] = (time.monotonic(), balance)
+
+
+class BinanceUserStream:
+    """바이낸스 선물 유저 데이터 스트림 (리슨 키 연장, 끊기면 다시 연결하고 스냅샷부터 다시 받음)"""
 
     def __init__(self):
-        self.client = Client()
-        self.binance = self.client.get_binance()
-        self.listen_key = self.binance.get_listen_key()
-        self.ws_url = f"wss://fstream.binance.com/ws/{self.listen_key}"
-
-    def on_message(self, ws, message):
-
-        datas: dict = json.loads(message)
-        event = datas.get("e")
-        event_time = datas.get("E")
-        transaction_time = datas.get("T")
-        cross_wallt_balance = datas.get("cw")
-        order = datas.get("o")
-
-        if event == "listenKeyExpired":
-            print("Listen key expired")
-            self.listen_key = self.binance.get_listen_key()
-        elif event == "ORDER_TRADE_UPDATE":
-            order_type = order.get("ot")  # TAKE_PROFIT_MARKET, STOP_MARKET
-            order_status = order.get("X")  # 새로운 주문은 NEW
-            if order_type in ("TAKE_PROFIT_MARKET", "STOP_MARKET"):
-                order_id = order.get("i")  # 주문 ID
-                client_order_id = order.get("c")  # 주문 고유 ID
-                order_symbol = order.get("s")  # 주문 심볼
-                order_price = order.get("sp")  # 스탑 가격
-                order_side = order.get("S")  # 주문 종류
-                order_qty = order.get("q")  # 주문 수량
-
-                print(f"{order_symbol=}, {order_price=}, {order_type=}, {order_status=}, {order_id=}, {client_order_id=}")
-
-            print("=====끝=====")
-
-    def on_error(self, ws, error):
-        print(error)
-
-    def on_close(self, ws, close_status_code, close_msg):
-        print("### closed ###")
-
-    def on_open(self, ws):
-        print("Opened connection")
-
-    def start(self):
-        ws = websocket.WebSocketApp(self.ws_url,
-                                    on_open=self.on_open,
-                                    on_message=self.on_message,
-                                    on_error=self.on_error,
-                                    on_close=self.on_close)
-
-        ws.run_forever(dispatcher=rel, reconnect=5)  # Set dispatcher to automatic reconnection, 5 second reconnect delay if connection closed unexpectedly
-        rel.signal(2, rel.abort)  # Keyboard Interrupt
-        rel.dispatch()
-
-
-if __name__ == "__main__":
-    ws = Websocket()
-    ws.start()
+        self.book = AccountBook()
+        self.client = None
+        self.listen_key: str | None = None
+        self.connects = 0
+        self.last_error: str | None = None
+
+    async def create_listen_key(self) -> str:
+        return (await self.client.fapiPrivatePostListenKey())["listenKey"]
+
+    async def keepalive(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await self.client.fapiPrivatePutListenKey()
+            except Exception as e:
+                # 만료되면 listenKeyExpired 이벤트를 받고 새 키로 다시 연결
+                logger.warning(f"바이낸스 리슨 키 연장 실패: {e}")
+
+    async def load_snapshot(self):
+        risks, orders = await asyncio.gather(
+            self.client.fapiPrivateV2GetPositionRisk(),
+            self.client.fapiPrivateGetOpenOrders(),
+        )
+        self.book.load(risks, orders)
+
+    async def connect(self):
+        self.listen_key = await self.create_listen_key()
+        async with websockets.connect(STREAM_URL + self.listen_key) as websocket:
+            # 연결한 뒤에 스냅샷을 받아야 그 사이의 변경을 놓치지 않음
+            await self.load_snapshot()
+            self.book.ready = True
+            self.connects += 1
+            logger.info("바이낸스 유저 데이터 스트림 연결")
+            async for message in websocket:
+                event = orjson.loads(message)
+                if event.get("e") == "listenKeyExpired":
+                    logger.warning("바이낸스 리슨 키 만료, 다시 연결합니다")
+                    return
+                self.book.apply(event)
+
+    async def run(self, get_client):
+        """get_client() 가 돌려주는 ccxt.async_support.binance 로 스트림을 유지, 취소될 때까지 실행
+
+        클라이언트 생성이 실패해도 끊겼을 때와 같이 기다렸다가 다시 시도합니다.
+        """
+        keepalive = None
+        delay = RECONNECT_MIN
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    if self.client is None:
+                        self.client = await get_client()
+                        keepalive = asyncio.create_task(self.keepalive())
+                    await self.connect()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning(f"바이낸스 유저 데이터 스트림 끊김: {e}")
+                finally:
+                    self.book.ready = False
+                if time.monotonic() - started > STABLE_CONNECTION:
+                    delay = RECONNECT_MIN
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+        finally:
+            if keepalive is not None:
+                keepalive.cancel()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.book.ready,
+            "connects": self.connects,
+            "positions": len(self.book.positions),
+            "open_orders": len(self.book.orders),
+            "updated_at": self.book.updated_at,
+            "last_error": self.last_error,
+        }
+
+
+binance_stream = BinanceUserStream()
@@ -1,15 +1,16 @@
-from collections import deque
 from fastapi.exception_handlers import request_validation_exception_handler
 from pprint import pprint
-from fastapi import FastAPI, Request, status, BackgroundTasks
+from fastapi import FastAPI, Request, status, BackgroundTasks, HTTPException, Depends
 from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
 import httpx
-from exchange.stock.kis import KoreaInvestment
+from exchange.stock.kis import AsyncKoreaInvestment
 from exchange.pocket import delete_old_records
-from exchange.model import MarketOrder, PriceRequest, HedgeData, OrderRequest
+from exchange.model import MarketOrder, PriceRequest, HedgeData, OrderRequest, OrderContext, parse_order
 from exchange.utility import (
     settings,
+    verify_signature,
     log_order_message,
     log_alert_message,
     print_alert_message,
@@ -22,8 +23,19 @@ from exchange.utility import (
 )
 import traceback
 import time
-from exchange import get_exchange, log_message, db, settings, get_bot, pocket
-import ipaddress
+import asyncio
+from loguru import logger
+from exchange import log_message, db, settings, pocket
+from exchange.pexchange import get_async_bot, close_async_bots, warm_up, fetch_prices, get_exchange_clients
+from exchange.scheduler import PairScheduler, WorkerPool
+from exchange.ticket import OrderTicket, tickets, get_replay_lease
+from exchange.database import journal
+from exchange.lease import Lease
+from exchange.utility.whitelist import IPWhitelist, WhitelistMiddleware, TRADINGVIEW_IPS
+from exchange.utility.ws import binance_stream
+from exchange.retry import retry_stats
+from exchange.clock import clock_sync
+from exchange.error import MailboxFullError
 import os
 import sys
 from devtools import debug
@@ -31,12 +43,15 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime  # datetime 모듈 추가
 
 VERSION = "1.1.6"
+# 워커가 여러 개면 run.py 가 기동 시각을 넘겨줌, 이 시각 이전에 접수된 주문만 복구 대상
+BOOT_TIME = float(os.environ.get("POA_BOOT_TIME", time.time()))
+# 체결 조회가 안 될 때 매도 후 잔고를 다시 조회하는 횟수와 간격(초)
+SELL_BALANCE_CHECKS = 5
+SELL_BALANCE_CHECK_INTERVAL = 0.5
+# 미완료 주문 복구와 정리 작업은 워커 중 하나만 수행
+replay_lease = get_replay_lease(BOOT_TIME)
 app = FastAPI(default_response_class=ORJSONResponse)
 
-# 글로벌 딕셔너리 및 큐 추가 (페어 진행 상태 및 큐 관리)
-ongoing_pairs = {}
-order_queues = {}
-
 def get_error(e):
     tb = traceback.extract_tb(e.__traceback__)
     target_folder = os.path.abspath(os.path.dirname(tb[0].filename))  
@@ -53,47 +68,56 @@ def get_error(e):
     return error_msg
 
 
+def delete_old_records_once():
+    # 워커마다 스케줄러가 돌므로 lease 를 먼저 얻은 워커만 실행 (1시간 동안 보유)
+    if Lease("delete_old_records", ttl=3600).acquire():
+        deleted = db.delete_finished_orders(time.time() - settings.ORDER_JOURNAL_RETENTION)
+        print(f"주문 저널 {deleted}건 정리")
+        delete_old_records()
+
+
 @app.on_event("startup")
 async def startup():
     log_message(f"POABOT 실행 완료! - 버전:{VERSION}")
     
     # APScheduler 스케줄러 시작
     scheduler = BackgroundScheduler()
-    scheduler.add_job(delete_old_records, 'cron', hour=7, minute=47)  # 매일 오전 7시 47분에 실행
+    scheduler.add_job(delete_old_records_once, 'cron', hour=7, minute=47)  # 매일 오전 7시 47분에 실행
     scheduler.start()
     print("Scheduler started")
+    order_pool.start()
+    # 거래소 봇/KIS 세션 웜업은 백그라운드로 진행 (/ready 로 완료 여부 확인)
+    job = asyncio.create_task(warm_up.run())
+    background_jobs.add(job)
+    job.add_done_callback(background_jobs.discard)
+    if settings.BINANCE_KEY and settings.BINANCE_SECRET and settings.BINANCE_USER_STREAM:
+        stream_jobs.add(asyncio.create_task(run_binance_stream()))
+    stream_jobs.add(asyncio.create_task(run_clock_sync()))
+
+    # 저널에 남은 미완료 주문 복구
+    restored = tickets.restore(BOOT_TIME) if await replay_lease.hold() else []
+    for ticket in restored:
+        if ticket.order.pair and ticket.order.pair_id:
+            pair_scheduler.submit(ticket.order.pair, ticket)
+        else:
+            order_pool.submit(ticket)
+    if restored:
+        log_message(f"미완료 주문 {len(restored)}건을 다시 실행합니다")
 
 @app.on_event("shutdown")
 async def shutdown():
+    for job in stream_jobs:
+        job.cancel()
+    await pair_scheduler.close()
+    await replay_lease.arelease()
+    await order_pool.close()
+    await close_async_bots()
+    journal.flush(timeout=3)
     db.close()
 
-whitelist = [
-    "52.89.214.238",
-    "34.212.75.30",
-    "54.218.53.128",
-    "52.32.178.7",
-    "127.0.0.1",
-]
-whitelist = whitelist + settings.WHITELIST
-
-@app.middleware("http")
-async def whitelist_middleware(request: Request, call_next):
-    try:
-        if (
-            request.client.host not in whitelist
-            and not ipaddress.ip_address(request.client.host).is_private
-        ):
-            msg = f"{request.client.host}는 안됩니다"
-            print(msg)
-            return ORJSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"detail": f"{request.client.host}는 허용되지 않습니다"},
-            )
-    except Exception as e:
-        log_error_message(traceback.format_exc(), "미들웨어 에러")
-    else:
-        response = await call_next(request)
-        return response
+# 트레이딩뷰 IP + 설정의 WHITELIST (IP 또는 CIDR, 예: 10.20.0.0/16)
+whitelist = IPWhitelist(TRADINGVIEW_IPS + ["127.0.0.1"] + (settings.WHITELIST or []))
+app.add_middleware(WhitelistMiddleware, whitelist=whitelist)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -122,13 +146,34 @@ async def get_ip():
 async def welcome():
     return "hi!!"
 
+@app.get("/stream")
+async def stream_status():
+    return {"binance": binance_stream.status()}
+
+@app.get("/retries")
+async def retries():
+    return retry_stats.snapshot()
+
+@app.get("/clock")
+async def clock():
+    return clock_sync.status()
+
+@app.get("/ready")
+async def ready():
+    # 웜업이 끝나기 전에는 503 (로드밸런서/헬스체크용)
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK if warm_up.done else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=warm_up.status(),
+    )
+
 @app.post("/price")
 async def price(price_req: PriceRequest, background_tasks: BackgroundTasks):
     try:
-        exchange = get_exchange(price_req.exchange)
-        price = exchange.dict()[price_req.exchange].fetch_price(
-            price_req.base, price_req.quote
-        )
+        bot = await get_async_bot(price_req.exchange, price_req.kis_number)
+        if price_req.is_crypto:
+            price = await bot.get_price(price_req.unified_symbol)
+        else:
+            price = await bot.fetch_current_price(price_req.exchange, price_req.base)
         log_message(f"가격 조회: {price_req.base}/{price_req.quote} = {price}")
         return {"price": price}
     except Exception as e:
@@ -136,6 +181,44 @@ async def price(price_req: PriceRequest, background_tasks: BackgroundTasks):
         log_error_message("\n".join(error_msg), {})
         return {"error": "가격 조회 중 오류가 발생했습니다."}
 
+def get_price_symbol(price_req: PriceRequest) -> str:
+    return price_req.unified_symbol if price_req.is_crypto else price_req.base
+
+
+@app.post("/prices")
+async def prices(price_reqs: list[PriceRequest]):
+    """여러 종목 현재가, 거래소(주식은 계좌)별로 묶어서 동시에 조회하고 요청 순서대로 반환"""
+    groups: dict[tuple[str, int | None], list[str]] = {}
+    for price_req in price_reqs:
+        key = (price_req.exchange, price_req.kis_number if price_req.is_stock else None)
+        groups.setdefault(key, []).append(get_price_symbol(price_req))
+
+    results = await asyncio.gather(
+        *(
+            fetch_prices(exchange_name, symbols, kis_number)
+            for (exchange_name, kis_number), symbols in groups.items()
+        ),
+        return_exceptions=True,
+    )
+    group_prices = dict(zip(groups, results))
+    for result in results:
+        if isinstance(result, Exception):
+            log_error_message("\n".join(get_error(result)), {})
+
+    response = []
+    for price_req in price_reqs:
+        result = group_prices[
+            (price_req.exchange, price_req.kis_number if price_req.is_stock else None)
+        ]
+        item = {"exchange": price_req.exchange, "base": price_req.base, "quote": price_req.quote}
+        if isinstance(result, BaseException):
+            item["error"] = "가격 조회 중 오류가 발생했습니다."
+        else:
+            item["price"] = result.get(get_price_symbol(price_req))
+        response.append(item)
+    return {"prices": response}
+
+
 def log(exchange_name, result, order_info):
     log_order_message(exchange_name, result, order_info)
     print_alert_message(order_info)
@@ -144,64 +227,104 @@ def log_error(error_message, order_info):
     log_order_error_message(error_message, order_info)
     log_alert_message(order_info, "실패")
 
-# 동기적으로 변경된 페어트레이드 매도 로직
-def wait_for_pair_sell_completion(
+
+background_jobs = set()
+# 종료할 때까지 계속 도는 스트림 작업
+stream_jobs = set()
+
+
+async def run_binance_stream():
+    """바이낸스 선물 잔고/포지션/미체결 주문을 메모리에 유지 (퍼센트 주문 수량 계산에 사용)"""
+
+    async def get_client():
+        return (await get_async_bot("BINANCE")).client
+
+    await binance_stream.run(get_client)
+
+
+async def run_clock_sync():
+    """거래소 서버 시각과의 차이를 주기적으로 맞춤 (웜업으로 클라이언트가 만들어진 뒤 시작)"""
+    while not warm_up.done:
+        await asyncio.sleep(1)
+    await clock_sync.run(get_exchange_clients)
+
+
+def notify(func, *args):
+    """디스코드 알림 같은 느린 작업이 응답이나 다음 주문을 막지 않도록 스레드풀로 보냄"""
+    job = asyncio.create_task(run_in_threadpool(func, *args))
+    background_jobs.add(job)
+    job.add_done_callback(background_jobs.discard)
+
+async def sell_and_confirm(
     exchange_name: str,
-    order_info: MarketOrder,
+    exchange_instance: AsyncKoreaInvestment,
+    ticker: str,
+    amount: int,
+    holding_price: float,
+):
+    """시장가 매도 후 체결 조회로 실제 체결 수량과 금액을 확인
+
+    주문번호로 체결을 확인할 수 없으면 잔고로 남은 수량을 확인하고 잔고 가격으로 금액을 계산합니다.
+    잔고 조회가 실패하면 체결 여부를 알 수 없으므로 예외를 발생시킵니다.
+    """
+    sell_result = await exchange_instance.create_order(
+        exchange=exchange_name,
+        ticker=ticker,
+        order_type="market",
+        side="sell",
+        amount=amount,
+    )
+    fill = await exchange_instance.wait_for_fill(
+        exchange_name, ticker, exchange_instance.get_order_number(sell_result)
+    )
+    if fill is not None:
+        return sell_result, fill["filled"], fill["value"]
+
+    # 잔고 반영이 늦을 수 있으므로 전량 체결이 보일 때까지 몇 번 다시 조회
+    for check in range(SELL_BALANCE_CHECKS):
+        if check:
+            await asyncio.sleep(SELL_BALANCE_CHECK_INTERVAL)
+        exchange_instance.invalidate_holdings()
+        try:
+            holdings = await exchange_instance.fetch_holdings(exchange_name)
+        except Exception as e:
+            # 조회 실패를 잔고 0(전량 체결)으로 보면 안 되므로 미확인으로 처리
+            raise Exception(f"매도 체결 확인 실패 - 잔고 조회 오류: {e}") from e
+        left_qty, price = holdings.get(ticker, (0, 0.0))
+        filled = max(amount - left_qty, 0)
+        if filled >= amount:
+            break
+    return sell_result, filled, filled * (price or holding_price)
+
+
+# 페어트레이드 매도 로직
+async def wait_for_pair_sell_completion(
+    exchange_name: str,
+    order_info: OrderContext,
     kis_number: int,
-    exchange_instance: KoreaInvestment,
+    exchange_instance: AsyncKoreaInvestment,
     initial_holding_qty: int,  
     holding_price: float  
 ):
     try:
         pair = order_info.pair
-        print(f"DEBUG: wait_for_pair_sell_completion 시작 - 페어: {pair}, 초기 잔고 수량: {initial_holding_qty}, 초기 가격: {holding_price}")
-        
-        total_sell_amount = 0.0
-        total_sell_value = 0.0  
+        logger.debug(f"wait_for_pair_sell_completion 시작 - 페어: {pair}, 초기 잔고 수량: {initial_holding_qty}, 초기 가격: {holding_price}")
+
+        total_sell_amount = 0
+        total_sell_value = 0.0
 
-        # 초기 잔고 수량에 대해 시장가 매도 수행
+        # 보유 수량 전체를 시장가 매도하고 체결이 확인되는 즉시 반환
         if initial_holding_qty > 0:
-            print(f"DEBUG: 초기 잔고 수량 {initial_holding_qty}, 매도 작업 시작")
-            time.sleep(0.5)
-            sell_result = exchange_instance.create_order(
-                exchange=exchange_name,
-                ticker=pair,
-                order_type="market",
-                side="sell",
-                amount=initial_holding_qty,
-            )
-            print(f"DEBUG: 초기 매도 주문 완료, 매도 결과: {sell_result}")
-            total_sell_amount += initial_holding_qty
-            total_sell_value += initial_holding_qty * holding_price
-
-        # 최대 10회 시도 (4초 간격으로 잔고 확인)
-        for attempt in range(10):
-            time.sleep(4)
-            holding_qty, holding_price = exchange_instance.fetch_balance_and_price(exchange_name, pair)
-
-            # 잔고가 0이면 매도 완료
-            if holding_qty <= 0:
-                print(f"DEBUG: 남은 잔고가 없어 매도 작업 종료")
-                break
-
-            print(f"DEBUG: 시도 {attempt + 1}: 남은 잔고 {holding_qty}, 추가 매도 작업")
-            time.sleep(0.5)
-            sell_result = exchange_instance.create_order(
-                exchange=exchange_name,
-                ticker=pair,
-                order_type="market",
-                side="sell",
-                amount=holding_qty,
+            _, total_sell_amount, total_sell_value = await sell_and_confirm(
+                exchange_name, exchange_instance, pair, initial_holding_qty, holding_price
             )
-            print(f"DEBUG: 추가 매도 주문 완료, 매도 결과: {sell_result}")
-            total_sell_amount += holding_qty
-            total_sell_value += holding_qty * holding_price
 
-        if holding_qty > 0:
-            raise Exception(f"12회 시도 후 잔고 남음: {holding_qty}")
+        if total_sell_amount < initial_holding_qty:
+            raise Exception(
+                f"매도 미체결 수량 남음: {initial_holding_qty - total_sell_amount}"
+            )
 
-        print(f"DEBUG: 매도 작업 완료, 총 매도량: {total_sell_amount}, 총 매도 금액: {total_sell_value}")
+        logger.debug(f"매도 작업 완료, 총 매도량: {total_sell_amount}, 총 매도 금액: {total_sell_value}")
         if total_sell_amount > 0:
             record_data = {
                 "pair_id": order_info.pair_id,
@@ -212,179 +335,218 @@ def wait_for_pair_sell_completion(
                 "timestamp": datetime.now().isoformat(),
                 "trade_type": "sell"
             }
-            print(f"DEBUG: PocketBase 기록할 데이터 - {record_data}")
-            response = pocket.create("pair_order_history", record_data)
-            print(f"DEBUG: PocketBase 기록 완료 - {response}")
+            logger.debug(f"PocketBase 기록할 데이터 - {record_data}")
+            # 기록은 매수를 기다리게 하지 않도록 백그라운드에서
+            notify(pocket.create, "pair_order_history", record_data)
         return {"status": "success", "total_sell_amount": total_sell_amount, "total_sell_value": total_sell_value}
 
     except Exception as e:
         error_msg = get_error(e)
-        print(f"DEBUG: 매도 작업 중 예외 발생 - {error_msg}")
-        log_error("\n".join(error_msg), order_info)
+        logger.debug(f"매도 작업 중 예외 발생 - {error_msg}")
+        notify(log_error, "\n".join(error_msg), order_info)
         return {"status": "error", "error_msg": str(e)}
-    finally:
-        ongoing_pairs.pop(pair, None)
 
-@app.post("/order")
-@app.post("/")
-async def order(order_info: MarketOrder, background_tasks: BackgroundTasks):
-    exchange_name = order_info.exchange
-    pair = order_info.pair
-    pair_id = order_info.pair_id
-    bot = get_bot(exchange_name, order_info.kis_number)
-    bot.init_info(order_info)
 
-    print(f"DEBUG: 주문 시작 - exchange_name: {exchange_name}, order_info: {order_info}")
+async def execute_pair_order(current_order: OrderContext) -> list[dict]:
+    """페어트레이드 주문 한 건을 실행하고 체결 내역을 반환"""
+    exchange_name = current_order.exchange
+    pair = current_order.pair
+    pair_id = current_order.pair_id
+    fills = []
+    logger.debug(f"{pair} 주문 처리 - {current_order.side}")
 
-    try:
-        # 페어와 pair_id가 있는 경우에만 큐 방식 적용
-        if pair and pair_id:
-            if pair not in order_queues:
-                order_queues[pair] = deque()
-
-            # 현재 진행 중인 주문이 있으면 큐에 추가하고 리턴
-            if pair in ongoing_pairs:
-                print(f"DEBUG: {pair}에 대한 주문이 진행 중입니다. 큐에 추가됩니다.")
-                order_queues[pair].append(order_info)
-                return {"status": "queued", "message": f"{pair} 주문이 큐에 추가되었습니다."}
-
-            # 새 주문 진행 중 상태 설정
-            ongoing_pairs[pair] = True
-            order_queues[pair].append(order_info)
-            print(f"DEBUG: {pair} 주문이 큐에 추가되었습니다. 처리 시작.")
+    bot = await get_async_bot(exchange_name, current_order.kis_number)
+    bot.init_info(current_order)
 
-            try:
-                # 큐에 쌓인 주문 처리
-                while order_queues[pair]:
-                    current_order = order_queues[pair].popleft()
-                    print(f"DEBUG: {pair} 주문 처리 - {current_order.side}")
-
-                    if current_order.side == "buy":
-                        # 보유 수량 확인 및 매도 완료 후 매수 진행
-                        holding_qty, holding_price = bot.fetch_balance_and_price(exchange_name, pair)
-                        if holding_qty > 0:
-                            print(f"DEBUG: {pair} 매도 처리 시작 - 보유 수량: {holding_qty}")
-                            wait_for_pair_sell_completion(exchange_name, current_order, current_order.kis_number, bot, holding_qty, holding_price)
-                        print(f"DEBUG: {pair} 매도 완료, 매수 주문 진행 중")
-
-                        # PocketBase에서 마지막 매도 기록 조회
-                        print(f"DEBUG: PocketBase에서 조회할 쿼리 - pair_id: {pair_id}, trade_type: 'sell'")
-                        records = pocket.get_full_list(
-                            "pair_order_history",
-                            query_params = {
-                                "filter": f'pair_id = "{pair_id}" && trade_type = "sell"',
-                                "sort": "-timestamp",
-                                "limit": 1
-                            }
-                        )
-
-                        print(f"DEBUG: PocketBase에서 조회한 기록 - {records}")
-
-                        if records:
-                            last_sell_record = records[0]
-                            total_sell_value = last_sell_record.value
-                            print(f"DEBUG: 마지막 매도 기록 찾음 - value: {total_sell_value}")
-
-                            # 주문 수량 계산
-                            adjusted_value = total_sell_value * 0.995  # 수수료 고려한 값
-                            price = order_info.price  # 웹훅 메시지에 포함된 가격 사용
-                            buy_amount = int(adjusted_value // price)  # 정수 나눗셈, 나머지 버림
-
-                            print(f"DEBUG: 계산된 매수 수량 - buy_amount: {buy_amount}")
-
-                            if buy_amount > 0:
-                                # 매수 주문 진행
-                                time.sleep(0.5)
-                                buy_result = bot.create_order(
-                                    bot.order_info.exchange,
-                                    bot.order_info.base,
-                                    "market",
-                                    "buy",
-                                    buy_amount,
-                                )
-                                print(f"DEBUG: 매수 주문 결과 - {buy_result}")
-                                background_tasks.add_task(log, exchange_name, buy_result, current_order)
-                            else:
-                                msg = "계산된 매수 수량이 0입니다."
-                                print(f"DEBUG: {msg}")
-                                background_tasks.add_task(log_error, msg, current_order)
-                        else:
-                            # 동일한 pair_id를 가진 데이터가 없으므로 웹훅의 amount로 주문
-                            print(f"DEBUG: 동일한 pair_id의 매도 기록이 없음, 웹훅의 amount로 주문 진행")
-
-                            time.sleep(0.5)
-                            buy_result = bot.create_order(
-                                bot.order_info.exchange,
-                                bot.order_info.base,
-                                "market",
-                                "buy",
-                                int(current_order.amount),  # 수량은 정수여야 함
-                            )
-                            print(f"DEBUG: 매수 주문 결과 - {buy_result}")
-                            background_tasks.add_task(log, exchange_name, buy_result, current_order)
-
-                    elif current_order.side == "sell":
-                        # 매도 주문 처리
-                        holding_qty, holding_price = bot.fetch_balance_and_price(exchange_name, current_order.base)
-                        if holding_qty > 0:
-                            print(f"DEBUG: {pair} 매도 진행 중 - 수량: {holding_qty}")
-                            time.sleep(0.5)
-                            sell_result = bot.create_order(
-                                bot.order_info.exchange,
-                                bot.order_info.base,
-                                "market",
-                                "sell",
-                                holding_qty,
-                            )
-                            print(f"DEBUG: 매도 주문 결과 - {sell_result}")
-                            sell_amount = holding_qty
-                            sell_value = sell_amount * holding_price
-                            record_data = {
-                                "pair_id": current_order.pair_id,
-                                "amount": sell_amount,
-                                "value": sell_value,
-                                "ticker": current_order.base,
-                                "exchange": exchange_name,
-                                "timestamp": datetime.now().isoformat(),
-                                "trade_type": "sell"
-                            }
-                            pocket.create("pair_order_history", record_data)
-                            print(f"DEBUG: PocketBase 기록 완료 - 티커: {current_order.base}, 매도량: {sell_amount}")
-                            background_tasks.add_task(log, exchange_name, sell_result, current_order)
-                        else:
-                            msg = "잔고가 존재하지 않습니다"
-                            print(f"DEBUG: {msg}")
-                            background_tasks.add_task(log_error, msg, current_order)
+    if current_order.side == "buy":
+        # 보유 수량 확인 및 매도 완료 후 매수 진행
+        holding_qty, holding_price = await bot.fetch_balance_and_price(
+            exchange_name, pair
+        )
+        sell_summary = {}
+        if holding_qty > 0:
+            logger.debug(f"{pair} 매도 처리 시작 - 보유 수량: {holding_qty}")
+            sell_summary = await wait_for_pair_sell_completion(exchange_name, current_order, current_order.kis_number, bot, holding_qty, holding_price)
+            fills.append({"side": "sell", "ticker": pair} | sell_summary)
+        logger.debug(f"{pair} 매도 완료, 매수 주문 진행 중")
+
+        if sell_summary.get("status") == "success" and sell_summary["total_sell_value"] > 0:
+            # 방금 체결된 매도 금액을 바로 사용
+            total_sell_value = sell_summary["total_sell_value"]
+            logger.debug(f"체결된 매도 금액 사용 - value: {total_sell_value}")
+        else:
+            # PocketBase에서 마지막 매도 기록 조회
+            logger.debug(f"PocketBase에서 조회할 쿼리 - pair_id: {pair_id}, trade_type: 'sell'")
+            records = await run_in_threadpool(
+                pocket.get_full_list,
+                "pair_order_history",
+                query_params = {
+                    "filter": f'pair_id = "{pair_id}" && trade_type = "sell"',
+                    "sort": "-timestamp",
+                    "limit": 1
+                }
+            )
 
-            except Exception as e:
-                error_msg = get_error(e)
-                print(f"DEBUG: 주문 처리 중 예외 발생 - {error_msg}")
-                background_tasks.add_task(log_error, "\n".join(error_msg), order_info)
-            finally:
-                ongoing_pairs.pop(pair, None)
-                if not order_queues[pair]:
-                    del order_queues[pair]
-            return {"status": "success", "message": "주문 처리 완료"}
+            logger.debug(f"PocketBase에서 조회한 기록 - {records}")
+            total_sell_value = records[0].value if records else None
+
+        if total_sell_value:
+            logger.debug(f"마지막 매도 금액 - value: {total_sell_value}")
 
+            # 주문 수량 계산
+            adjusted_value = total_sell_value * 0.995  # 수수료 고려한 값
+            price = current_order.price  # 웹훅 메시지에 포함된 가격 사용
+            buy_amount = int(adjusted_value // price)  # 정수 나눗셈, 나머지 버림
+
+            logger.debug(f"계산된 매수 수량 - buy_amount: {buy_amount}")
+
+            if buy_amount <= 0:
+                raise Exception("계산된 매수 수량이 0입니다.")
         else:
-            # 페어가 없는 경우 기존 주문 처리
-            print(f"DEBUG: PAIR 없음 - 기존 주문 처리 중")
-            order_result = bot.create_order(
-                bot.order_info.exchange,
-                bot.order_info.base,
-                order_info.type.lower(),
-                order_info.side.lower(),
-                int(order_info.amount),
-            )
-            print(f"DEBUG: 일반 주문 처리 결과 - {order_result}")
-            background_tasks.add_task(log, exchange_name, order_result, order_info)
+            # 동일한 pair_id를 가진 데이터가 없으므로 웹훅의 amount로 주문
+            logger.debug(f"동일한 pair_id의 매도 기록이 없음, 웹훅의 amount로 주문 진행")
+            buy_amount = int(current_order.amount)  # 수량은 정수여야 함
+
+        # 매수 주문 진행
+        buy_result = await bot.create_order(
+            current_order.exchange,
+            current_order.base,
+            "market",
+            "buy",
+            buy_amount,
+        )
+        logger.debug(f"매수 주문 결과 - {buy_result}")
+        fills.append({"side": "buy", "ticker": current_order.base, "amount": buy_amount, "result": buy_result})
+        notify(log, exchange_name, buy_result, current_order)
+
+    elif current_order.side == "sell":
+        # 매도 주문 처리
+        holding_qty, holding_price = await bot.fetch_balance_and_price(
+            exchange_name, current_order.base
+        )
+        if holding_qty <= 0:
+            raise Exception("잔고가 존재하지 않습니다")
 
+        logger.debug(f"{pair} 매도 진행 중 - 수량: {holding_qty}")
+        sell_result, sell_amount, sell_value = await sell_and_confirm(
+            exchange_name, bot, current_order.base, holding_qty, holding_price
+        )
+        record_data = {
+            "pair_id": current_order.pair_id,
+            "amount": sell_amount,
+            "value": sell_value,
+            "ticker": current_order.base,
+            "exchange": exchange_name,
+            "timestamp": datetime.now().isoformat(),
+            "trade_type": "sell"
+        }
+        await run_in_threadpool(
+            pocket.create, "pair_order_history", record_data
+        )
+        logger.debug(f"PocketBase 기록 완료 - 티커: {current_order.base}, 매도량: {sell_amount}")
+        fills.append({"side": "sell", "ticker": current_order.base, "amount": sell_amount, "value": sell_value, "result": sell_result})
+        notify(log, exchange_name, sell_result, current_order)
+
+    return fills
+
+
+async def execute_order(order_info: OrderContext) -> list[dict]:
+    """페어가 없는 일반 주문을 실행하고 체결 내역을 반환"""
+    exchange_name = order_info.exchange
+    bot = await get_async_bot(exchange_name, order_info.kis_number)
+    bot.init_info(order_info)
+
+    order_result = await bot.create_order(
+        order_info.exchange,
+        order_info.base,
+        order_info.type.lower(),
+        order_info.side.lower(),
+        int(order_info.amount),
+    )
+    logger.debug(f"일반 주문 처리 결과 - {order_result}")
+    notify(log, exchange_name, order_result, order_info)
+    return [{"side": order_info.side, "ticker": order_info.base, "amount": int(order_info.amount), "result": order_result}]
+
+
+async def run_ticket(ticket: OrderTicket):
+    """티켓 상태(접수 → 실행 중 → 체결/실패)를 갱신하며 주문 실행"""
+    order_info = ticket.order
+    is_pair = order_info.pair and order_info.pair_id
+    if is_pair and settings.WORKERS > 1:
+        # 다른 워커가 먼저 접수한 같은 페어 주문이 끝난 뒤에 실행 (워커 안에서는 pair_scheduler 가 순서 보장)
+        await tickets.wait_pair_turn(ticket, settings.PAIR_ORDER_TIMEOUT)
+    ticket.start()
+    try:
+        if is_pair:
+            fills = await execute_pair_order(order_info)
+        else:
+            fills = await execute_order(order_info)
     except Exception as e:
         error_msg = get_error(e)
-        print(f"DEBUG: 주문 처리 중 예외 발생 - {error_msg}")
-        background_tasks.add_task(log_error, "\n".join(error_msg), order_info)
+        ticket.fail(str(e))
+        notify(log_error, "\n".join(error_msg), order_info)
+    else:
+        ticket.fill(fills)
+    return ticket
+
 
-    return {"status": "success", "message": "주문 처리 완료"}
+# 페어별 직렬 워커 (같은 페어는 순서대로, 다른 페어끼리는 병렬로 처리)
+pair_scheduler = PairScheduler(run_ticket, maxsize=settings.PAIR_QUEUE_SIZE)
+# 빠른 응답 모드에서 일반 주문을 실행하는 워커 풀
+order_pool = WorkerPool(run_ticket, size=settings.ORDER_WORKERS)
+
+
+@app.post("/order", dependencies=[Depends(verify_signature)])
+@app.post("/", dependencies=[Depends(verify_signature)])
+async def order(request: Request):
+    # pydantic 모델 대신 orjson 으로 바로 파싱 (트레이딩뷰의 text/plain 본문도 그대로 처리)
+    body = await request.body()
+    try:
+        order_info = parse_order(body)
+    except ValueError as e:
+        log_validation_error_message(f"[Error]\n{e}\n {body.decode(errors='replace')}")
+        return ORJSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={"detail": str(e)},
+        )
+    ticket = tickets.create(order_info)
+    pair = order_info.pair
+
+    try:
+        # 페어와 pair_id가 있는 경우에만 큐 방식 적용, 웹훅은 접수 기록이 커밋되면 큐에 넣고 바로 응답
+        if pair and order_info.pair_id:
+            await tickets.wait_journaled(ticket)
+            pair_scheduler.submit(pair, ticket)
+        elif settings.ORDER_FAST_ACK:
+            await tickets.wait_journaled(ticket)
+            order_pool.submit(ticket)
+        else:
+            await run_ticket(ticket)
+            return {"status": "success", "message": "주문 처리 완료", "ticket": ticket.id}
+    except MailboxFullError as e:
+        ticket.fail(str(e))
+        notify(log_error, str(e), order_info)
+        return ORJSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"status": "rejected", "message": str(e), "ticket": ticket.id},
+        )
+
+    if settings.ORDER_FAST_ACK:
+        return ORJSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "accepted", "ticket": ticket.id},
+        )
+    return {"status": "queued", "message": f"{pair} 주문이 큐에 추가되었습니다.", "ticket": ticket.id}
+
+
+@app.get("/order/{ticket_id}")
+async def order_status(ticket_id: str):
+    ticket = tickets.get(ticket_id)
+    if ticket is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="주문 티켓이 없습니다"
+        )
+    return ticket.dict()
 
 
 def get_hedge_records(base):
@@ -407,11 +569,11 @@ def get_hedge_records(base):
     }
 
 # Hedge 처리 부분은 그대로 유지됩니다.
-@app.post("/hedge")
+@app.post("/hedge", dependencies=[Depends(verify_signature)])
 async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
     exchange_name = hedge_data.exchange.upper()
-    bot = get_bot(exchange_name)
-    upbit = get_bot("UPBIT")
+    bot = await get_async_bot(exchange_name)
+    upbit = await get_async_bot("UPBIT")
 
     base = hedge_data.base
     quote = hedge_data.quote
@@ -433,9 +595,10 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
         try:
             if amount is None:
                 raise Exception("헷지할 수량을 요청하세요")
-            binance_order_result = bot.market_entry(foreign_order_info)
+            binance_order_result = await bot.market_entry(foreign_order_info)
             binance_order_amount = binance_order_result["amount"]
-            pocket.create(
+            await run_in_threadpool(
+                pocket.create,
                 "kimp",
                 {
                     "exchange": "BINANCE",
@@ -456,29 +619,31 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
                     amount=binance_order_amount,
                 )
                 upbit.init_info(korea_order_info)
-                upbit_order_result = upbit.market_buy(korea_order_info)
+                upbit_order_result = await upbit.market_buy(korea_order_info)
             except Exception as e:
-                hedge_records = get_hedge_records(base)
+                hedge_records = await run_in_threadpool(get_hedge_records, base)
                 binance_records_id = hedge_records["BINANCE"]["records_id"]
                 binance_amount = hedge_records["BINANCE"]["amount"]
-                binance_order_result = bot.market_close(
-                    OrderRequest(
-                        exchange=exchange_name,
-                        base=base,
-                        quote=quote,
-                        side="close/buy",
-                        amount=binance_amount,
-                    )
+                close_order_info = OrderRequest(
+                    exchange=exchange_name,
+                    base=base,
+                    quote=quote,
+                    side="close/buy",
+                    amount=binance_amount,
                 )
+                bot.init_info(close_order_info)
+                binance_order_result = await bot.market_close(close_order_info)
                 for binance_record_id in binance_records_id:
-                    pocket.delete("kimp", binance_record_id)
-                log_message(
-                    "[헷지 실패] 업비트에서 에러가 발생하여 바이낸스 포지션을 종료합니다"
+                    await run_in_threadpool(pocket.delete, "kimp", binance_record_id)
+                background_tasks.add_task(
+                    log_message,
+                    "[헷지 실패] 업비트에서 에러가 발생하여 바이낸스 포지션을 종료합니다",
                 )
             else:
-                upbit_order_info = upbit.get_order(upbit_order_result["id"])
+                upbit_order_info = await upbit.get_order(upbit_order_result["id"])
                 upbit_order_amount = upbit_order_info["filled"]
-                pocket.create(
+                await run_in_threadpool(
+                    pocket.create,
                     "kimp",
                     {
                         "exchange": "UPBIT",
@@ -487,7 +652,8 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
                         "amount": upbit_order_amount,
                     },
                 )
-                log_hedge_message(
+                background_tasks.add_task(
+                    log_hedge_message,
                     exchange_name,
                     base,
                     quote,
@@ -506,8 +672,10 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
 
     elif hedge == "OFF":
         try:
-            records = pocket.get_full_list(
-                "kimp", query_params={"filter": f'base = "{base}"'}
+            records = await run_in_threadpool(
+                pocket.get_full_list,
+                "kimp",
+                query_params={"filter": f'base = "{base}"'},
             )
             binance_amount = 0.0
             binance_records_id = []
@@ -530,9 +698,10 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
                     side="close/buy",
                     amount=binance_amount,
                 )
-                binance_order_result = bot.market_close(order_info)
+                bot.init_info(order_info)
+                binance_order_result = await bot.market_close(order_info)
                 for binance_record_id in binance_records_id:
-                    pocket.delete("kimp", binance_record_id)
+                    await run_in_threadpool(pocket.delete, "kimp", binance_record_id)
                 # 업비트
                 order_info = OrderRequest(
                     exchange="UPBIT",
@@ -541,19 +710,30 @@ async def hedge(hedge_data: HedgeData, background_tasks: BackgroundTasks):
                     side="sell",
                     amount=upbit_amount,
                 )
-                upbit_order_result = upbit.market_sell(order_info)
+                upbit.init_info(order_info)
+                upbit_order_result = await upbit.market_sell(order_info)
                 for upbit_record_id in upbit_records_id:
-                    pocket.delete("kimp", upbit_record_id)
+                    await run_in_threadpool(pocket.delete, "kimp", upbit_record_id)
 
-                log_hedge_message(
-                    exchange_name, base, quote, binance_amount, upbit_amount, hedge
+                background_tasks.add_task(
+                    log_hedge_message,
+                    exchange_name,
+                    base,
+                    quote,
+                    binance_amount,
+                    upbit_amount,
+                    hedge,
                 )
             elif binance_amount == 0 and upbit_amount == 0:
-                log_message(f"{exchange_name}, UPBIT에 종료할 수량이 없습니다")
+                background_tasks.add_task(
+                    log_message, f"{exchange_name}, UPBIT에 종료할 수량이 없습니다"
+                )
             elif binance_amount == 0:
-                log_message(f"{exchange_name}에 종료할 수량이 없습니다")
+                background_tasks.add_task(
+                    log_message, f"{exchange_name}에 종료할 수량이 없습니다"
+                )
             elif upbit_amount == 0:
-                log_message("UPBIT에 종료할 수량이 없습니다")
+                background_tasks.add_task(log_message, "UPBIT에 종료할 수량이 없습니다")
         except Exception as e:
             background_tasks.add_task(
                 log_error_message, traceback.format_exc(), "헷지종료 에러"
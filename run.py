@@ -1,12 +1,21 @@
+import os
+import time
 import uvicorn
 import fire
 from exchange.utility import settings
 from main import app
 
 
-def start_server(host="0.0.0.0", port=8000 if settings.PORT is None else settings.PORT):
+def start_server(
+    host="0.0.0.0",
+    port=8000 if settings.PORT is None else settings.PORT,
+    workers=settings.WORKERS,
+):
     app.state.port = port
-    uvicorn.run("main:app", host=host, port=port, reload=False)
+    # 워커 프로세스들이 같은 설정과 기동 시각을 보도록 환경변수로 전달
+    os.environ["WORKERS"] = str(workers)
+    os.environ["POA_BOOT_TIME"] = str(time.time())
+    uvicorn.run("main:app", host=host, port=port, reload=False, workers=workers)
 
 
 if __name__ == "__main__":
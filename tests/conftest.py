@@ -0,0 +1,35 @@
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+# Settings 에 필요한 값 (.env 없이 실행)
+os.environ.setdefault("PASSWORD", "test-password")
+os.environ.setdefault("WHITELIST", "[]")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """임시 store.db 로 바꾼 (db, journal)"""
+    import exchange.database as database
+    import exchange.lease as lease
+    import exchange.ticket as ticket
+
+    db = object.__new__(database.Database)
+    db.database_url = str(tmp_path / "store.db")
+    db.con = sqlite3.connect(db.database_url, check_same_thread=False)
+    db.cursor = db.con.cursor()
+    db.lock = threading.RLock()
+    db.init_db()
+    journal = database.OrderJournal(db.database_url)
+    for module in (database, lease, ticket):
+        monkeypatch.setattr(module, "db", db)
+    for module in (database, ticket):
+        monkeypatch.setattr(module, "journal", journal)
+    yield db, journal
+    journal.flush(timeout=3)
+    db.con.close()
@@ -0,0 +1,64 @@
+import time
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+import exchange.utility.auth as auth
+from exchange.utility import settings, sign, verify_signature
+
+BODY = b'{"exchange": "BINANCE"}'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "secret", b"webhook-secret")
+    monkeypatch.setattr(settings, "WEBHOOK_SIGNATURE_REQUIRED", True)
+    monkeypatch.setattr(settings, "WEBHOOK_SIGNATURE_WINDOW", 30)
+    app = FastAPI()
+
+    @app.post("/order", dependencies=[Depends(verify_signature)])
+    async def order():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def post(client, timestamp: str | None, signature: str | None):
+    headers = {}
+    if timestamp is not None:
+        headers[auth.TIMESTAMP_HEADER] = timestamp
+    if signature is not None:
+        headers[auth.SIGNATURE_HEADER] = signature
+    return client.post("/order", content=BODY, headers=headers)
+
+
+def test_signed_request_accepted(client):
+    timestamp = str(int(time.time()))
+
+    assert post(client, timestamp, sign(BODY, timestamp)).status_code == 200
+
+
+@pytest.mark.parametrize("age", [-60, 60])
+def test_request_outside_window_rejected(client, age):
+    timestamp = str(int(time.time()) - age)
+
+    assert post(client, timestamp, sign(BODY, timestamp)).status_code == 401
+
+
+def test_timestamp_is_signed(client):
+    signed_at = str(int(time.time()) - 600)
+    # 오래된 서명에 새 타임스탬프만 붙여서 다시 보내는 경우
+    assert post(client, str(int(time.time())), sign(BODY, signed_at)).status_code == 401
+
+
+def test_missing_headers_rejected(client):
+    timestamp = str(int(time.time()))
+
+    assert post(client, None, sign(BODY, timestamp)).status_code == 401
+    assert post(client, timestamp, None).status_code == 401
+    assert post(client, "soon", sign(BODY, "soon")).status_code == 401
+
+
+def test_unsigned_request_allowed_when_optional(client, monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SIGNATURE_REQUIRED", False)
+
+    assert post(client, None, None).status_code == 200
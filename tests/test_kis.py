@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+import pytest
+import exchange.stock.kis as kis
+from exchange.stock.kis import AsyncKoreaInvestment
+
+EXPIRES = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@pytest.fixture
+def kis_api(store, monkeypatch):
+    db, _ = store
+    monkeypatch.setattr(kis, "db", db)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path == "/oauth2/tokenP":
+            return httpx.Response(200, json={"access_token": "new-token", "access_token_token_expired": EXPIRES})
+        if request.url.path.endswith("/inquire-ccnl"):
+            return httpx.Response(200, json={"rt_cd": "0", "msg_cd": "MCA00000"})
+        return httpx.Response(404, json={})
+
+    transport = httpx.MockTransport(handler)
+    client = httpx.Client
+    monkeypatch.setattr(kis.httpx, "Client", lambda **kwargs: client(transport=transport, **kwargs))
+    return db, requests
+
+
+def create_bot() -> AsyncKoreaInvestment:
+    return AsyncKoreaInvestment("key", "secret", "12345678", "01", 1)
+
+
+def test_async_bot_issues_token(kis_api):
+    db, requests = kis_api
+
+    bot = create_bot()
+    try:
+        assert requests == ["/oauth2/tokenP"]
+        assert bot.access_token == "new-token"
+        assert bot.is_token_fresh()
+        assert db.get_auth("KIS1") == ("new-token", EXPIRES)
+    finally:
+        asyncio.run(bot.close())
+
+
+def test_async_bot_reuses_stored_token(kis_api):
+    db, requests = kis_api
+    db.set_auth("KIS1", "stored-token", EXPIRES)
+
+    bot = create_bot()
+    try:
+        # 저장된 토큰은 확인만 하고 새로 발급하지 않음, 스레드에서 다시 불러도 동기로 동작
+        asyncio.run(asyncio.to_thread(bot.auth))
+        assert requests == ["/uapi/domestic-stock/v1/quotations/inquire-ccnl"]
+        assert bot.access_token == "stored-token"
+    finally:
+        asyncio.run(bot.close())
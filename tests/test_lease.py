@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from exchange.lease import Lease, LeaseTimeout
+from exchange.ticket import get_replay_lease
+
+
+def test_acquire_lease_is_exclusive(store):
+    db, _ = store
+
+    assert db.acquire_lease("pair:A", "worker-1", ttl=30)
+    assert not db.acquire_lease("pair:A", "worker-2", ttl=30)
+    # 가진 쪽은 갱신할 수 있음
+    assert db.acquire_lease("pair:A", "worker-1", ttl=30)
+    assert db.acquire_lease("pair:B", "worker-2", ttl=30)
+
+
+def test_expired_lease_can_be_taken(store):
+    db, _ = store
+    assert db.acquire_lease("pair:A", "worker-1", ttl=-1)
+
+    assert db.acquire_lease("pair:A", "worker-2", ttl=30)
+    assert not db.acquire_lease("pair:A", "worker-1", ttl=30)
+
+
+def test_release_only_by_owner(store):
+    db, _ = store
+    db.acquire_lease("pair:A", "worker-1", ttl=30)
+
+    db.release_lease("pair:A", "worker-2")
+    assert not db.acquire_lease("pair:A", "worker-2", ttl=30)
+
+    db.release_lease("pair:A", "worker-1")
+    assert db.acquire_lease("pair:A", "worker-2", ttl=30)
+
+
+def test_lease_context_manager_waits_and_times_out(store):
+    holder = Lease("kis_token:1")
+    assert holder.acquire()
+
+    with pytest.raises(LeaseTimeout):
+        with Lease("kis_token:1", timeout=0.2):
+            pass
+
+    holder.release()
+    with Lease("kis_token:1", timeout=0.2):
+        assert not Lease("kis_token:1").acquire()
+    assert Lease("kis_token:1").acquire()
+
+
+def test_async_lease_serializes_holders(store):
+    order = []
+
+    async def hold(name):
+        async with Lease("delete_old_records", ttl=5):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.05)
+            order.append(f"{name} end")
+
+    async def run():
+        await asyncio.gather(hold("a"), hold("b"))
+
+    asyncio.run(run())
+
+    assert order in (
+        ["a start", "a end", "b start", "b end"],
+        ["b start", "b end", "a start", "a end"],
+    )
+
+
+def test_replay_not_blocked_by_crashed_process(store):
+    db, _ = store
+    # 이전 기동의 프로세스가 lease 를 가진 채 죽어서 아직 만료되지 않은 상태
+    crashed = get_replay_lease(1000.0)
+    assert db.acquire_lease(crashed.name, "dead-process", ttl=60)
+
+    async def run():
+        first = get_replay_lease(2000.0)
+        second = get_replay_lease(2000.0)
+        try:
+            return await first.hold(), await second.hold()
+        finally:
+            await first.arelease()
+
+    # 새 기동에서는 한 워커만 복구를 맡음
+    assert asyncio.run(run()) == (True, False)
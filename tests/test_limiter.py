@@ -0,0 +1,79 @@
+import pytest
+import exchange.stock.limiter as limiter
+from exchange.stock.limiter import TokenBucket, RateLimiters, create_bucket
+from exchange.stock.schemas import BaseUrls
+from exchange.utility import settings
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_burst_then_waits(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+
+def test_bucket_refills(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    for _ in range(3):
+        bucket.reserve()
+
+    clock[0] += 0.25
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.05)
+
+
+def test_drain_drops_saved_tokens(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+
+    bucket.drain()
+
+    assert bucket.reserve() == pytest.approx(0.1)
+
+
+def test_limit_is_split_between_workers(monkeypatch):
+    monkeypatch.setattr(settings, "KIS_RATE_LIMIT", 20)
+    monkeypatch.setattr(settings, "WORKERS", 1)
+    single = create_bucket(BaseUrls.base_url.value)
+    monkeypatch.setattr(settings, "WORKERS", 4)
+    shared = create_bucket(BaseUrls.base_url.value)
+
+    assert single.rate + single.capacity == 20
+    assert shared.rate + shared.capacity == 5
+
+
+def test_buckets_per_server_and_account():
+    limiters = RateLimiters()
+
+    bucket = limiters.get(BaseUrls.base_url.value, 1)
+
+    assert limiters.get(BaseUrls.base_url.value, 1) is bucket
+    assert limiters.get(BaseUrls.paper_base_url.value, 1) is not bucket
+    assert limiters.get(BaseUrls.base_url.value, 2) is not bucket
+
+
+def release_times(bucket: TokenBucket, clock, count: int) -> list[float]:
+    """한꺼번에 count 번 예약했을 때 각 호출이 나가는 시각 (시작 기준 초)"""
+    start = clock[0]
+    return [clock[0] + bucket.reserve() - start for _ in range(count)]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_paper_limit_not_exceeded(clock, monkeypatch, workers):
+    monkeypatch.setattr(settings, "KIS_PAPER_RATE_LIMIT", 2)
+    monkeypatch.setattr(settings, "WORKERS", workers)
+    # 모든 워커가 동시에 호출을 몰아 보내는 경우
+    per_worker = [release_times(create_bucket(BaseUrls.paper_base_url.value), clock, 30) for _ in range(workers)]
+
+    for seconds in (1, 3, 10):
+        for times in per_worker:
+            assert sum(t <= seconds for t in times) <= 2 / workers * seconds
+        assert sum(t <= seconds for times in per_worker for t in times) <= 2 * seconds
@@ -0,0 +1,91 @@
+import asyncio
+import time
+import pytest
+import exchange.markets as markets
+from exchange.utility import settings
+
+
+class StubClient:
+    id = "binance"
+
+    def __init__(self):
+        self.markets = {"BTC/USDT": {"symbol": "BTC/USDT", "id": "BTCUSDT"}}
+        self.currencies = {}
+        self.loaded = False
+        self.options = {}
+        self.time_difference_loaded = False
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = {market["symbol"]: market for market in markets}
+
+    async def load_markets(self):
+        self.loaded = True
+
+    async def load_time_difference(self):
+        self.time_difference_loaded = True
+
+
+@pytest.fixture
+def refreshes(tmp_path, monkeypatch):
+    monkeypatch.setattr(markets, "cache_directory", tmp_path)
+    monkeypatch.setattr(settings, "MARKETS_REFRESH_AGE", 3600)
+    calls = []
+
+    async def async_refresh_markets(client):
+        calls.append(client.id)
+
+    monkeypatch.setattr(markets, "async_refresh_markets", async_refresh_markets)
+    return calls
+
+
+def save_cache(age: float):
+    markets.write_cache(StubClient())
+    path = markets.get_cache_path("binance")
+    cache = markets.orjson.loads(markets.zlib.decompress(path.read_bytes()))
+    cache["saved_at"] = time.time() - age
+    path.write_bytes(markets.zlib.compress(markets.orjson.dumps(cache)))
+
+
+async def load(client):
+    await markets.async_load_markets(client)
+    await asyncio.gather(*markets.refresh_tasks)
+
+
+def test_fresh_cache_is_not_refreshed(refreshes):
+    save_cache(age=60)
+    client = StubClient()
+    client.markets = {}
+
+    asyncio.run(load(client))
+
+    assert "BTC/USDT" in client.markets
+    assert not client.loaded
+    assert refreshes == []
+
+
+def test_cache_hit_adjusts_time_difference(refreshes):
+    save_cache(age=60)
+    client = StubClient()
+    client.options["adjustForTimeDifference"] = True
+
+    asyncio.run(load(client))
+
+    assert not client.loaded
+    assert client.time_difference_loaded
+
+
+def test_old_cache_is_refreshed(refreshes):
+    save_cache(age=7200)
+
+    asyncio.run(load(StubClient()))
+
+    assert refreshes == ["binance"]
+
+
+def test_missing_cache_loads_markets(refreshes):
+    client = StubClient()
+
+    asyncio.run(load(client))
+
+    assert client.loaded
+    assert markets.read_cache("binance") is not None
@@ -0,0 +1,80 @@
+import orjson
+import pytest
+from exchange.model import parse_order
+
+PASSWORD = "test-password"
+
+
+def make_body(**values) -> bytes:
+    order = {
+        "exchange": "BINANCE",
+        "base": "BTC",
+        "quote": "USDT.P",
+        "side": "entry/buy",
+        "amount": "0.01",
+        "password": PASSWORD,
+    }
+    order.update(values)
+    return orjson.dumps({key: value for key, value in order.items() if value is not ...})
+
+
+def test_futures_entry():
+    order = parse_order(make_body(leverage="5"))
+
+    assert order.side == "buy"
+    assert order.quote == "USDT"
+    assert order.unified_symbol == "BTC/USDT:USDT"
+    assert order.is_futures and order.is_entry
+    assert order.amount == 0.01
+    assert order.leverage == 5
+
+
+def test_coinm_futures_symbol():
+    order = parse_order(make_body(quote="USD.P"))
+
+    assert order.unified_symbol == "BTC/USD:BTC"
+    assert order.is_coinm
+
+
+def test_stock_pair_fields_coerced_to_str():
+    order = parse_order(
+        make_body(exchange="KRX", base=5930, quote="KRW", side="buy", amount=1, pair=69500, pair_id=7)
+    )
+
+    assert order.base == "5930"
+    assert order.pair == "69500"
+    assert order.pair_id == "7"
+    assert order.is_stock
+
+
+def test_nan_and_empty_become_none():
+    order = parse_order(make_body(price="NaN", leverage=""))
+
+    assert order.price is None
+    assert order.leverage is None
+
+
+@pytest.mark.parametrize(
+    "values, message",
+    [
+        ({"exchange": ...}, "exchange 값이 없습니다"),
+        ({"exchange": "FTX"}, "지원하지 않는 exchange"),
+        ({"side": ["buy"]}, "side 값은 문자열이어야 합니다"),
+        ({"quote": {"USDT": 1}}, "quote 값은 문자열이어야 합니다"),
+        ({"pair_id": {"id": 1}}, "pair_id 값은 문자열이어야 합니다"),
+        ({"pair": True}, "pair 값은 문자열이어야 합니다"),
+        ({"type": "limit"}, "type 은 market 만"),
+        ({"amount": "many"}, "amount 값이 숫자가 아닙니다"),
+        ({"password": "wrong"}, "비밀번호가 틀렸습니다"),
+    ],
+)
+def test_invalid_orders(values, message):
+    with pytest.raises(ValueError, match=message):
+        parse_order(make_body(**values))
+
+
+def test_body_must_be_object():
+    with pytest.raises(ValueError):
+        parse_order(b"[1, 2]")
+    with pytest.raises(ValueError):
+        parse_order(b"not json")
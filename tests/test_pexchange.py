@@ -0,0 +1,22 @@
+import asyncio
+from exchange.pexchange import ExchangeRegistry
+
+
+def test_registry_creates_each_bot_once():
+    created = []
+
+    async def factory(key):
+        created.append(key)
+        await asyncio.sleep(0.01)
+        return object()
+
+    registry = ExchangeRegistry(factory)
+
+    async def run():
+        return await asyncio.gather(*(registry.get("BINANCE") for _ in range(10)), registry.get("OKX"))
+
+    bots = asyncio.run(run())
+
+    assert created == ["BINANCE", "OKX"]
+    assert len({id(bot) for bot in bots[:10]}) == 1
+    assert registry.values() == [bots[0], bots[10]]
@@ -0,0 +1,59 @@
+import asyncio
+import exchange.pexchange as pexchange
+import exchange.position_mode as position_mode
+from exchange.binance import AsyncBinance
+from exchange.position_mode import PositionModes
+
+
+class StubBinanceClient:
+    def __init__(self, dual_side: bool):
+        self.dual_side = dual_side
+
+    async def fapiPrivateGetPositionSideDual(self):
+        return {"dualSidePosition": self.dual_side}
+
+
+def make_bot(dual_side: bool) -> AsyncBinance:
+    bot = object.__new__(AsyncBinance)
+    bot.client = StubBinanceClient(dual_side)
+    return bot
+
+
+def use_memory_modes(monkeypatch) -> list:
+    saved = []
+    modes = PositionModes()
+    modes.modes = {}
+    monkeypatch.setattr(pexchange, "position_modes", modes)
+    monkeypatch.setattr(
+        position_mode.db, "set_position_mode", lambda *args: saved.append(args)
+    )
+    return saved
+
+
+def test_probe_stores_binance_hedge_mode(monkeypatch):
+    saved = use_memory_modes(monkeypatch)
+
+    asyncio.run(pexchange.WarmUp().probe_position_mode("BINANCE", make_bot(True)))
+
+    assert pexchange.position_modes.get("BINANCE", "BTC/USDT:USDT") == "hedge"
+    assert saved == [("BINANCE", position_mode.ACCOUNT, "hedge")]
+
+
+def test_probe_stores_binance_one_way_mode(monkeypatch):
+    saved = use_memory_modes(monkeypatch)
+
+    asyncio.run(pexchange.WarmUp().probe_position_mode("BINANCE", make_bot(False)))
+
+    assert pexchange.position_modes.get("BINANCE") == "one-way"
+    assert saved == [("BINANCE", position_mode.ACCOUNT, "one-way")]
+
+
+def test_probe_failure_keeps_default(monkeypatch):
+    saved = use_memory_modes(monkeypatch)
+    bot = object.__new__(AsyncBinance)
+    bot.client = object()
+
+    asyncio.run(pexchange.WarmUp().probe_position_mode("BINANCE", bot))
+
+    assert saved == []
+    assert pexchange.position_modes.get("BINANCE") == "one-way"
@@ -0,0 +1,114 @@
+import asyncio
+import ccxt
+import pytest
+import exchange.retry as retry
+from exchange.model import OrderContext
+from exchange.retry import RetryState, classify, get_backoff, FATAL, PARAM_FIX, RETRYABLE
+from exchange.utility import settings
+
+
+def make_order(exchange="BINANCE", position_mode="one-way", **values) -> OrderContext:
+    return OrderContext.construct(
+        exchange=exchange,
+        base="BTC",
+        quote="USDT",
+        side="buy",
+        unified_symbol="BTC/USDT:USDT",
+        is_futures=True,
+        is_entry=True,
+        is_close=False,
+        position_mode=position_mode,
+        **values,
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_persist(monkeypatch):
+    learned = []
+    monkeypatch.setattr(retry.position_modes, "learn", lambda *args: learned.append(args))
+    return learned
+
+
+def test_classify():
+    assert classify("BINANCE", Exception("binance Internal error")) == (RETRYABLE, None)
+    assert classify("BINANCE", Exception("position side does not match")) == (
+        PARAM_FIX,
+        retry.fix_binance_position_side,
+    )
+    assert classify("OKX", ccxt.RateLimitExceeded("too many")) == (RETRYABLE, None)
+    assert classify("OKX", Exception("position side does not match")) == (FATAL, None)
+    assert classify("UPBIT", ccxt.InsufficientFunds("no money")) == (FATAL, None)
+
+
+def test_backoff_is_capped_with_jitter(monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_RETRY_MAX_DELAY", 2.0)
+    for retry_count in range(8):
+        wait = min(2.0, 0.1 * 2**retry_count)
+        for _ in range(20):
+            assert wait / 2 <= get_backoff(retry_count, 0.1) <= wait
+
+
+def test_param_fix_flips_mode_and_learns(no_persist):
+    order = make_order()
+    state = RetryState(("BTC/USDT:USDT", "market", "buy", 1.0, None, {}), order, 3, 0.1, None)
+
+    wait, pending = state.handle(Exception("position side does not match"))
+
+    assert (wait, pending) == (0.0, None)
+    assert order.position_mode == "hedge"
+    assert state.call.params == {"positionSide": "LONG"}
+    assert no_persist == [("BINANCE", "BTC/USDT:USDT", "hedge")]
+
+
+def test_fatal_and_attempt_budget():
+    state = RetryState(("BTC/USDT:USDT", "market", "buy", 1.0), make_order(), 2, 0.0, None)
+    assert state.handle(Exception("Internal error")) is not None
+    assert state.handle(Exception("Internal error")) is None
+
+    state = RetryState(("BTC/USDT:USDT", "market", "buy", 1.0), make_order(), 3, 0.0, None)
+    assert state.handle(Exception("insufficient balance")) is None
+
+
+def test_deadline_checked_before_action(monkeypatch, no_persist):
+    monkeypatch.setattr(settings, "ORDER_RETRY_DEADLINE", 0.0)
+    calls = []
+
+    class Instance:
+        async def set_leverage(self, *args):
+            calls.append(args)
+
+    order = make_order("OKX")
+    state = RetryState(("BTC/USDT:USDT", "market", "buy", 1.0), order, 3, 0.1, Instance())
+
+    assert state.handle(Exception("posSide error")) is None
+    # 포기한 주문은 모드를 바꾸거나 레버리지 설정 코루틴을 만들지 않음
+    assert order.position_mode == "one-way"
+    assert no_persist == []
+    assert calls == []
+
+
+def test_async_retry_awaits_fixer():
+    calls = []
+
+    class Instance:
+        async def set_leverage(self, order_info, leverage, symbol):
+            calls.append((leverage, symbol))
+
+    attempts = []
+
+    async def create_order(symbol, type, side, amount, price, params):
+        attempts.append(params)
+        if len(attempts) == 1:
+            raise Exception("posSide error")
+        return {"id": "1"}
+
+    order = make_order("OKX", leverage=5, margin_mode="cross")
+    result = asyncio.run(
+        retry.async_retry(
+            create_order, "BTC/USDT:USDT", "market", "buy", 1.0, None, {}, order_info=order, instance=Instance()
+        )
+    )
+
+    assert result == {"id": "1"}
+    assert calls == [(5, "BTC/USDT:USDT")]
+    assert attempts[1] == {"posSide": "long", "tdMode": "cross"}
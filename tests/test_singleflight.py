@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+import exchange.singleflight as singleflight
+from exchange.singleflight import SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(singleflight.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_cached_until_ttl(clock):
+    flight = SingleFlight(ttl=1.0)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert asyncio.run(flight.ado("BTC", fetch)) == 1
+    clock[0] += 0.5
+    assert asyncio.run(flight.ado("BTC", fetch)) == 1
+    clock[0] += 0.5
+    assert asyncio.run(flight.ado("BTC", fetch)) == 2
+
+
+def test_expired_results_evicted_on_insert(clock):
+    flight = SingleFlight(ttl=1.0)
+    for index in range(100):
+        flight.set_cached(("binance", ("BTC", str(index))), index, flight.ttl)
+        clock[0] += 0.1
+
+    # 한 번에 남는 결과는 ttl 두 배 안에 들어온 것들 뿐
+    assert len(flight.results) <= 20
+    assert ("binance", ("BTC", "99")) in flight.results
@@ -0,0 +1,151 @@
+import asyncio
+import queue
+import time
+from exchange.model import OrderContext
+from exchange.ticket import TicketBook, FILLED, FAILED
+
+
+def make_order(pair: str | None = None, side: str = "buy") -> OrderContext:
+    return OrderContext.construct(
+        exchange="BINANCE", base="BTC", quote="USDT", side=side, pair=pair, pair_id="1" if pair else None
+    )
+
+
+def test_status_from_other_worker(store):
+    db, journal = store
+    accepting, other = TicketBook(), TicketBook()
+    ticket = accepting.create(make_order())
+    ticket.start()
+    ticket.fill([{"side": "buy", "amount": 1}])
+    journal.flush()
+
+    loaded = other.get(ticket.id)
+
+    assert loaded.status == FILLED
+    assert loaded.fills == [{"side": "buy", "amount": 1}]
+    assert loaded.dict()["base"] == "BTC"
+    assert loaded.timings()["total_ms"] is not None
+
+
+def test_failed_status_from_journal(store):
+    db, journal = store
+    ticket = TicketBook().create(make_order())
+    ticket.fail("잔고 부족")
+    journal.flush()
+
+    loaded = TicketBook().get(ticket.id)
+
+    assert loaded.status == FAILED
+    assert loaded.error == "잔고 부족"
+
+
+def test_ack_waits_for_accepted_row(store, monkeypatch):
+    db, journal = store
+
+    class SlowQueue(queue.Queue):
+        # 저널 스레드가 커밋을 늦게 하도록 (응답이 커밋보다 먼저 나가면 잡히게)
+        def get(self, *args, **kwargs):
+            record = super().get(*args, **kwargs)
+            time.sleep(0.1)
+            return record
+
+    monkeypatch.setattr(journal, "queue", SlowQueue())
+    book = TicketBook()
+    ticket = book.create(make_order())
+    assert db.get_order_journal(ticket.id) == []
+
+    asyncio.run(asyncio.wait_for(book.wait_journaled(ticket), timeout=3))
+
+    assert [row[0] for row in db.get_order_journal(ticket.id)] == ["accepted"]
+
+
+def test_unknown_ticket(store):
+    assert TicketBook().get("missing") is None
+
+
+def test_pair_orders_wait_for_earlier_ticket(store):
+    db, journal = store
+    worker_a, worker_b = TicketBook(), TicketBook()
+    sell = worker_a.create(make_order("BTC-ETH", "sell"))
+    buy = worker_b.create(make_order("BTC-ETH", "buy"))
+    other_pair = worker_b.create(make_order("XRP-ETH"))
+
+    async def run():
+        waiting = asyncio.create_task(worker_b.wait_pair_turn(buy, timeout=60))
+        await worker_b.wait_pair_turn(other_pair, timeout=60)
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        sell.start()
+        sell.fill([])
+        await asyncio.wait_for(waiting, timeout=3)
+
+    asyncio.run(run())
+
+
+def test_pair_turn_ignores_stale_tickets(store):
+    db, journal = store
+    book = TicketBook()
+    book.create(make_order("BTC-ETH"))
+    later = book.create(make_order("BTC-ETH"))
+    journal.flush()
+    db.excute("UPDATE order_journal SET created_at = created_at - 600 WHERE ticket != ?", (later.id,))
+
+    asyncio.run(asyncio.wait_for(book.wait_pair_turn(later, timeout=300), timeout=3))
+
+
+def test_eviction_keeps_pending_tickets(store):
+    book = TicketBook(maxlen=3)
+    pending = book.create(make_order())
+    done = book.create(make_order())
+    done.fill([])
+    running = book.create(make_order())
+    running.start()
+
+    newest = book.create(make_order())
+
+    assert list(book.tickets) == [pending.id, running.id, newest.id]
+
+
+def test_eviction_may_exceed_maxlen_while_pending(store):
+    book = TicketBook(maxlen=2)
+    created = [book.create(make_order()) for _ in range(4)]
+
+    assert list(book.tickets) == [ticket.id for ticket in created]
+
+    created[0].fail("x")
+    created[2].fill([])
+    book.create(make_order())
+
+    assert created[0].id not in book.tickets
+    assert created[2].id not in book.tickets
+    assert len(book.tickets) == 3
+
+
+def test_evicted_ticket_still_served_from_journal(store):
+    db, journal = store
+    book = TicketBook(maxlen=1)
+    first = book.create(make_order())
+    first.fill([])
+    book.create(make_order())
+    journal.flush()
+
+    assert first.id not in book.tickets
+    assert book.get(first.id).status == FILLED
+
+
+def test_delete_finished_orders(store):
+    db, journal = store
+    book = TicketBook()
+    finished = book.create(make_order())
+    finished.fill([])
+    failed = book.create(make_order())
+    failed.fail("x")
+    pending = book.create(make_order())
+    journal.flush()
+
+    assert db.delete_finished_orders(before=0) == 0
+    assert db.delete_finished_orders(before=time.time() + 1) == 4
+
+    assert db.get_order_journal(finished.id) == []
+    assert db.get_order_journal(failed.id) == []
+    assert len(db.get_order_journal(pending.id)) == 1
@@ -0,0 +1,26 @@
+import pydantic
+import pytest
+from exchange.model import Settings
+from exchange.utility.whitelist import IPWhitelist, TRADINGVIEW_IPS
+
+
+def test_whitelist_entries_validated():
+    settings = Settings(PASSWORD="x", WHITELIST=[" 10.20.0.0/16", "203.0.113.7"])
+
+    assert settings.WHITELIST == ["10.20.0.0/16", "203.0.113.7"]
+
+
+def test_bad_whitelist_entry_named():
+    with pytest.raises(pydantic.ValidationError, match="203.0.113.300"):
+        Settings(PASSWORD="x", WHITELIST=["203.0.113.7", "203.0.113.300"])
+
+
+def test_whitelist_allows():
+    whitelist = IPWhitelist(TRADINGVIEW_IPS + ["1.1.1.0/24", "2606:4700::/32"])
+
+    assert whitelist.is_allowed("52.89.214.238")
+    assert whitelist.is_allowed("1.1.1.1")
+    assert whitelist.is_allowed("2606:4700::1111")
+    assert whitelist.is_allowed("192.168.0.10")
+    assert not whitelist.is_allowed("8.8.8.8")
+    assert not whitelist.is_allowed("not-an-ip")
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import exchange.utility.ws as ws
+from exchange.utility.ws import AccountBook, BinanceUserStream
+
+
+def test_balance_cache_expires(monkeypatch):
+    book = AccountBook()
+    book.ready = True
+    now = [100.0]
+    monkeypatch.setattr(ws.time, "monotonic", lambda: now[0])
+    book.set_balance("free", {"USDT": 10.0}, book.version)
+
+    assert book.get_balance("free") == {"USDT": 10.0}
+    now[0] += ws.BALANCE_TTL
+    assert book.get_balance("free") is None
+
+
+def test_balance_cache_cleared_by_account_event():
+    book = AccountBook()
+    book.ready = True
+    book.set_balance("free", {"USDT": 10.0}, book.version)
+
+    book.apply({"e": "ACCOUNT_UPDATE", "T": 1, "a": {"B": [], "P": []}})
+
+    assert book.get_balance("free") is None
+
+
+def test_stale_balance_not_stored():
+    book = AccountBook()
+    book.ready = True
+    version = book.version
+    book.invalidate_balances()
+
+    book.set_balance("free", {"USDT": 10.0}, version)
+
+    assert book.get_balance("free") is None
+
+
+def test_client_creation_is_retried(monkeypatch):
+    monkeypatch.setattr(ws, "RECONNECT_MIN", 0.0)
+    stream = BinanceUserStream()
+    attempts = []
+    connected = asyncio.Event()
+
+    async def get_client():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("warming up")
+        return object()
+
+    async def connect():
+        connected.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(stream, "connect", connect)
+
+    async def run():
+        task = asyncio.create_task(stream.run(get_client))
+        await asyncio.wait_for(connected.wait(), timeout=3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert len(attempts) == 3
+    assert stream.last_error == "warming up"